@@ -1,11 +1,31 @@
 """Enhanced conversation buffer."""
-from typing import Callable, Dict, List, Union
+import difflib
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional
+
+
+class FailedAttempt(NamedTuple):
+    """An answer that did not work, and why."""
+
+    output: str
+    error: str
 
 
 class EnhancedConversationBuffer:
     """
     Enhanced conversation buffer that manages a list of interactions
     based on token count.
+
+    Each message is tokenized once when it is added. Pinned messages, such as
+    the system prompt and the initial request, are never evicted and come
+    before the other messages; the others are evicted oldest first once the
+    buffer holds more than `max_tokens`.
+
+    Failed attempts added with add_failed_attempt are compacted: only the
+    latest keeps its turns, the earlier ones are replaced by one summary
+    message listing their errors and the changes from each output to the next.
+    The summary sits between the pinned and the other messages and is only
+    dropped when evicting every other message is not enough.
     """
 
     def __init__(
@@ -15,32 +35,75 @@ class EnhancedConversationBuffer:
         human_prefix: str = "Human",
         ai_prefix: str = "AI",
     ):
-        self.buffer: List[Dict[str, str]] = []
+        self.pinned: List[Dict[str, str]] = []
+        self.pinned_tokens: List[int] = []
+        self.buffer: Deque[Dict[str, str]] = deque()
+        self.buffer_tokens: Deque[int] = deque()
+        self.failed_attempts: List[FailedAttempt] = []
+        # turns of the latest failed attempt, at the end of self.buffer
+        self.latest_attempt_messages: int = 0
+        self.summary: Optional[Dict[str, str]] = None
+        self.summary_tokens: int = 0
         self.max_tokens: int = max_tokens
         self.current_tokens: int = 0
         self.num_tokens_from_string = num_tokens_from_string
         self.human_prefix = human_prefix
         self.ai_prefix = ai_prefix
 
-    def add_message(self, message: Dict[str, str]) -> None:
-        """Adds a message to the buffer."""
+    def add_message(self, message: Dict[str, str], pinned: bool = False) -> None:
+        """Adds a message to the buffer, optionally pinned against eviction."""
         message_tokens = self.num_tokens_from_string(message["content"])
         self.current_tokens += message_tokens
-        self.buffer.append(message)
+        if pinned:
+            self.pinned.append(message)
+            self.pinned_tokens.append(message_tokens)
+        else:
+            self.buffer.append(message)
+            self.buffer_tokens.append(message_tokens)
         self.flush_buffer()
 
-    def add_messages(self, messages: List[Dict[str, str]]) -> None:
+    def add_messages(
+        self, messages: List[Dict[str, str]], pinned: bool = False
+    ) -> None:
         """Adds multiple messages to the buffer."""
         for message in messages:
-            self.add_message(message)
+            self.add_message(message, pinned)
+
+    def add_failed_attempt(
+        self, output: str, error: str, messages: List[Dict[str, str]]
+    ) -> None:
+        """
+        Adds the turns of a failed attempt, e.g. the answer and the error fed
+        back, and compacts the previous failed attempt into the summary.
+        """
+        for _ in range(min(self.latest_attempt_messages, len(self.buffer))):
+            self.buffer.pop()
+            self.current_tokens -= self.buffer_tokens.pop()
+
+        self.failed_attempts.append(FailedAttempt(output, error))
+        self.set_summary(summarize_attempts(self.failed_attempts))
+        self.add_messages(messages)
+        self.latest_attempt_messages = min(len(messages), len(self.buffer))
+
+    def set_summary(self, content: str) -> None:
+        """Replaces the summary of the earlier failed attempts."""
+        self.current_tokens -= self.summary_tokens
+        self.summary, self.summary_tokens = None, 0
+        if content:
+            self.summary = {"role": "user", "content": content}
+            self.summary_tokens = self.num_tokens_from_string(content)
+            self.current_tokens += self.summary_tokens
 
     def flush_buffer(self) -> None:
         """Flushes the buffer to keep it under the max token count."""
-        while self.current_tokens > self.max_tokens:
-            removed_message = self.buffer.pop(0)
-            self.current_tokens -= self.num_tokens_from_string(
-                removed_message["content"]
-            )
+        while self.current_tokens > self.max_tokens and self.buffer:
+            self.buffer.popleft()
+            self.current_tokens -= self.buffer_tokens.popleft()
+        self.latest_attempt_messages = min(
+            self.latest_attempt_messages, len(self.buffer)
+        )
+        if self.current_tokens > self.max_tokens and self.summary is not None:
+            self.set_summary("")
 
     @property
     def buffer_as_str(self) -> str:
@@ -49,41 +112,128 @@ class EnhancedConversationBuffer:
             [
                 f"{self.human_prefix if msg['role'] == 'user' else self.ai_prefix}:"
                 f" {msg['content']}"
-                for msg in self.buffer
+                for msg in self.buffer_as_messages
             ]
         )
 
     @property
     def buffer_as_messages(self) -> List[Dict[str, str]]:
         """Returns the buffer as a list of messages."""
-        return self.buffer
+        summary = [self.summary] if self.summary is not None else []
+        return [*self.pinned, *summary, *self.buffer]
 
-    def save_context(self) -> Dict[str, Union[int, List[Dict[str, str]]]]:
+    def save_context(self) -> Dict[str, Any]:
         """Serializes the current state of the buffer to a dictionary."""
         return {
             "max_tokens": self.max_tokens,
             "current_tokens": self.current_tokens,
-            "buffer": self.buffer,
+            "pinned": list(self.pinned),
+            "pinned_tokens": list(self.pinned_tokens),
+            "buffer": list(self.buffer),
+            "buffer_tokens": list(self.buffer_tokens),
+            "failed_attempts": [list(attempt) for attempt in self.failed_attempts],
+            "latest_attempt_messages": self.latest_attempt_messages,
+            "summary": self.summary,
+            "summary_tokens": self.summary_tokens,
         }
 
+    def load_context(self, context: Dict[str, Any]) -> None:
+        """
+        Loads the state of the buffer from a serialized dictionary. Token
+        counts missing from the context are counted again.
+        """
+        max_tokens = context["max_tokens"]
+        if not isinstance(max_tokens, int):
+            raise TypeError("Expected max_tokens to be an int")
+
+        pinned = self.context_messages(context, "pinned")
+        buffer = self.context_messages(context, "buffer")
+        pinned_tokens = self.context_tokens(context, "pinned_tokens", pinned)
+        buffer_tokens = self.context_tokens(context, "buffer_tokens", buffer)
 
-def load_context(self, context: Dict[str, Union[int, List[Dict[str, str]]]]) -> None:
-    """Loads the state of the buffer from a serialized dictionary."""
-    max_tokens = context["max_tokens"]
-    current_tokens = context["current_tokens"]
-    buffer = context["buffer"]
+        summary = context.get("summary")
+        summary_tokens = context.get("summary_tokens")
+        if summary is not None and not isinstance(summary_tokens, int):
+            summary_tokens = self.num_tokens_from_string(summary["content"])
 
-    if isinstance(max_tokens, int):
         self.max_tokens = max_tokens
-    else:
-        raise TypeError("Expected max_tokens to be an int")
-
-    if isinstance(current_tokens, int):
-        self.current_tokens = current_tokens
-    else:
-        raise TypeError("Expected current_tokens to be an int")
-
-    if isinstance(buffer, list):
-        self.buffer = buffer
-    else:
-        raise TypeError("Expected buffer to be a list")
+        self.pinned, self.pinned_tokens = pinned, pinned_tokens
+        self.buffer, self.buffer_tokens = deque(buffer), deque(buffer_tokens)
+        self.failed_attempts = [
+            FailedAttempt(*attempt) for attempt in context.get("failed_attempts", [])
+        ]
+        self.latest_attempt_messages = int(context.get("latest_attempt_messages", 0))
+        self.summary = summary
+        self.summary_tokens = summary_tokens or 0
+        self.current_tokens = (
+            sum(pinned_tokens) + self.summary_tokens + sum(buffer_tokens)
+        )
+        self.flush_buffer()
+
+    @staticmethod
+    def context_messages(context: Dict[str, Any], key: str) -> List[Dict[str, str]]:
+        """Read a list of messages from a serialized context."""
+        messages = context.get(key, [])
+        if not isinstance(messages, list):
+            raise TypeError(f"Expected {key} to be a list")
+        return list(messages)
+
+    def context_tokens(
+        self, context: Dict[str, Any], key: str, messages: List[Dict[str, str]]
+    ) -> List[int]:
+        """Read the token counts of messages, counting them if not saved."""
+        tokens: Optional[List[int]] = context.get(key)
+        if tokens is None:
+            return [self.num_tokens_from_string(msg["content"]) for msg in messages]
+        if not isinstance(tokens, list) or len(tokens) != len(messages):
+            raise TypeError(f"Expected {key} to be a list of one count per message")
+        return list(tokens)
+
+
+def summarize_attempts(attempts: List[FailedAttempt]) -> str:
+    """
+    Summary of every failed attempt but the latest: the errors, with repeats
+    collapsed, and the diffs that lead from each output to the latest one,
+    one attempt at a time, which stay small for near-identical outputs.
+    """
+    earlier = attempts[:-1]
+    if not earlier:
+        return ""
+
+    lines = ["Earlier attempts failed:"]
+    seen_errors: Dict[str, int] = {}
+    for number, attempt in enumerate(earlier, 1):
+        if attempt.error in seen_errors:
+            lines.append(
+                f"Attempt {number} failed with the same error as attempt"
+                f" {seen_errors[attempt.error]}."
+            )
+        else:
+            seen_errors[attempt.error] = number
+            lines.append(f"Attempt {number} failed with: {attempt.error}")
+
+        following = attempts[number]
+        if not attempt.output or not following.output:
+            continue
+        # drop the file headers and hunk positions, keep the changed lines
+        diff = [
+            line
+            for line in list(
+                difflib.unified_diff(
+                    attempt.output.splitlines(),
+                    following.output.splitlines(),
+                    lineterm="",
+                    n=0,
+                )
+            )[2:]
+            if not line.startswith("@@")
+        ]
+        target = (
+            "the latest attempt" if number == len(earlier) else f"attempt {number + 1}"
+        )
+        if diff:
+            lines.extend([f"Changes from attempt {number} to {target}:", "```diff"])
+            lines.extend([*diff, "```"])
+        else:
+            lines.append(f"Attempt {number} was identical to {target}.")
+    return "\n".join(lines)
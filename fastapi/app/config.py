@@ -1,8 +1,133 @@
 """Configuration for the app."""
+import os
 from pathlib import Path
 
 DIAGRAM_CONFIG_PATH = Path("app/config/diagram_config.json")
 LLM_CONFIG_PATH = Path("app/config/llm_config.json")
 
+CACHE_DIR = Path(os.getenv("CACHE_DIR", ".cache"))
+
 OPEN_AI_VENDOR = "open_ai"
 ANTHROPIC_AI_VENDOR = "anthropic"
+
+# Shared async LLM clients: one pooled HTTP client per vendor for the whole app.
+# The OpenAI SDK picks up OPENAI_BASE_URL from the environment by itself.
+ANTHROPIC_BASE_URL = os.getenv("ANTHROPIC_BASE_URL")
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+LLM_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("LLM_KEEPALIVE_EXPIRY_SECONDS", "30"))
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "10"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "120"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+
+# Completion cache: "off", "cache" (serve hits younger than the TTL), "record"
+# (always call the LLM and store responses) or "replay" (offline, stored only).
+LLM_CACHE_MODE = os.getenv("LLM_CACHE_MODE", "cache")
+LLM_CACHE_DIR = Path(os.getenv("LLM_CACHE_DIR", str(CACHE_DIR / "llm_completions")))
+LLM_CACHE_DISK_MB = int(os.getenv("LLM_CACHE_DISK_MB", "256"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", "86400"))
+
+# Default (requests, tokens) per minute for each vendor; models can override
+# them with requests_per_minute / tokens_per_minute in llm_config.json.
+LLM_RATE_LIMITS = {
+    OPEN_AI_VENDOR: (
+        int(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "60")),
+        int(os.getenv("OPENAI_TOKENS_PER_MINUTE", "90000")),
+    ),
+    ANTHROPIC_AI_VENDOR: (
+        int(os.getenv("ANTHROPIC_REQUESTS_PER_MINUTE", "50")),
+        int(os.getenv("ANTHROPIC_TOKENS_PER_MINUTE", "100000")),
+    ),
+}
+
+# Directories the folder walker never descends into
+WALK_PRUNED_DIRECTORIES = frozenset(
+    os.getenv(
+        "WALK_PRUNED_DIRECTORIES",
+        ".git,.hg,.svn,node_modules,.venv,venv,__pycache__,.mypy_cache,"
+        ".pytest_cache,.ruff_cache,.tox,.next",
+    ).split(",")
+)
+
+# Per-repository index of Python outlines, refreshed by a stat sweep; a sweep
+# younger than REPOSITORY_INDEX_MAX_AGE_SECONDS is reused as is
+REPOSITORY_INDEX_DIR = Path(
+    os.getenv("REPOSITORY_INDEX_DIR", str(CACHE_DIR / "repository_index"))
+)
+REPOSITORY_INDEX_MAX_AGE_SECONDS = float(
+    os.getenv("REPOSITORY_INDEX_MAX_AGE_SECONDS", "2")
+)
+
+# Python files are outlined by OUTLINE_WORKERS processes, OUTLINE_CHUNK_SIZE
+# files per task, and outlines are cached in memory by content hash
+OUTLINE_WORKERS = int(os.getenv("OUTLINE_WORKERS", str(os.cpu_count() or 1)))
+OUTLINE_CHUNK_SIZE = int(os.getenv("OUTLINE_CHUNK_SIZE", "32"))
+OUTLINE_CACHE_ENTRIES = int(os.getenv("OUTLINE_CACHE_ENTRIES", "50000"))
+
+# Directory analysis runs in ANALYSIS_THREADS threads, at most
+# ANALYSIS_CONCURRENCY scans at once, each stopped after ANALYSIS_TIMEOUT_SECONDS
+ANALYSIS_THREADS = int(os.getenv("ANALYSIS_THREADS", "4"))
+ANALYSIS_CONCURRENCY = int(os.getenv("ANALYSIS_CONCURRENCY", "2"))
+ANALYSIS_TIMEOUT_SECONDS = float(os.getenv("ANALYSIS_TIMEOUT_SECONDS", "120"))
+
+# Import graphs and class hierarchies built from the code, without an LLM, are
+# folded to shallower packages or cut until they have CODE_DIAGRAM_MAX_NODES nodes
+CODE_DIAGRAM_MAX_NODES = int(os.getenv("CODE_DIAGRAM_MAX_NODES", "60"))
+
+# Threads tiktoken may use to encode one batch of texts
+TOKENIZER_THREADS = int(os.getenv("TOKENIZER_THREADS", "8"))
+# Count Anthropic tokens with the SDK's tokenizer (needs the `tokenizers`
+# package) instead of the offline estimate
+ANTHROPIC_EXACT_TOKEN_COUNT = (
+    os.getenv("ANTHROPIC_EXACT_TOKEN_COUNT", "false").lower() == "true"
+)
+
+# Mermaid rendering: "pool" keeps warm headless-browser workers around,
+# "cli" spawns a one-shot `mmdc` process for every render.
+MERMAID_RENDER_MODE = os.getenv("MERMAID_RENDER_MODE", "pool")
+MERMAID_THEME = os.getenv("MERMAID_THEME", "default")
+# one-shot CLI renders in flight; the pool runs MERMAID_POOL_SIZE at a time
+MERMAID_RENDER_CONCURRENCY = int(os.getenv("MERMAID_RENDER_CONCURRENCY", "2"))
+MERMAID_RENDER_TIMEOUT_SECONDS = float(
+    os.getenv("MERMAID_RENDER_TIMEOUT_SECONDS", "30")
+)
+MERMAID_RENDER_WORKER_PATH = Path("app/renderer/mermaid_render_worker.mjs")
+MERMAID_POOL_SIZE = int(os.getenv("MERMAID_POOL_SIZE", "2"))
+MERMAID_POOL_QUEUE_SIZE = int(os.getenv("MERMAID_POOL_QUEUE_SIZE", "32"))
+MERMAID_POOL_MAX_RENDERS = int(os.getenv("MERMAID_POOL_MAX_RENDERS", "200"))
+MERMAID_POOL_MAX_RSS_MB = int(os.getenv("MERMAID_POOL_MAX_RSS_MB", "768"))
+MERMAID_POOL_HEALTHCHECK_SECONDS = float(
+    os.getenv("MERMAID_POOL_HEALTHCHECK_SECONDS", "30")
+)
+MERMAID_POOL_STARTUP_TIMEOUT_SECONDS = float(
+    os.getenv("MERMAID_POOL_STARTUP_TIMEOUT_SECONDS", "60")
+)
+# after the pool fails to start, renders use the CLI for this long before the
+# pool is tried again; the wait doubles with every failure in a row
+MERMAID_POOL_RETRY_SECONDS = float(os.getenv("MERMAID_POOL_RETRY_SECONDS", "60"))
+
+MERMAID_RENDER_CACHE_ENTRIES = int(os.getenv("MERMAID_RENDER_CACHE_ENTRIES", "256"))
+MERMAID_RENDER_CACHE_DIR = CACHE_DIR / "mermaid_renders"
+MERMAID_RENDER_CACHE_DISK_MB = int(os.getenv("MERMAID_RENDER_CACHE_DISK_MB", "256"))
+# failed renders are cached for a while only: the browser may have been at fault
+MERMAID_RENDER_CACHE_ERROR_TTL_SECONDS = float(
+    os.getenv("MERMAID_RENDER_CACHE_ERROR_TTL_SECONDS", "300")
+)
+# Hedged diagram generation: a second conversation starts when the first has
+# produced nothing for MERMAID_HEDGE_DELAY_SECONDS, and the budget caps what a
+# single request may spend across all of its conversations.
+MERMAID_HEDGE_DELAY_SECONDS = float(os.getenv("MERMAID_HEDGE_DELAY_SECONDS", "30"))
+MERMAID_MAX_PARALLEL_CONVERSATIONS = int(
+    os.getenv("MERMAID_MAX_PARALLEL_CONVERSATIONS", "2")
+)
+MERMAID_MAX_CONVERSATIONS = int(os.getenv("MERMAID_MAX_CONVERSATIONS", "3"))
+MERMAID_MAX_LLM_CALLS = int(os.getenv("MERMAID_MAX_LLM_CALLS", "10"))
+# 0 sizes the token budget from the model: its context for every allowed call
+MERMAID_MAX_REQUEST_TOKENS = int(os.getenv("MERMAID_MAX_REQUEST_TOKENS", "0"))
+MERMAID_VALIDATE = os.getenv("MERMAID_VALIDATE", "true").lower() == "true"
+MERMAID_PARSER_CACHE_PATH = CACHE_DIR / "mermaid_parser.lark"
+# Token budget of the diagram instructions when no model is selected; with a
+# model they are packed to leave room for the tools and the answer.
+INSTRUCTIONS_DEFAULT_MAX_TOKENS = int(
+    os.getenv("INSTRUCTIONS_DEFAULT_MAX_TOKENS", "7500")
+)
@@ -13,9 +13,25 @@ class LLMException(Exception):
     """Base exception for LLM errors"""
 
 
+class LLMCacheMissError(LLMException):
+    """Exception raised when replaying a completion that was never recorded."""
+
+
 class OpenAIException(Exception):
     """Exception raised when there is an error with the OpenAI API"""
 
 
 class AnthropicException(Exception):
     """Exception raised when there is an error with the Anthropic API"""
+
+
+class MermaidRenderPoolError(Exception):
+    """Exception raised when the mermaid render pool cannot serve a request."""
+
+
+class MermaidRenderTimeoutError(Exception):
+    """Exception raised when rendering a mermaid diagram takes too long."""
+
+
+class AnalysisTimeoutError(Exception):
+    """Exception raised when a directory analysis overruns its deadline."""
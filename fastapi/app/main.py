@@ -14,8 +14,17 @@ from .routes import (
     llm_routes,
     mermaid_routes,
 )
+from .services.analysis_executor import stop_analysis_executor
 from .services.diagram_service import load_diagram_config
-from .services.llm_service import load_llm_config
+from .services.llm_service import (
+    close_llm_clients,
+    configure_rate_limits,
+    load_llm_config,
+    start_llm_clients,
+)
+from .services.mermaid_generator import start_render_pool, stop_render_pool
+from .services.outline_engine import stop_outline_pool
+from .utils.mermaid_parser import get_validator
 
 # , format="<green>{time}</green> <level>{message}</level>"
 
@@ -27,10 +36,26 @@ app = FastAPI(debug=True)
 
 
 @app.on_event("startup")
-async def startup_event():
+async def startup_event() -> None:
     """Load configs on startup."""
     app.state.diagram_config = await load_diagram_config()
     app.state.llm_config = await load_llm_config()
+    configure_rate_limits(app.state.llm_config)
+    start_llm_clients()
+    # load (or compile and cache) the validator's parse tables up front
+    get_validator()
+
+    # falls back to the CLI, and tries again later, if the pool cannot start
+    await start_render_pool()
+
+
+@app.on_event("shutdown")
+async def shutdown_event() -> None:
+    """Stop background workers on shutdown."""
+    await stop_render_pool()
+    await close_llm_clients()
+    stop_analysis_executor()
+    stop_outline_pool()
 
 
 origins = [
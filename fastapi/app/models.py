@@ -21,6 +21,8 @@ class DiagramDefinition(BaseModel):
     id: str
     name: str
     description: str
+    # set for diagrams generated from the code itself, without an LLM
+    generator: Optional[str] = None
 
 
 class DiagramConfig(BaseModel):
@@ -37,6 +39,8 @@ class LLMDefinition(BaseModel):
     name: str
     description: str
     max_token_length: int
+    requests_per_minute: Optional[int] = None
+    tokens_per_minute: Optional[int] = None
 
 
 class LLMConfig(BaseModel):
@@ -58,3 +62,16 @@ class MermaidDesignRequest(BaseModel):
     git_ignore_file_path: Optional[str]
     llm_vendor_for_instructions: str
     llm_model_for_instructions: str
+
+
+class SymbolModel(BaseModel):
+    """Pydantic model for a symbol of the code index."""
+
+    module: str
+    path: str
+    kind: str
+    name: str
+    qualname: str
+    signature: str
+    doc: str
+    line: int
@@ -0,0 +1,74 @@
+// Long-lived Mermaid renderer used by app/services/mermaid_render_pool.py.
+//
+// Keeps one headless browser open and answers newline-delimited JSON requests
+// read from stdin with exactly one JSON header line on stdout per request.
+// Rendered SVGs follow their header as `length` raw bytes, so they are never
+// escaped into JSON strings:
+//
+//   {"id": 1, "op": "render", "definition": "graph TD; A-->B"}
+//   {"id": 1, "ok": true, "length": 5123}<5123 bytes of SVG>
+//
+//   {"id": 2, "op": "ping"}
+//   {"id": 2, "ok": true}
+//
+// mermaid-cli is resolved from the global npm prefix (the Dockerfile installs
+// it with `npm install -g`), override with MERMAID_CLI_ROOT if needed.
+import { execSync } from "node:child_process";
+import { createRequire } from "node:module";
+import path from "node:path";
+import readline from "node:readline";
+import { pathToFileURL } from "node:url";
+
+const npmRoot =
+  process.env.MERMAID_CLI_ROOT || execSync("npm root -g").toString().trim();
+const cliDir = path.join(npmRoot, "@mermaid-js", "mermaid-cli");
+const requireFromCli = createRequire(path.join(cliDir, "package.json"));
+
+const { version } = requireFromCli("./package.json");
+const { renderMermaid } = await import(
+  pathToFileURL(path.join(cliDir, "src", "index.js")).href
+);
+const puppeteerModule = await import(
+  pathToFileURL(requireFromCli.resolve("puppeteer")).href
+);
+const puppeteer = puppeteerModule.default ?? puppeteerModule;
+
+const browser = await puppeteer.launch({ headless: "new" });
+
+function reply({ body, ...header }) {
+  if (body === undefined) {
+    process.stdout.write(`${JSON.stringify(header)}\n`);
+    return;
+  }
+  process.stdout.write(`${JSON.stringify({ ...header, length: body.length })}\n`);
+  process.stdout.write(body);
+}
+
+async function handle(request) {
+  if (request.op === "ping") {
+    return { id: request.id, ok: browser.isConnected() };
+  }
+
+  try {
+    const { data } = await renderMermaid(browser, request.definition, "svg", {
+      backgroundColor: request.backgroundColor ?? "white",
+      mermaidConfig: { theme: request.theme ?? "default" },
+    });
+    return { id: request.id, ok: true, body: data };
+  } catch (err) {
+    return { id: request.id, ok: false, error: String(err?.stack ?? err) };
+  }
+}
+
+reply({ ready: true, version });
+
+// Requests are handled one at a time; the pool never sends a second request
+// to a worker before the previous reply has been read.
+const lines = readline.createInterface({ input: process.stdin });
+for await (const line of lines) {
+  if (line.trim()) {
+    reply(await handle(JSON.parse(line)));
+  }
+}
+
+await browser.close();
@@ -1,6 +1,7 @@
 """Diagram generation routes"""
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
 
 from loguru import logger
 from pydantic import BaseModel, validator  # pylint: disable=no-name-in-module
@@ -8,15 +9,30 @@ from starlette.requests import Request
 
 from fastapi import APIRouter, HTTPException, Query
 
+from ..config import INSTRUCTIONS_DEFAULT_MAX_TOKENS, OPEN_AI_VENDOR
+from ..exceptions import AnalysisTimeoutError
 from ..models import DiagramDefinition
 from ..services.diagram_service import get_category_by_id, get_diagram_by_id
-from ..services.directory_analysis_service import folder_report, folder_tree
+from ..services.directory_analysis_service import (
+    SOURCE_REPOS_FOLDER,
+    folder_report,
+    folder_tree,
+)
+from ..services.llm_service import get_llm_by_id
+from ..services.mermaid_service import instructions_token_budget
+from ..utils.context_packing import pack_code_outline, pack_folder_tree
+from ..utils.llm_utils import num_tokens_from_static_string, num_tokens_from_strings
 
 router = APIRouter()
 
+# heading and code fences around a packed section
+FOLDER_TREE_SECTION = "### Folder Tree:\n```\n{}\n```\n\n"
+CODE_OUTLINE_SECTION = "### Python Code Outline:\n```\n{}\n```\n"
 
+
+@lru_cache(maxsize=16)
 def load_template(template_path: str) -> str:
-    """Load a template file and return its content as a string"""
+    """Load a template file and return its content as a string, read once"""
     with open(template_path, "r", encoding="utf-8") as file:
         return file.read()
 
@@ -74,7 +90,7 @@ async def get_folder_content(
     payload: DiagramPayload,
 ) -> Tuple[Optional[str], Optional[str]]:
     """Get the folder content for the payload"""
-    source_folder = "/source-repos/" + payload.source_folder_option
+    source_folder = SOURCE_REPOS_FOLDER + payload.source_folder_option
     git_ignore_file_path_str = (
         str(payload.git_ignore_file_path)
         if payload.git_ignore_file_path and payload.git_ignore_file_path != Path(".")
@@ -92,6 +108,8 @@ async def get_folder_content(
             )
         except DiagramGenerationException as err:
             handle_generation_exception(err)
+        except AnalysisTimeoutError as err:
+            raise HTTPException(status_code=504, detail=str(err)) from err
 
     if payload.include_python_code_outline:
         try:
@@ -100,6 +118,8 @@ async def get_folder_content(
             )
         except DiagramGenerationException as err:
             handle_generation_exception(err)
+        except AnalysisTimeoutError as err:
+            raise HTTPException(status_code=504, detail=str(err)) from err
 
     return folder_tree_content, folder_report_content
 
@@ -109,8 +129,14 @@ def construct_payload_dump(
     folder_report_content: Optional[str],
     diagram: Optional[DiagramDefinition],
     category_name: Optional[str],
+    max_tokens: int = INSTRUCTIONS_DEFAULT_MAX_TOKENS,
+    llm_vendor: str = OPEN_AI_VENDOR,
 ) -> str:
-    """Construct payload dump"""
+    """
+    Construct payload dump of at most about `max_tokens` tokens. The folder
+    tree gets up to a third of what the template leaves, the code outline the
+    rest; both are cut at whole lines, most important entries first.
+    """
     template_path = (
         Path(__file__).parent.parent
         / "templates/generate_diagram_instructions_08112023.txt"
@@ -124,19 +150,43 @@ def construct_payload_dump(
     )
 
     dump = template_dump + "\n\n"
+    remaining = max_tokens - num_tokens_from_static_string(template_dump, llm_vendor)
+
+    def count_lines(lines: List[str]) -> List[int]:
+        return num_tokens_from_strings(lines, llm_vendor)
+
+    def section_tokens(section: str) -> int:
+        return num_tokens_from_static_string(section.format(""), llm_vendor)
 
     if folder_tree_content:
-        dump += (  # todo: remove 30000 limit
-            f"### Folder Tree:\n```\n{folder_tree_content[:30000]}\n```\n\n"
+        tree_budget = remaining // 3 if folder_report_content else remaining
+        wrapper_tokens = section_tokens(FOLDER_TREE_SECTION)
+        packed_tree, used = pack_folder_tree(
+            folder_tree_content, tree_budget - wrapper_tokens, count_lines
         )
+        remaining -= used + wrapper_tokens
+        dump += FOLDER_TREE_SECTION.format(packed_tree)
     if folder_report_content:
-        dump += (  # todo: remove 30000 limit
-            f"### Python Code Outline:\n```\n{folder_report_content[:30000]}\n```\n"
+        packed_report, _ = pack_code_outline(
+            folder_report_content,
+            remaining - section_tokens(CODE_OUTLINE_SECTION),
+            count_lines,
         )
+        dump += CODE_OUTLINE_SECTION.format(packed_report)
 
     return dump
 
 
+def instructions_max_tokens(request: Request, llm_model: Optional[str]) -> int:
+    """Token budget of the instructions for the selected model, if any."""
+    if not llm_model:
+        return INSTRUCTIONS_DEFAULT_MAX_TOKENS
+    llm_definition = get_llm_by_id(request.app.state.llm_config, llm_model)
+    if llm_definition is None:
+        raise HTTPException(status_code=400, detail=f"Unknown LLM model {llm_model}")
+    return instructions_token_budget(llm_definition)
+
+
 @router.get("/generate_diagram_instructions")
 async def generate_diagram_instructions(
     request: Request,
@@ -146,6 +196,8 @@ async def generate_diagram_instructions(
     include_folder_tree: bool = Query(...),
     include_python_code_outline: bool = Query(...),
     git_ignore_file_path: Optional[str] = Query(None),
+    llm_vendor_for_instructions: str = Query(OPEN_AI_VENDOR),
+    llm_model_for_instructions: Optional[str] = Query(None),
 ):
     """Generate diagram instructions"""
     payload = create_payload(
@@ -167,6 +219,8 @@ async def generate_diagram_instructions(
         folder_report_content,
         diagram,
         category_name,
+        instructions_max_tokens(request, llm_model_for_instructions),
+        llm_vendor_for_instructions,
     )
 
     response = {"status": "success", "payload": dump}
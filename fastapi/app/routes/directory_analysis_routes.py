@@ -1,21 +1,42 @@
 """Folder report endpoint."""
 import os
 from pathlib import Path
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional
 
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import PlainTextResponse
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
 
+from ..exceptions import AnalysisTimeoutError
+from ..models import SymbolModel
+from ..services.analysis_executor import run_analysis
+from ..services.code_diagram_service import code_diagram
 from ..services.directory_analysis_service import (
     find_gitignore,
     folder_report,
+    folder_symbols,
     folder_tree,
     read_folder,
+    stream_folder_report,
+    stream_folder_tree,
 )
 
 router = APIRouter()
 
 
+async def plain_text_stream(chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+    """
+    Pass a streamed analysis through. The response has already started when
+    its deadline passes, so the body ends with an error line and the
+    connection is aborted rather than closed as if the body were complete.
+    """
+    try:
+        async for chunk in chunks:
+            yield chunk
+    except AnalysisTimeoutError as ex:
+        yield f"\nERROR: {ex}\n"
+        raise
+
+
 def get_source_folder() -> str:
     """Get and validate the SOURCE_FOLDER environment variable."""
     source_folder = os.getenv("SOURCE_FOLDER")
@@ -38,35 +59,129 @@ def get_source_folder() -> str:
 async def folder_report_endpoint(
     root_folder: str,
     ignore_file_path: Optional[str] = None,
-):
+) -> str:
     """Endpoint to get a report of the python code outline of a folder."""
     try:
         return await folder_report(root_folder, ignore_file_path)
     except ValueError as ex:
         raise HTTPException(status_code=404, detail=str(ex)) from ex
+    except AnalysisTimeoutError as ex:
+        raise HTTPException(status_code=504, detail=str(ex)) from ex
 
 
 @router.get("/folder_tree/", response_class=PlainTextResponse)
 async def folder_tree_endpoint(
     root_folder: str,
     ignore_file_path: Optional[str] = None,
-):
+) -> str:
     """Endpoint to get a file tree of a folder."""
     try:
         return await folder_tree(root_folder, ignore_file_path)
     except ValueError as ex:
         raise HTTPException(status_code=404, detail=str(ex)) from ex
+    except AnalysisTimeoutError as ex:
+        raise HTTPException(status_code=504, detail=str(ex)) from ex
+
+
+@router.get("/symbols/", response_model=List[SymbolModel])
+async def symbols_endpoint(
+    root_folder: str,
+    ignore_file_path: Optional[str] = None,
+    package: Optional[str] = None,
+    kind: Optional[str] = Query(None, pattern="^(module|class|function|method)$"),
+    name: Optional[str] = None,
+) -> List[SymbolModel]:
+    """
+    Endpoint to query the modules, classes, functions and methods of a
+    folder, by package, kind and name glob, e.g. `kind=class&name=*Service`.
+    """
+    try:
+        records = await folder_symbols(
+            root_folder, ignore_file_path, package, kind, name
+        )
+    except ValueError as ex:
+        raise HTTPException(status_code=404, detail=str(ex)) from ex
+    except AnalysisTimeoutError as ex:
+        raise HTTPException(status_code=504, detail=str(ex)) from ex
+    return [
+        SymbolModel(
+            module=record.module,
+            path=record.path,
+            kind=record.symbol.kind,
+            name=record.name,
+            qualname=record.symbol.qualname,
+            signature=record.symbol.signature,
+            doc=record.symbol.doc,
+            line=record.symbol.line,
+        )
+        for record in records
+    ]
+
+
+@router.get("/code_diagram/", response_class=PlainTextResponse)
+async def code_diagram_endpoint(
+    root_folder: str,
+    generator: str = Query(..., pattern="^(import_graph|class_hierarchy)$"),
+    ignore_file_path: Optional[str] = None,
+    package: Optional[str] = None,
+    depth: Optional[int] = Query(None, ge=1),
+) -> str:
+    """
+    Endpoint to get the Mermaid definition of an import graph or a class
+    hierarchy built from the code of a folder, without an LLM.
+    """
+    try:
+        diagram = await code_diagram(
+            root_folder, generator, ignore_file_path, package, depth
+        )
+    except ValueError as ex:
+        raise HTTPException(status_code=404, detail=str(ex)) from ex
+    except AnalysisTimeoutError as ex:
+        raise HTTPException(status_code=504, detail=str(ex)) from ex
+    return diagram.definition
+
+
+@router.get("/folder_report/stream/", response_class=StreamingResponse)
+async def folder_report_stream_endpoint(
+    root_folder: str,
+    ignore_file_path: Optional[str] = None,
+) -> StreamingResponse:
+    """
+    Endpoint to stream the report of the python code outline of a folder,
+    one file at a time, without building it in memory.
+    """
+    try:
+        report = stream_folder_report(root_folder, ignore_file_path)
+    except ValueError as ex:
+        raise HTTPException(status_code=404, detail=str(ex)) from ex
+    return StreamingResponse(plain_text_stream(report), media_type="text/plain")
+
+
+@router.get("/folder_tree/stream/", response_class=StreamingResponse)
+async def folder_tree_stream_endpoint(
+    root_folder: str,
+    ignore_file_path: Optional[str] = None,
+) -> StreamingResponse:
+    """Endpoint to stream the file tree of a folder as it is walked."""
+    try:
+        tree = stream_folder_tree(root_folder, ignore_file_path)
+    except ValueError as ex:
+        raise HTTPException(status_code=404, detail=str(ex)) from ex
+    return StreamingResponse(plain_text_stream(tree), media_type="text/plain")
 
 
 @router.get("/source_folders/", response_model=List[str])
-async def read_python_projects_endpoint():
+async def read_python_projects_endpoint() -> List[str]:
     """Endpoint to get all python projects in the source folder."""
     source_folder = get_source_folder()
-    return await read_folder(source_folder)
+    try:
+        return await read_folder(source_folder)
+    except AnalysisTimeoutError as ex:
+        raise HTTPException(status_code=504, detail=str(ex)) from ex
 
 
 @router.get("/gitignore_file/", response_model=Optional[str])
-async def gitignore_file_endpoint(root_folder: str):
+async def gitignore_file_endpoint(root_folder: str) -> Optional[str]:
     """Endpoint to get the path of the first .gitignore file."""
     try:
         source_folder = get_source_folder()
@@ -78,6 +193,11 @@ async def gitignore_file_endpoint(root_folder: str):
                 detail="folder does not exist or is not a directory",
             )
 
-        return find_gitignore(str(path))
+        return await run_analysis(
+            ("find_gitignore", str(path.resolve())),
+            lambda deadline: find_gitignore(str(path), deadline),
+        )
     except ValueError as ex:
         raise HTTPException(status_code=404, detail=str(ex)) from ex
+    except AnalysisTimeoutError as ex:
+        raise HTTPException(status_code=504, detail=str(ex)) from ex
@@ -1,14 +1,19 @@
 """LLM routes."""
 
-from typing import Dict, Union
+from typing import Dict, List, Union
 
 from pydantic import BaseModel  # pylint: disable=no-name-in-module
+from starlette.concurrency import run_in_threadpool
 from starlette.requests import Request
 
 from fastapi import APIRouter
 
 from ..models import LLMConfig
-from ..utils.llm_utils import estimate_word_count, num_tokens_from_string
+from ..utils.llm_utils import (
+    estimate_word_count,
+    num_tokens_from_string,
+    num_tokens_from_strings,
+)
 
 
 class TextRequest(BaseModel):
@@ -18,6 +23,13 @@ class TextRequest(BaseModel):
     llm_vendor: str
 
 
+class TextBatchRequest(BaseModel):
+    """Request model for a batch of texts."""
+
+    texts: List[str]
+    llm_vendor: str
+
+
 router = APIRouter()
 
 
@@ -32,7 +44,27 @@ async def token_count(request: TextRequest) -> Dict[str, Union[int, str]]:
     """Endpoint to count words in text."""
     count = num_tokens_from_string(request.text, request.llm_vendor)
     return {
-        "token_count": 0,  # count,
+        "token_count": count,
         "llm_vendor": request.llm_vendor,
         "est_words": estimate_word_count(count),
     }
+
+
+@router.post(
+    "/token_count/batch",
+    response_model=Dict[str, Union[List[int], int, str]],
+)
+async def token_count_batch(
+    request: TextBatchRequest,
+) -> Dict[str, Union[List[int], int, str]]:
+    """Endpoint to count the tokens of many texts at once."""
+    counts = await run_in_threadpool(
+        num_tokens_from_strings, request.texts, request.llm_vendor
+    )
+    total = sum(counts)
+    return {
+        "token_counts": counts,
+        "total_tokens": total,
+        "llm_vendor": request.llm_vendor,
+        "est_words": estimate_word_count(total),
+    }
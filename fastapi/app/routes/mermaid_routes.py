@@ -1,24 +1,35 @@
 """ Mermaid diagram route. """ ""
 
+import json
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from loguru import logger
 from starlette.requests import Request
+from starlette.responses import StreamingResponse
 
 from fastapi import APIRouter, Body, HTTPException
 
-from ..exceptions import MermaidUnexpectedError
-from ..models import MermaidDesignRequest
+from ..exceptions import (
+    AnalysisTimeoutError,
+    MermaidCliError,
+    MermaidUnexpectedError,
+)
+from ..models import LLMDefinition, MermaidDesignRequest
+from ..services.code_diagram_service import (
+    code_diagram_request,
+    code_diagram_request_stream,
+)
+from ..services.diagram_service import get_diagram_by_id
 from ..services.llm_service import get_llm_by_id
-from ..services.mermaid_service import MermaidCliError, mermaid_request
+from ..services.mermaid_service import mermaid_request, mermaid_request_stream
 
 router = APIRouter()
 
 
-@router.post("/mermaid_design_request/")
-async def mermaid_request_endpoint(
-    request: Request,
-    mermaid_design_request: MermaidDesignRequest = Body(...),
-):
-    """Mermaid diagram request endpoint."""
-
+def find_llm_definition(
+    request: Request, mermaid_design_request: MermaidDesignRequest
+) -> LLMDefinition:
+    """Look up the LLM the design request asks for."""
     llm_config = request.app.state.llm_config
 
     llm_definition = get_llm_by_id(
@@ -30,6 +41,57 @@ async def mermaid_request_endpoint(
             f"LLM model '{mermaid_design_request.llm_model_for_instructions}' not"
             " found."
         )
+    return llm_definition
+
+
+def find_code_diagram_generator(
+    request: Request, mermaid_design_request: MermaidDesignRequest
+) -> Optional[str]:
+    """The generator of the requested diagram if it is built from the code."""
+    diagram = get_diagram_by_id(
+        request.app.state.diagram_config, mermaid_design_request.diagram_option
+    )
+    return diagram.generator if diagram is not None else None
+
+
+async def server_sent_events(
+    events: AsyncIterator[Tuple[str, Dict[str, Any]]]
+) -> AsyncIterator[str]:
+    """
+    Format (event, data) pairs as Server-Sent Events. The response has
+    already started, so any failure is reported in-band as a "failed" event.
+    """
+    try:
+        async for event, data in events:
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    except Exception as ex:  # pylint: disable=broad-except
+        logger.opt(exception=ex).error(f"Mermaid design stream failed: {ex}")
+        yield f"event: failed\ndata: {json.dumps({'message': str(ex)})}\n\n"
+
+
+@router.post("/mermaid_design_request/")
+async def mermaid_request_endpoint(
+    request: Request,
+    mermaid_design_request: MermaidDesignRequest = Body(...),
+) -> Dict[str, str]:
+    """
+    Mermaid diagram request endpoint. Diagrams generated from the code are
+    rendered without asking the LLM.
+    """
+    generator = find_code_diagram_generator(request, mermaid_design_request)
+    if generator:
+        try:
+            return await code_diagram_request(generator, mermaid_design_request)
+        except ValueError as ex:
+            raise HTTPException(status_code=404, detail=str(ex)) from ex
+        except AnalysisTimeoutError as ex:
+            raise HTTPException(status_code=504, detail=str(ex)) from ex
+        except MermaidCliError as ex:
+            raise HTTPException(status_code=500, detail=str(ex)) from ex
+        except MermaidUnexpectedError as ex:
+            raise HTTPException(status_code=500, detail=str(ex)) from ex
+
+    llm_definition = find_llm_definition(request, mermaid_design_request)
 
     try:
         return await mermaid_request(llm_definition, mermaid_design_request)
@@ -37,3 +99,23 @@ async def mermaid_request_endpoint(
         raise HTTPException(status_code=500, detail=str(ex)) from ex
     except MermaidUnexpectedError as ex:
         raise HTTPException(status_code=500, detail=str(ex)) from ex
+
+
+@router.post("/mermaid_design_request/stream/")
+async def mermaid_request_stream_endpoint(
+    request: Request,
+    mermaid_design_request: MermaidDesignRequest = Body(...),
+) -> StreamingResponse:
+    """Mermaid diagram request endpoint streaming progress as Server-Sent Events."""
+    generator = find_code_diagram_generator(request, mermaid_design_request)
+    if generator:
+        events = code_diagram_request_stream(generator, mermaid_design_request)
+    else:
+        llm_definition = find_llm_definition(request, mermaid_design_request)
+        events = mermaid_request_stream(llm_definition, mermaid_design_request)
+
+    return StreamingResponse(
+        server_sent_events(events),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,135 @@
+"""Directory analysis off the event loop: dedicated threads, single-flight."""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Hashable,
+    Iterator,
+    Optional,
+    TypeVar,
+)
+
+from loguru import logger
+
+from ..config import (
+    ANALYSIS_CONCURRENCY,
+    ANALYSIS_THREADS,
+    ANALYSIS_TIMEOUT_SECONDS,
+)
+from ..exceptions import AnalysisTimeoutError
+from ..utils.deadline import Deadline
+
+T = TypeVar("T")
+
+analysis_executor = ThreadPoolExecutor(
+    max_workers=ANALYSIS_THREADS, thread_name_prefix="analysis"
+)
+# cap on analyses running at once, held until their thread is done
+analysis_semaphore = asyncio.Semaphore(ANALYSIS_CONCURRENCY)
+# analyses in flight by key, awaited by every caller asking for the same one
+in_flight: Dict[Hashable, "asyncio.Future[Any]"] = {}
+
+
+async def run_analysis(
+    key: Hashable,
+    work: Callable[[Deadline], T],
+    timeout: float = ANALYSIS_TIMEOUT_SECONDS,
+) -> T:
+    """
+    Run blocking analysis `work` in the analysis threads and return its
+    result. Callers asking for the same `key` while it runs share it, and a
+    caller going away does not cancel it for the others. Raises
+    AnalysisTimeoutError when it has not finished `timeout` seconds after it
+    was asked for, waiting for a free slot included; `work` gets the deadline
+    to check so it stops soon after.
+    """
+    future = in_flight.get(key)
+    if future is None:
+        future = asyncio.ensure_future(run_limited(work, Deadline(timeout)))
+        in_flight[key] = future
+        future.add_done_callback(lambda _: in_flight.pop(key, None))
+    else:
+        logger.debug(f"Joining the analysis in flight for {key}")
+    return await asyncio.shield(future)
+
+
+async def run_limited(work: Callable[[Deadline], T], deadline: Deadline) -> T:
+    """Run work in a thread once one of the ANALYSIS_CONCURRENCY slots is free."""
+    try:
+        await asyncio.wait_for(analysis_semaphore.acquire(), deadline.remaining())
+    except asyncio.TimeoutError as err:
+        raise AnalysisTimeoutError(
+            "Directory analysis timed out waiting for a free slot"
+        ) from err
+
+    loop = asyncio.get_running_loop()
+    try:
+        future = loop.run_in_executor(analysis_executor, work, deadline)
+    except BaseException:
+        analysis_semaphore.release()
+        raise
+    # the slot stays taken until the thread is done, even after a timeout
+    future.add_done_callback(lambda _: analysis_semaphore.release())
+    try:
+        return await asyncio.wait_for(asyncio.shield(future), deadline.remaining())
+    except asyncio.TimeoutError as err:
+        deadline.cancel()
+        raise AnalysisTimeoutError("Directory analysis ran past its deadline") from err
+
+
+async def stream_analysis(
+    chunks: Callable[[Deadline], Iterator[str]],
+    timeout: float = ANALYSIS_TIMEOUT_SECONDS,
+) -> AsyncIterator[str]:
+    """
+    Stream the chunks of blocking analysis, each one produced in the analysis
+    threads. Like run_analysis, a stream takes one of the ANALYSIS_CONCURRENCY
+    slots, which it holds until it ends, and raises AnalysisTimeoutError once
+    `timeout` seconds have passed. Streams are not shared between callers.
+    """
+    deadline = Deadline(timeout)
+    try:
+        await asyncio.wait_for(analysis_semaphore.acquire(), deadline.remaining())
+    except asyncio.TimeoutError as err:
+        raise AnalysisTimeoutError(
+            "Directory analysis timed out waiting for a free slot"
+        ) from err
+
+    loop = asyncio.get_running_loop()
+    iterator: Iterator[str] = iter(())
+    future: Optional["asyncio.Future[Optional[str]]"] = None
+    try:
+        iterator = chunks(deadline)
+        while True:
+            future = loop.run_in_executor(analysis_executor, next, iterator, None)
+            chunk = await future
+            future = None
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        # a client going away stops the work at its next deadline check
+        deadline.cancel()
+        if future is None or future.done():
+            iterator_done(iterator)
+        else:
+            # the slot stays taken until the thread is done
+            future.add_done_callback(lambda _: iterator_done(iterator))
+
+
+def iterator_done(iterator: Iterator[str]) -> None:
+    """Close a finished stream's iterator and give back its analysis slot."""
+    try:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+    finally:
+        analysis_semaphore.release()
+
+
+def stop_analysis_executor() -> None:
+    """Stop the analysis threads once their current work is done."""
+    analysis_executor.shutdown(wait=False, cancel_futures=True)
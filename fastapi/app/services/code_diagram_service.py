@@ -0,0 +1,378 @@
+"""Import graph and class hierarchy diagrams generated from the code, without an LLM."""
+import ast
+import os
+from collections import defaultdict
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from loguru import logger
+
+from ..config import CODE_DIAGRAM_MAX_NODES
+from ..exceptions import MermaidCliError
+from ..models import MermaidDesignRequest, MermaidModel
+from ..utils.deadline import Deadline
+from .analysis_executor import run_analysis
+from .directory_analysis_service import (
+    SOURCE_REPOS_FOLDER,
+    check_folder_arguments,
+    get_repository_index,
+)
+from .mermaid_generator import create_mermaid_diagram
+from .outline_engine import Import
+from .repository_index import IndexedFile, module_name
+
+IMPORT_GRAPH = "import_graph"
+CLASS_HIERARCHY = "class_hierarchy"
+CODE_DIAGRAM_GENERATORS = (IMPORT_GRAPH, CLASS_HIERARCHY)
+
+
+class CodeDiagram(NamedTuple):
+    """A Mermaid definition built from the code, with what it shows."""
+
+    definition: str
+    explanation: str
+    # same values as the diagram_type the LLM is asked for
+    diagram_type: str
+
+
+class PythonModule(NamedTuple):
+    """An indexed Python file under its dotted module name."""
+
+    name: str
+    is_package: bool
+    record: IndexedFile
+
+
+def indexed_modules(files: List[Tuple[str, IndexedFile]]) -> List[PythonModule]:
+    """The modules of the indexed files, in tree order."""
+    return [
+        PythonModule(module_name(path), os.path.basename(path) == "__init__.py", record)
+        for path, record in files
+    ]
+
+
+def imported_name(module: PythonModule, item: Import) -> str:
+    """
+    Absolute dotted name an import refers to: a module, or a name defined
+    in one. Relative imports are resolved from the importing module.
+    """
+    source = item.module
+    if item.level:
+        package = module.name.split(".")
+        if not module.is_package:
+            package = package[:-1]
+        package = package[: max(len(package) - (item.level - 1), 0)]
+        source = ".".join(part for part in (*package, item.module) if part)
+    if item.name and item.name != "*":
+        return f"{source}.{item.name}" if source else item.name
+    return source
+
+
+def bound_name(module: PythonModule, item: Import) -> Optional[Tuple[str, str]]:
+    """The (name, dotted target) an import binds in the module, None for `*`."""
+    if item.name == "*":
+        return None
+    if item.alias:
+        return item.alias, imported_name(module, item)
+    if item.name:
+        return item.name, imported_name(module, item)
+    # `import a.b` binds `a`
+    first = item.module.split(".")[0]
+    return first, first
+
+
+class ModuleResolver:
+    """
+    Finds which module of the repository a dotted name belongs to.
+
+    Module names are relative to the folder, so a package under `src/` is
+    named `src.package`. A name that is not found as is also matches the
+    modules it is a dotted suffix of, if what the suffix leaves out is not
+    a package, e.g. `package.module` matches `src.package.module` but not
+    `app.package.module` when `app` has an __init__.py. Among several, the
+    one closest to the importer wins.
+    """
+
+    def __init__(self, modules: List[PythonModule]):
+        self.names = {module.name for module in modules}
+        packages = {module.name for module in modules if module.is_package}
+        self.suffixes: Dict[str, List[str]] = defaultdict(list)
+        for name in sorted(self.names):
+            parts = name.split(".")
+            start = len(parts) - 1
+            while start > 0 and ".".join(parts[:start]) in packages:
+                start -= 1
+            for first in range(1, start + 1):
+                self.suffixes[".".join(parts[first:])].append(name)
+
+    def resolve(self, dotted: str, importer: str = "") -> Optional[Tuple[str, int]]:
+        """
+        The module defining `dotted` and how many of its parts name the
+        module, from the longest prefix of it that is a module.
+        """
+        parts = dotted.split(".")
+        for end in range(len(parts), 0, -1):
+            prefix = ".".join(parts[:end])
+            if prefix in self.names:
+                return prefix, end
+            candidates = self.suffixes.get(prefix)
+            if candidates:
+                return (
+                    max(
+                        candidates,
+                        key=lambda name: (shared_prefix(name, importer), name),
+                    ),
+                    end,
+                )
+        return None
+
+
+def shared_prefix(first: str, second: str) -> int:
+    """Number of leading dotted parts two names have in common."""
+    count = 0
+    for left, right in zip(first.split("."), second.split("."), strict=False):
+        if left != right:
+            break
+        count += 1
+    return count
+
+
+def in_package(name: str, package: Optional[str]) -> bool:
+    """Whether a module is the package or inside it, always without one."""
+    return not package or name == package or name.startswith(package + ".")
+
+
+def fold(name: str, depth: Optional[int]) -> str:
+    """A module name cut to its first `depth` parts."""
+    return name if depth is None else ".".join(name.split(".")[:depth])
+
+
+def mermaid_label(text: str) -> str:
+    """Text for a quoted Mermaid label."""
+    return text.replace('"', "#quot;")
+
+
+def import_graph(
+    modules: List[PythonModule],
+    package: Optional[str] = None,
+    depth: Optional[int] = None,
+    max_nodes: int = CODE_DIAGRAM_MAX_NODES,
+) -> CodeDiagram:
+    """
+    Flowchart of the imports between the modules of a package, or of the
+    whole folder. Without a `depth`, modules are folded into their parent
+    packages one level at a time until there are at most `max_nodes`.
+    Imports of modules outside the folder are left out.
+    """
+    resolver = ModuleResolver(modules)
+    edges: Set[Tuple[str, str]] = set()
+    names = [module.name for module in modules if in_package(module.name, package)]
+    for module in modules:
+        if not in_package(module.name, package):
+            continue
+        for item in module.record.imports:
+            target = resolver.resolve(imported_name(module, item), module.name)
+            if target is not None and in_package(target[0], package):
+                edges.add((module.name, target[0]))
+
+    deepest = max((name.count(".") + 1 for name in names), default=1)
+    if depth is None:
+        depth = deepest
+        while depth > 1 and len({fold(name, depth) for name in names}) > max_nodes:
+            depth -= 1
+    nodes = sorted({fold(name, depth) for name in names})
+    folded = sorted(
+        {(fold(source, depth), fold(target, depth)) for source, target in edges}
+    )
+    ids = {name: f"m{number}" for number, name in enumerate(nodes)}
+
+    lines = ["flowchart LR"]
+    lines += [f'    {ids[name]}["{mermaid_label(name)}"]' for name in nodes]
+    lines += [
+        f"    {ids[source]} --> {ids[target]}"
+        for source, target in folded
+        if source != target
+    ]
+    scope = f"package {package}" if package else "the folder"
+    return CodeDiagram(
+        "\n".join(lines),
+        f"Imports between {len(nodes)} modules of {scope}, generated from the"
+        " source code."
+        + (
+            f" Modules are grouped into their packages {depth}"
+            f" level{'s' if depth > 1 else ''} deep."
+            if depth < deepest
+            else ""
+        ),
+        "flowchart",
+    )
+
+
+def class_bases(signature: str) -> List[str]:
+    """Base classes of a class symbol's signature, subscripts left out."""
+    try:
+        node = ast.parse(f"class _{signature}:\n    pass").body[0]
+    except SyntaxError:
+        return []
+    assert isinstance(node, ast.ClassDef)
+    bases = []
+    for base in node.bases:
+        while isinstance(base, ast.Subscript):
+            base = base.value
+        if isinstance(base, (ast.Name, ast.Attribute)):
+            bases.append(ast.unparse(base))
+    return bases
+
+
+def class_hierarchy(
+    modules: List[PythonModule],
+    package: Optional[str] = None,
+    max_nodes: int = CODE_DIAGRAM_MAX_NODES,
+) -> CodeDiagram:
+    """
+    Class diagram of the inheritance between the classes of a package, or
+    of the whole folder. Bases are followed through imports and re-exports;
+    those defined outside the folder are shown by the name they are written
+    with. Classes without a base or subclass are left out, as is `object`,
+    and once `max_nodes` classes are shown the remaining edges are dropped.
+    """
+    resolver = ModuleResolver(modules)
+    classes: Set[str] = set()
+    bindings: Dict[str, Dict[str, str]] = {}
+    for module in modules:
+        classes.update(
+            f"{module.name}.{symbol.qualname}"
+            for symbol in module.record.symbols
+            if symbol.kind == "class"
+        )
+        names = bindings[module.name] = {}
+        for item in module.record.imports:
+            bound = bound_name(module, item)
+            if bound is not None:
+                names.setdefault(*bound)
+
+    def resolve(module: str, dotted: str, hops: int = 0) -> Optional[str]:
+        if f"{module}.{dotted}" in classes:
+            return f"{module}.{dotted}"
+        first, _, rest = dotted.partition(".")
+        target = bindings.get(module, {}).get(first)
+        if target is None or hops > 4:
+            return None
+        full = f"{target}.{rest}" if rest else target
+        owner = resolver.resolve(full, module)
+        if owner is None or owner[1] == full.count(".") + 1:
+            return None
+        return resolve(owner[0], ".".join(full.split(".")[owner[1] :]), hops + 1)
+
+    edges: List[Tuple[str, str]] = []
+    labels: Dict[str, str] = {}
+    for module in modules:
+        if not in_package(module.name, package):
+            continue
+        for symbol in module.record.symbols:
+            if symbol.kind != "class":
+                continue
+            child = f"{module.name}.{symbol.qualname}"
+            labels[child] = symbol.qualname
+            for base in class_bases(symbol.signature):
+                if base == "object":
+                    continue
+                parent = resolve(module.name, base)
+                if parent is None:
+                    parent = f"external {base}"
+                    labels[parent] = base
+                else:
+                    labels[parent] = parent.rpartition(".")[2]
+                edges.append((parent, child))
+
+    ids: Dict[str, str] = {}
+    shown: List[Tuple[str, str]] = []
+    for parent, child in edges:
+        new = [name for name in (parent, child) if name not in ids]
+        if len(ids) + len(new) > max_nodes:
+            continue
+        for name in new:
+            ids[name] = f"c{len(ids)}"
+        shown.append((parent, child))
+
+    lines = ["classDiagram"]
+    lines += [f'    class {ids[name]}["{mermaid_label(labels[name])}"]' for name in ids]
+    lines += [f"    {ids[parent]} <|-- {ids[child]}" for parent, child in shown]
+    scope = f"package {package}" if package else "the folder"
+    left_out = len(edges) - len(shown)
+    return CodeDiagram(
+        "\n".join(lines),
+        f"Inheritance between {len(ids)} classes of {scope}, generated from the"
+        " source code."
+        + (f" {left_out} more inheritance links were left out." if left_out else ""),
+        "class",
+    )
+
+
+async def code_diagram(
+    root_folder: str,
+    generator: str,
+    ignore_file_path: Optional[str] = None,
+    package: Optional[str] = None,
+    depth: Optional[int] = None,
+) -> CodeDiagram:
+    """
+    An IMPORT_GRAPH or CLASS_HIERARCHY diagram of a folder, from the same
+    index as folder_report.
+    """
+    if generator not in CODE_DIAGRAM_GENERATORS:
+        raise ValueError(f"Unknown code diagram {generator}")
+    check_folder_arguments(root_folder, ignore_file_path)
+
+    def build_diagram(deadline: Deadline) -> CodeDiagram:
+        index = get_repository_index(root_folder)
+        modules = indexed_modules(
+            index.indexed_files(index.snapshot(ignore_file_path, deadline))
+        )
+        if generator == IMPORT_GRAPH:
+            return import_graph(modules, package, depth)
+        return class_hierarchy(modules, package)
+
+    return await run_analysis(
+        (
+            "code_diagram",
+            generator,
+            os.path.abspath(root_folder),
+            ignore_file_path,
+            package,
+            depth,
+        ),
+        build_diagram,
+    )
+
+
+async def code_diagram_request(
+    generator: str, mermaid_design_request: MermaidDesignRequest
+) -> Dict[str, str]:
+    """
+    Answer a design request for a diagram generated from the code: the
+    diagram is rendered as is, without asking an LLM. Same response as
+    mermaid_request.
+    """
+    diagram = await code_diagram(
+        SOURCE_REPOS_FOLDER + mermaid_design_request.source_folder_option,
+        generator,
+        mermaid_design_request.git_ignore_file_path or None,
+    )
+    logger.info(f"Rendering {generator} generated from the code")
+    markdown_svg, err_message = await create_mermaid_diagram(
+        MermaidModel(mermaid_def_str=diagram.definition)
+    )
+    if err_message or markdown_svg is None:
+        raise MermaidCliError(err_message or "Mermaid CLI failed to generate diagram")
+    return {
+        "markdown_svg": markdown_svg.decode(),
+        "explanation": diagram.explanation,
+        "diagram_type": diagram.diagram_type,
+    }
+
+
+async def code_diagram_request_stream(
+    generator: str, mermaid_design_request: MermaidDesignRequest
+) -> AsyncIterator[Tuple[str, Dict[str, str]]]:
+    """code_diagram_request as the "result" event of mermaid_request_stream."""
+    yield "result", await code_diagram_request(generator, mermaid_design_request)
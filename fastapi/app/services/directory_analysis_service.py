@@ -1,84 +1,270 @@
 """Service for various folder tools."""
-from fnmatch import fnmatch
+import itertools
+import os
+import re
+import threading
+from fnmatch import translate
 from pathlib import Path
-from typing import List, Optional
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional
 
-from folder_tree_generator import generate_tree
-from python_code_outline import get_report
+from ..config import (
+    REPOSITORY_INDEX_DIR,
+    REPOSITORY_INDEX_MAX_AGE_SECONDS,
+    WALK_PRUNED_DIRECTORIES,
+)
+from ..utils.deadline import Deadline
+from ..utils.directory_walker import walk
+from ..utils.gitignore import GITIGNORE_FILE, GitignoreMatcher
+from .analysis_executor import run_analysis, stream_analysis
+from .repository_index import (
+    RepositoryIndex,
+    SymbolRecord,
+    repository_index_path,
+    sweep,
+    tree_header,
+    tree_line,
+)
 
+PYTHON_PROJECT_FILES = ("pyproject.toml",)
+# where the repositories picked by source_folder_option are mounted
+SOURCE_REPOS_FOLDER = "/source-repos/"
+# characters per chunk of a streamed tree or report
+STREAM_CHUNK_SIZE = 16 * 1024
 
-def find_gitignore(root_folder: str) -> Optional[str]:
+repository_indexes: Dict[str, RepositoryIndex] = {}
+repository_indexes_lock = threading.Lock()
+
+
+def find_gitignore(
+    root_folder: str, deadline: Optional[Deadline] = None
+) -> Optional[str]:
     """
-    Find the first .gitignore file starting from the root directory.
+    Find the first .gitignore file starting from the root directory, the
+    shallowest first, without entering WALK_PRUNED_DIRECTORIES.
 
     Parameters:
     - root_folder: The root directory to start searching from.
+    - deadline: Stops the search with an AnalysisTimeoutError once passed.
 
     Returns:
     - The path of the first .gitignore file found, or None if no such file is found.
     """
-    try:
-        return str(next(Path(root_folder).rglob(".gitignore")))
-    except StopIteration:
-        return None
+    for entry, _ in walk(root_folder, deadline=deadline):
+        if entry.name == GITIGNORE_FILE and entry.is_file():
+            return entry.path
+    return None
+
+
+def get_repository_index(root_folder: str) -> RepositoryIndex:
+    """The index of a repository, loaded from disk the first time it is used."""
+    root = os.path.abspath(root_folder)
+    with repository_indexes_lock:
+        if root not in repository_indexes:
+            repository_indexes[root] = RepositoryIndex(
+                root,
+                repository_index_path(REPOSITORY_INDEX_DIR, root),
+                REPOSITORY_INDEX_MAX_AGE_SECONDS,
+            )
+        return repository_indexes[root]
 
 
-def read_gitignore_patterns(root_folder: str) -> List[str]:
-    """Read the patterns from the .gitignore file in the root folder."""
-    gitignore_path = find_gitignore(root_folder)
-    if gitignore_path:
-        with open(gitignore_path, "r", encoding="utf-8") as file:
-            return [
-                line.strip()
-                for line in file.readlines()
-                if line.strip() and not line.startswith("#")
-            ]
-    return []
+def check_folder_arguments(root_folder: str, ignore_file_path: Optional[str]) -> None:
+    """Raise a ValueError if the folder or the ignore file does not exist."""
+    if not Path(root_folder).is_dir():
+        raise ValueError(f"{root_folder} is not a valid directory")
+    if ignore_file_path is not None and not Path(ignore_file_path).is_file():
+        raise ValueError(f"{ignore_file_path} is not a valid file")
 
 
 async def folder_tree(
     root_folder: str,
     ignore_file_path: Optional[str] = None,
 ) -> str:
-    """Generate a file tree of a folder."""
-
-    return generate_tree(root_folder, ignore_file_path=ignore_file_path)
+    """
+    Generate a file tree of a folder, leaving out what its .gitignore files
+    and the optional ignore file exclude.
+    """
+    check_folder_arguments(root_folder, ignore_file_path)
+    return await run_analysis(
+        ("folder_tree", os.path.abspath(root_folder), ignore_file_path),
+        lambda deadline: get_repository_index(root_folder)
+        .snapshot(ignore_file_path, deadline)
+        .tree,
+    )
 
 
 async def folder_report(
     root_folder: str,
     ignore_file_path: Optional[str] = None,
 ) -> str:
-    """Generate a report of the python code outline of a folder."""
+    """
+    Generate a report of the python code outline of a folder, leaving out
+    what its .gitignore files and the optional ignore file exclude.
+    """
+    check_folder_arguments(root_folder, ignore_file_path)
+
+    def build_report(deadline: Deadline) -> str:
+        index = get_repository_index(root_folder)
+        return index.report(index.snapshot(ignore_file_path, deadline))
 
-    return get_report(root_folder, ignore_file_path=ignore_file_path)
+    return await run_analysis(
+        ("folder_report", os.path.abspath(root_folder), ignore_file_path),
+        build_report,
+    )
+
+
+async def folder_symbols(
+    root_folder: str,
+    ignore_file_path: Optional[str] = None,
+    package: Optional[str] = None,
+    kind: Optional[str] = None,
+    name: Optional[str] = None,
+) -> List[SymbolRecord]:
+    """
+    The symbols of the Python files of a folder, from the same index as
+    folder_report, filtered by dotted package (the package and everything
+    below it), kind ("module", "class", "function" or "method") and a
+    case-sensitive glob on the symbol's name or qualified name.
+    """
+    check_folder_arguments(root_folder, ignore_file_path)
+    pattern = re.compile(translate(name)) if name else None
+
+    def matches(record: SymbolRecord) -> bool:
+        symbol = record.symbol
+        return (
+            (
+                not package
+                or record.module == package
+                or record.module.startswith(package + ".")
+            )
+            and (not kind or symbol.kind == kind)
+            and (
+                pattern is None
+                or pattern.match(record.name) is not None
+                or pattern.match(symbol.qualname) is not None
+            )
+        )
+
+    def find_symbols(deadline: Deadline) -> List[SymbolRecord]:
+        index = get_repository_index(root_folder)
+        return list(
+            filter(matches, index.symbols(index.snapshot(ignore_file_path, deadline)))
+        )
+
+    return await run_analysis(
+        (
+            "folder_symbols",
+            os.path.abspath(root_folder),
+            ignore_file_path,
+            package,
+            kind,
+            name,
+        ),
+        find_symbols,
+    )
+
+
+def stream_folder_tree(
+    root_folder: str,
+    ignore_file_path: Optional[str] = None,
+) -> AsyncIterator[str]:
+    """
+    The file tree of folder_tree, streamed as the folder is walked in the
+    analysis threads instead of built in memory. Raises a ValueError right
+    away for invalid arguments, and an AnalysisTimeoutError once
+    ANALYSIS_TIMEOUT_SECONDS have passed.
+    """
+    check_folder_arguments(root_folder, ignore_file_path)
+    root = os.path.abspath(root_folder)
+
+    def chunks(deadline: Deadline) -> Iterator[str]:
+        lines = (
+            tree_line(entry, depth) or ""
+            for entry, depth in sweep(root, ignore_file_path, deadline)
+        )
+        return coalesce(itertools.chain([tree_header(root)], lines))
+
+    return stream_analysis(chunks)
+
+
+def stream_folder_report(
+    root_folder: str,
+    ignore_file_path: Optional[str] = None,
+) -> AsyncIterator[str]:
+    """
+    The report of folder_report, streamed one file at a time as the folder
+    is walked in the analysis threads. Raises a ValueError right away for
+    invalid arguments, and an AnalysisTimeoutError once
+    ANALYSIS_TIMEOUT_SECONDS have passed.
+    """
+    check_folder_arguments(root_folder, ignore_file_path)
+
+    def sections(deadline: Deadline) -> Iterator[str]:
+        # the index is loaded on the first chunk, in an analysis thread
+        index = get_repository_index(root_folder)
+        yield from index.stream_report(ignore_file_path, deadline=deadline)
+
+    return stream_analysis(lambda deadline: coalesce(sections(deadline)))
+
+
+def coalesce(parts: Iterable[str], size: int = STREAM_CHUNK_SIZE) -> Iterator[str]:
+    """Join small parts into chunks of about `size` characters."""
+    chunk: List[str] = []
+    length = 0
+    for part in parts:
+        chunk.append(part)
+        length += len(part)
+        if length >= size:
+            yield "".join(chunk)
+            chunk, length = [], 0
+    if chunk:
+        yield "".join(chunk)
 
 
 async def read_folder(folder_path: str) -> List[str]:
+    """Get all folders in a folder, see list_folders."""
+    return await run_analysis(
+        ("read_folder", os.path.abspath(folder_path)),
+        lambda deadline: list_folders(folder_path, deadline),
+    )
+
+
+def list_folders(folder_path: str, deadline: Optional[Deadline] = None) -> List[str]:
     """
     Get all folders in a folder.
 
     Parameters:
     - folder_path: The directory path to read.
+    - deadline: Stops the walk with an AnalysisTimeoutError once passed.
 
     Returns:
-    - A list of names of all folders in the given directory. If the directory doesn't
-      exist, an empty list is returned.
+    - A list of names of all folders in the given directory. If the
+      directory doesn't exist, an empty list is returned.
     """
-    path = Path(folder_path)
+    return [
+        entry.name
+        for entry, _ in walk(folder_path, max_depth=1, deadline=deadline)
+        if entry.is_dir()
+    ]
 
-    if not path.exists() or not path.is_dir():
-        return []
 
-    return [entry.name for entry in path.iterdir() if entry.is_dir()]
+async def read_python_projects(folder_path: str) -> List[str]:
+    """Get all folders in a folder that contain a Python project."""
+    return await run_analysis(
+        ("read_python_projects", os.path.abspath(folder_path)),
+        lambda deadline: find_python_projects(folder_path, deadline),
+    )
 
 
-async def read_python_projects(folder_path: str) -> List[str]:
+def find_python_projects(
+    folder_path: str, deadline: Optional[Deadline] = None
+) -> List[str]:
     """
     Get all folders in a folder that contain a Python project.
 
     Parameters:
     - folder_path: The directory path to read.
+    - deadline: Stops the walk with an AnalysisTimeoutError once passed.
 
     Returns:
     - A list of names of all Python project folders in the given directory.
@@ -88,31 +274,48 @@ async def read_python_projects(folder_path: str) -> List[str]:
     if not path.exists() or not path.is_dir():
         return []
 
-    ignore_patterns = read_gitignore_patterns(folder_path)
+    matcher = GitignoreMatcher(folder_path)
+
+    # one walk for all folders, which are no longer entered once they qualify
+    is_project: Dict[str, bool] = {}
+    prefix = len(os.path.join(folder_path, ""))
+
+    def top_level_folder(entry: os.DirEntry[str]) -> str:
+        return entry.path[prefix:].split(os.sep, 1)[0]
+
+    def descend(entry: os.DirEntry[str]) -> bool:
+        return not is_project.get(
+            top_level_folder(entry), False
+        ) and not matcher.is_ignored_entry(entry)
+
+    for entry, depth in walk(folder_path, descend=descend, deadline=deadline):
+        if depth == 1:
+            if entry.is_dir() and entry.name not in WALK_PRUNED_DIRECTORIES:
+                is_project[entry.name] = False
+            continue
+        if is_python_project_file(entry, matcher):
+            is_project[top_level_folder(entry)] = True
+            if all(is_project.values()):
+                break
+
+    return [name for name, found in is_project.items() if found]
 
-    project_folders: List[str] = []
-    for entry in path.iterdir():
-        if entry.is_dir() and contains_python_project(entry, ignore_patterns):
-            project_folders.append(entry.name)
 
-    return project_folders
+def is_python_project_file(entry: os.DirEntry[str], matcher: GitignoreMatcher) -> bool:
+    """Whether an entry is a Python file or project file that is not ignored."""
+    if not (entry.name.endswith(".py") or entry.name in PYTHON_PROJECT_FILES):
+        return False
+    return entry.is_file() and not matcher.is_ignored_entry(entry)
 
 
 def contains_python_project(
-    directory: Path, ignore_patterns: Optional[List[str]] = None
+    directory: Path, ignore_file_path: Optional[str] = None
 ) -> bool:
-    """Check if a directory contains a Python project."""
-    if ignore_patterns is None:
-        ignore_patterns = []
-
-    for pattern in ["*.py", "pyproject.toml"]:
-        for entry in directory.rglob(pattern):
-            # Check if the entry matches any of the ignore patterns
-            if any(
-                fnmatch(str(entry), ignore_pattern)
-                for ignore_pattern in ignore_patterns
-            ):
-                continue
-            return True
-
-    return False
+    """Check if a directory contains a Python project that is not ignored."""
+    matcher = GitignoreMatcher(str(directory), ignore_file_path)
+    return any(
+        is_python_project_file(entry, matcher)
+        for entry, _ in walk(
+            str(directory), descend=lambda entry: not matcher.is_ignored_entry(entry)
+        )
+    )
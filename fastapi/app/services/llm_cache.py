@@ -0,0 +1,117 @@
+"""Disk cache of LLM completions, with record and replay modes."""
+
+import asyncio
+import json
+from pathlib import Path
+from typing import Any, List, Optional, Union
+
+from loguru import logger
+from openai.types.chat import ChatCompletion
+
+from ..exceptions import LLMCacheMissError
+from ..utils.cache_utils import DiskCache, hash_key
+
+# OpenAI calls cache the whole ChatCompletion, Anthropic ones the completion text
+CachedCompletion = Union[ChatCompletion, str]
+
+CACHE_MODES = ("off", "cache", "record", "replay")
+
+
+def completion_cache_key(
+    vendor: str,
+    model: str,
+    messages: Any,
+    functions: Optional[List[Any]],
+    max_tokens: int,
+    variant: int = 0,
+) -> str:
+    """Cache key of one completion request."""
+    return hash_key(
+        vendor,
+        model,
+        json.dumps(messages, sort_keys=True),
+        json.dumps(functions, sort_keys=True),
+        str(max_tokens),
+        str(variant),
+    )
+
+
+class LLMCompletionCache:
+    """
+    Completion cache with four modes:
+
+    - "off": never read or write.
+    - "cache": serve hits younger than the TTL, store every live completion.
+    - "record": always call the LLM and store the completions, e.g. to build a
+      set of responses for offline runs.
+    - "replay": only serve stored completions; a miss raises
+      LLMCacheMissError instead of calling the LLM.
+
+    Entries that can not be read back count as misses and are deleted. The
+    disk is read and written in a thread, off the event loop.
+    """
+
+    def __init__(
+        self,
+        mode: str,
+        directory: Path,
+        max_disk_bytes: int,
+        ttl_seconds: Optional[float] = None,
+    ):
+        if mode not in CACHE_MODES:
+            raise ValueError(
+                f"Unknown LLM cache mode {mode!r}, use one of {CACHE_MODES}"
+            )
+        self.mode = mode
+        # replayed recordings must not expire
+        self.disk = DiskCache(
+            directory, max_disk_bytes, ttl_seconds if mode == "cache" else None
+        )
+
+    async def get(self, key: str) -> Optional[CachedCompletion]:
+        """Return the stored completion for a key, if it may be served."""
+        if self.mode in ("off", "record"):
+            return None
+
+        completion = await asyncio.to_thread(self.read, key)
+        if completion is None:
+            if self.mode == "replay":
+                raise LLMCacheMissError(f"No recorded completion for key {key}")
+            return None
+
+        logger.info(f"LLM completion served from the {self.mode} cache")
+        return completion
+
+    def read(self, key: str) -> Optional[CachedCompletion]:
+        """The completion stored on disk for a key, deleting unreadable entries."""
+        data = self.disk.get(key)
+        if data is None:
+            return None
+
+        try:
+            entry = json.loads(data)
+            response = entry["response"]
+            if entry["type"] == "chat_completion":
+                return ChatCompletion(**response)
+            if entry["type"] == "text" and isinstance(response, str):
+                return response
+            raise ValueError(f"unknown entry type {entry['type']!r}")
+        except (ValueError, KeyError, TypeError) as err:
+            # truncated or corrupt, e.g. written by a process that was killed
+            logger.warning(f"Discarding unreadable LLM cache entry {key}: {err}")
+            self.disk.delete(key)
+            return None
+
+    async def set(self, key: str, response: CachedCompletion) -> None:
+        """Store a live completion."""
+        if self.mode not in ("cache", "record"):
+            return
+
+        if isinstance(response, str):
+            entry = {"type": "text", "response": response}
+        else:
+            entry = {
+                "type": "chat_completion",
+                "response": json.loads(response.model_dump_json()),
+            }
+        await asyncio.to_thread(self.disk.set, key, json.dumps(entry).encode())
@@ -1,29 +1,163 @@
 """Service for LLM Models"""
 import json
-import os
-from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+from contextlib import aclosing
+from typing import (
+    Any,
+    AsyncGenerator,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
-from anthropic import AI_PROMPT, HUMAN_PROMPT, Anthropic
+import httpx
+from anthropic import AI_PROMPT, HUMAN_PROMPT, AsyncAnthropic
 from loguru import logger
-from openai import OpenAI
-from openai.types.chat import ChatCompletionMessageParam, ChatCompletionToolParam
+from openai import AsyncOpenAI
+from openai.types.chat import (
+    ChatCompletion,
+    ChatCompletionChunk,
+    ChatCompletionMessage,
+    ChatCompletionMessageParam,
+    ChatCompletionMessageToolCall,
+    ChatCompletionToolParam,
+)
+from openai.types.chat.chat_completion import Choice
+from openai.types.chat.chat_completion_message_tool_call import Function
 from openai.types.shared_params import FunctionDefinition
-from pyrate_limiter import Duration, Limiter, RequestRate
 
-from ..config import ANTHROPIC_AI_VENDOR, LLM_CONFIG_PATH
-from ..exceptions import AnthropicException, LLMException, OpenAIException
+from ..config import (
+    ANTHROPIC_AI_VENDOR,
+    ANTHROPIC_BASE_URL,
+    LLM_CACHE_DIR,
+    LLM_CACHE_DISK_MB,
+    LLM_CACHE_MODE,
+    LLM_CACHE_TTL_SECONDS,
+    LLM_CONFIG_PATH,
+    LLM_CONNECT_TIMEOUT_SECONDS,
+    LLM_KEEPALIVE_EXPIRY_SECONDS,
+    LLM_MAX_CONNECTIONS,
+    LLM_MAX_KEEPALIVE_CONNECTIONS,
+    LLM_MAX_RETRIES,
+    LLM_RATE_LIMITS,
+    LLM_TIMEOUT_SECONDS,
+    OPEN_AI_VENDOR,
+)
+from ..exceptions import (
+    AnthropicException,
+    LLMCacheMissError,
+    LLMException,
+    OpenAIException,
+)
 from ..models import LLMConfig, LLMDefinition
 from ..utils.llm_utils import validate_max_tokens
+from ..utils.rate_limiter import AsyncRateLimiter, RateLimit
+from .llm_cache import CachedCompletion, LLMCompletionCache, completion_cache_key
 
-client = OpenAI()
-# openai.organization = os.environ.get("OPENAI_ORG_ID")
-# openai.api_key = os.environ.get("OPENAI_API_KEY")
+# shared clients, created by start_llm_clients() or on first use
+openai_client: Optional[AsyncOpenAI] = None
+anthropic_client: Optional[AsyncAnthropic] = None
 
 
-rate_limits = (RequestRate(60, Duration.MINUTE),)  # 60 requests a minute
+# per-model overrides of LLM_RATE_LIMITS, see configure_rate_limits()
+model_rate_limits: Dict[Tuple[str, str], RateLimit] = {}
 
-# Create the rate limiter / Pyrate Limiter instance
-limiter = Limiter(*rate_limits)
+
+def rate_limit_for(vendor: str, model: str) -> RateLimit:
+    """Rate limit of a model: its own from llm_config.json or its vendor's."""
+    if (vendor, model) in model_rate_limits:
+        return model_rate_limits[(vendor, model)]
+    return RateLimit(*LLM_RATE_LIMITS.get(vendor, LLM_RATE_LIMITS[OPEN_AI_VENDOR]))
+
+
+rate_limiter = AsyncRateLimiter(rate_limit_for)
+
+completion_cache = LLMCompletionCache(
+    LLM_CACHE_MODE,
+    LLM_CACHE_DIR,
+    LLM_CACHE_DISK_MB * 1024 * 1024,
+    LLM_CACHE_TTL_SECONDS,
+)
+
+
+def configure_rate_limits(llm_config: LLMConfig) -> None:
+    """Register the per-model rate limits set in the LLM config."""
+    for vendor, llms in llm_config.llm_vendors.items():
+        for llm in llms:
+            if llm.requests_per_minute is None and llm.tokens_per_minute is None:
+                continue
+            default = rate_limit_for(vendor, "")
+            model_rate_limits[(vendor, llm.id)] = RateLimit(
+                llm.requests_per_minute or default.requests_per_minute,
+                llm.tokens_per_minute or default.tokens_per_minute,
+            )
+
+
+def estimate_call_tokens(messages: Any, max_tokens: int) -> int:
+    """Rough token cost of a call when the caller has no estimate of its own."""
+    # about four characters per token, plus the full completion allowance
+    return len(str(messages)) // 4 + max_tokens
+
+
+def llm_timeout() -> httpx.Timeout:
+    """Timeouts for LLM requests: short to connect, long to wait for tokens."""
+    return httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=LLM_CONNECT_TIMEOUT_SECONDS)
+
+
+def llm_connection_limits() -> httpx.Limits:
+    """Connection pool limits shared by the requests to one vendor."""
+    return httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY_SECONDS,
+    )
+
+
+def get_openai_client() -> AsyncOpenAI:
+    """Return the shared OpenAI client, creating it on first use."""
+    global openai_client  # pylint: disable=global-statement
+    if openai_client is None:
+        openai_client = AsyncOpenAI(
+            timeout=llm_timeout(),
+            max_retries=LLM_MAX_RETRIES,
+            http_client=httpx.AsyncClient(
+                timeout=llm_timeout(), limits=llm_connection_limits()
+            ),
+        )
+    return openai_client
+
+
+def get_anthropic_client() -> AsyncAnthropic:
+    """Return the shared Anthropic client, creating it on first use."""
+    global anthropic_client  # pylint: disable=global-statement
+    if anthropic_client is None:
+        anthropic_client = AsyncAnthropic(
+            base_url=ANTHROPIC_BASE_URL,
+            timeout=llm_timeout(),
+            max_retries=LLM_MAX_RETRIES,
+            connection_pool_limits=llm_connection_limits(),
+        )
+    return anthropic_client
+
+
+def start_llm_clients() -> None:
+    """Create the shared LLM clients so the first request doesn't pay for it."""
+    get_openai_client()
+    get_anthropic_client()
+
+
+async def close_llm_clients() -> None:
+    """Close the shared LLM clients and their connection pools."""
+    global openai_client, anthropic_client  # pylint: disable=global-statement
+    if openai_client is not None:
+        await openai_client.close()
+        openai_client = None
+    if anthropic_client is not None:
+        await anthropic_client.close()
+        anthropic_client = None
 
 
 async def load_llm_config() -> LLMConfig:
@@ -47,74 +181,281 @@ def get_llm_by_id(llm_config: LLMConfig, llm_id: str) -> LLMDefinition | None:
     return None
 
 
-def complete_text(
+async def complete_text(
     max_tokens: int,
     model: str,
     vendor: str,
     messages: Any,
     functions: Optional[List[Any]] = None,
     callback: Optional[Callable[[Any], Union[Tuple[str, str, str], str]]] = None,
+    estimated_tokens: Optional[int] = None,
+    variant: int = 0,
 ) -> Union[Tuple[str, str, str], str]:
-    """LLM orchestrator"""
+    """
+    LLM orchestrator. `estimated_tokens` is what the call may cost against the
+    model's tokens-per-minute limit (prompt plus max_tokens, which is how
+    vendors count it); a rough estimate is used when it is not given.
+
+    Completions go through completion_cache; `variant` keeps the cache entries
+    of otherwise identical calls apart, e.g. parallel conversations.
+    """
     logger.info(f"Starting Complete Text: messages: {messages}")
     validate_max_tokens(max_tokens)
 
-    is_anthropic = vendor == ANTHROPIC_AI_VENDOR
+    cache_key = completion_cache_key(
+        vendor, model, messages, functions, max_tokens, variant
+    )
+    try:
+        response = await completion_cache.get(cache_key)
+        if response is None:
+            await rate_limiter.acquire(
+                vendor,
+                model,
+                estimated_tokens or estimate_call_tokens(messages, max_tokens),
+            )
+
+            # delegate to the appropriate completion method
+            if vendor == ANTHROPIC_AI_VENDOR:
+                response = await complete_anthropic_text(
+                    max_tokens=max_tokens, model=model, messages=messages
+                )
+            else:
+                response = await complete_openai_text(
+                    max_tokens=max_tokens,
+                    model=model,
+                    messages=messages,
+                    functions=functions,
+                )
+            await completion_cache.set(cache_key, response)
+
+        return completion_result(response, callback)
+    except LLMCacheMissError:
+        raise
+    except LLMException as exc:
+        raise LLMException(f"Error completing text: {exc}") from exc
+
+
+async def stream_text(
+    max_tokens: int,
+    model: str,
+    vendor: str,
+    messages: Any,
+    functions: Optional[List[Any]] = None,
+    callback: Optional[Callable[[Any], Union[Tuple[str, str, str], str]]] = None,
+    estimated_tokens: Optional[int] = None,
+    variant: int = 0,
+) -> AsyncGenerator[Tuple[str, Any], None]:
+    """
+    Streaming counterpart of complete_text. Yields ("content", text) and
+    ("tool_arguments", (tool_name, text)) deltas as they arrive, then one
+    ("result", ...) holding what complete_text would have returned. A cached
+    completion is replayed as a single round of deltas.
+    """
+    logger.info(f"Starting Stream Text: messages: {messages}")
+    validate_max_tokens(max_tokens)
+
+    cache_key = completion_cache_key(
+        vendor, model, messages, functions, max_tokens, variant
+    )
     try:
-        limiter.ratelimit("complete_text")
+        cached = await completion_cache.get(cache_key)
+        if cached is not None:
+            for event in completion_deltas(cached):
+                yield event
+            yield "result", completion_result(cached, callback)
+            return
+
+        await rate_limiter.acquire(
+            vendor,
+            model,
+            estimated_tokens or estimate_call_tokens(messages, max_tokens),
+        )
 
-        # delegate to the appropriate completion method
-        if is_anthropic:
-            return complete_anthropic_text(
+        if vendor == ANTHROPIC_AI_VENDOR:
+            stream = stream_anthropic_text(
                 max_tokens=max_tokens, model=model, messages=messages
             )
+        else:
+            stream = stream_openai_text(
+                max_tokens=max_tokens,
+                model=model,
+                messages=messages,
+                functions=functions,
+            )
 
-        return complete_openai_text(
-            max_tokens=max_tokens,
-            model=model,
-            messages=messages,
-            functions=functions,
-            callback=callback,
-        )
+        async with aclosing(stream):
+            async for kind, payload in stream:
+                if kind == "response":
+                    # only completions streamed to the end reach the cache
+                    await completion_cache.set(cache_key, payload)
+                    yield "result", completion_result(payload, callback)
+                else:
+                    yield kind, payload
+    except LLMCacheMissError:
+        raise
     except LLMException as exc:
-        raise LLMException(f"Error completing text: {exc}") from exc
+        raise LLMException(f"Error streaming text: {exc}") from exc
 
 
-def complete_openai_text(
+def completion_result(
+    response: CachedCompletion,
+    callback: Optional[Callable[[Any], Union[Tuple[str, str, str], str]]] = None,
+) -> Union[Tuple[str, str, str], str]:
+    """What complete_text returns for a live or cached response."""
+    if isinstance(response, str):
+        return response
+    if callback:
+        return callback(response)
+    return "Response doesn't have choices or choices have no text."
+
+
+def completion_deltas(response: CachedCompletion) -> List[Tuple[str, Any]]:
+    """The deltas stream_text would have yielded for a whole response."""
+    if isinstance(response, str):
+        return [("content", response)] if response else []
+    if not response.choices:
+        return []
+
+    message = response.choices[0].message
+    deltas: List[Tuple[str, Any]] = []
+    if message.content:
+        deltas.append(("content", message.content))
+    for tool_call in message.tool_calls or []:
+        deltas.append(
+            ("tool_arguments", (tool_call.function.name, tool_call.function.arguments))
+        )
+    return deltas
+
+
+def openai_tools(
+    functions: List[FunctionDefinition] | None,
+) -> List[ChatCompletionToolParam]:
+    """Wrap function definitions as chat completion tools."""
+    if functions is None:
+        return []
+    return [
+        {"type": "function", "function": function_definition}
+        for function_definition in functions
+    ]
+
+
+async def complete_openai_text(
     max_tokens: int,
     model: str,
     messages: Iterable[ChatCompletionMessageParam],
     functions: List[FunctionDefinition] | None = None,
-    callback: Optional[Callable[[Any], Union[Tuple[str, str, str], str]]] = None,
-) -> Union[Tuple[str, str, str], str]:
+) -> ChatCompletion:
     """Use OpenAI's GPT model to complete text based on the given prompt."""
     try:
-        tools: List[ChatCompletionToolParam] = (
-            [
-                {"type": "function", "function": function_definition}
-                for function_definition in functions
-            ]
-            if functions is not None
-            else []
+        return await get_openai_client().chat.completions.create(
+            model=model,
+            max_tokens=max_tokens,
+            messages=messages,
+            tools=openai_tools(functions),
+            tool_choice="auto",
         )
 
-        response = client.chat.completions.create(
+    except ValueError as err:
+        raise OpenAIException(f"OpenAI Client Value error: {err}, {err.args}") from err
+    except OpenAIException as err:
+        raise OpenAIException(f"complete_openai_text Exception: {err}") from err
+
+
+async def stream_openai_text(
+    max_tokens: int,
+    model: str,
+    messages: Iterable[ChatCompletionMessageParam],
+    functions: List[FunctionDefinition] | None = None,
+) -> AsyncGenerator[Tuple[str, Any], None]:
+    """
+    Stream a completion from OpenAI, see stream_text. Ends with a
+    ("response", ChatCompletion) assembled from the chunks.
+    """
+    try:
+        stream = await get_openai_client().chat.completions.create(
             model=model,
             max_tokens=max_tokens,
             messages=messages,
-            tools=tools,
+            tools=openai_tools(functions),
             tool_choice="auto",
+            stream=True,
         )
+        chunks: List[ChatCompletionChunk] = []
+        tool_names: Dict[int, str] = {}
+        try:
+            async for chunk in stream:
+                chunks.append(chunk)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    yield "content", delta.content
+                for tool_call in delta.tool_calls or []:
+                    if tool_call.function is None:
+                        continue
+                    if tool_call.function.name:
+                        tool_names[tool_call.index] = tool_call.function.name
+                    if tool_call.function.arguments:
+                        yield "tool_arguments", (
+                            tool_names.get(tool_call.index, ""),
+                            tool_call.function.arguments,
+                        )
+        finally:
+            # also runs when the consumer stops early, which ends generation
+            await stream.close()
 
-        if callback:
-            return callback(response)
-
-        return "Response doesn't have choices or choices have no text."
+        yield "response", merge_chat_completion_chunks(chunks)
 
     except ValueError as err:
         raise OpenAIException(f"OpenAI Client Value error: {err}, {err.args}") from err
     except OpenAIException as err:
-        raise OpenAIException(f"complete_openai_text Exception: {err}") from err
+        raise OpenAIException(f"stream_openai_text Exception: {err}") from err
+
+
+def merge_chat_completion_chunks(chunks: List[ChatCompletionChunk]) -> ChatCompletion:
+    """Assemble streamed chunks into the response a non-streamed call returns."""
+    content = ""
+    finish_reason = None
+    tool_calls: Dict[int, Dict[str, str]] = {}
+    for chunk in chunks:
+        if not chunk.choices:
+            continue
+        choice = chunk.choices[0]
+        finish_reason = choice.finish_reason or finish_reason
+        content += choice.delta.content or ""
+        for tool_call in choice.delta.tool_calls or []:
+            merged = tool_calls.setdefault(
+                tool_call.index, {"id": "", "name": "", "arguments": ""}
+            )
+            merged["id"] = tool_call.id or merged["id"]
+            if tool_call.function is not None:
+                merged["name"] += tool_call.function.name or ""
+                merged["arguments"] += tool_call.function.arguments or ""
+
+    message = ChatCompletionMessage(
+        role="assistant",
+        content=content or None,
+        tool_calls=[
+            ChatCompletionMessageToolCall(
+                id=merged["id"],
+                type="function",
+                function=Function(name=merged["name"], arguments=merged["arguments"]),
+            )
+            for _, merged in sorted(tool_calls.items())
+        ]
+        or None,
+    )
+    return ChatCompletion(
+        id=chunks[0].id if chunks else "",
+        object="chat.completion",
+        created=chunks[0].created if chunks else 0,
+        model=chunks[0].model if chunks else "",
+        choices=[
+            Choice(index=0, finish_reason=finish_reason or "stop", message=message)
+        ]
+        if chunks
+        else [],
+    )
 
 
 def format_anthropic_prompt(messages: list[dict[str, str]]) -> str:
@@ -128,16 +469,15 @@ def format_anthropic_prompt(messages: list[dict[str, str]]) -> str:
     return prompt
 
 
-def complete_anthropic_text(
+async def complete_anthropic_text(
     max_tokens: int,
     model: str,
     messages: list[dict[str, str]],
 ) -> str:
     """Use Anthropic's model to complete text based on the given prompt."""
     try:
-        anthropic_client = Anthropic(api_key=os.environ["ANTHROPIC_API_KEY"])
         prompt = format_anthropic_prompt(messages)
-        response = anthropic_client.completions.create(
+        response = await get_anthropic_client().completions.create(
             prompt=prompt,
             stop_sequences=[HUMAN_PROMPT],
             model=model,
@@ -147,3 +487,34 @@ def complete_anthropic_text(
         return response.completion.strip()
     except AnthropicException as err:
         raise AnthropicException(f"Anthropic Client Error: {err}") from err
+
+
+async def stream_anthropic_text(
+    max_tokens: int,
+    model: str,
+    messages: list[dict[str, str]],
+) -> AsyncGenerator[Tuple[str, Any], None]:
+    """
+    Stream a completion from Anthropic, see stream_text. Ends with a
+    ("response", text) holding the whole completion.
+    """
+    try:
+        prompt = format_anthropic_prompt(messages)
+        stream = await get_anthropic_client().completions.create(
+            prompt=prompt,
+            stop_sequences=[HUMAN_PROMPT],
+            model=model,
+            max_tokens_to_sample=max_tokens,
+            stream=True,
+        )
+        completion = ""
+        try:
+            async for event in stream:
+                completion += event.completion
+                yield "content", event.completion
+        finally:
+            await stream.response.aclose()
+
+        yield "response", completion.strip()
+    except AnthropicException as err:
+        raise AnthropicException(f"Anthropic Client Error: {err}") from err
@@ -1,52 +1,231 @@
 """ Mermaid Generator Service """
 
-import subprocess
-from tempfile import NamedTemporaryFile
-from typing import Tuple, Union
+import asyncio
+from typing import Optional, Tuple
 
 from loguru import logger
 
-from fastapi.responses import FileResponse
-
-from ..exceptions import MermaidUnexpectedError
+from ..config import (
+    MERMAID_POOL_HEALTHCHECK_SECONDS,
+    MERMAID_POOL_MAX_RENDERS,
+    MERMAID_POOL_MAX_RSS_MB,
+    MERMAID_POOL_QUEUE_SIZE,
+    MERMAID_POOL_RETRY_SECONDS,
+    MERMAID_POOL_SIZE,
+    MERMAID_POOL_STARTUP_TIMEOUT_SECONDS,
+    MERMAID_RENDER_CACHE_DIR,
+    MERMAID_RENDER_CACHE_DISK_MB,
+    MERMAID_RENDER_CACHE_ENTRIES,
+    MERMAID_RENDER_CACHE_ERROR_TTL_SECONDS,
+    MERMAID_RENDER_CONCURRENCY,
+    MERMAID_RENDER_MODE,
+    MERMAID_RENDER_TIMEOUT_SECONDS,
+    MERMAID_RENDER_WORKER_PATH,
+    MERMAID_THEME,
+)
+from ..exceptions import (
+    MermaidRenderPoolError,
+    MermaidRenderTimeoutError,
+    MermaidUnexpectedError,
+)
 from ..models import MermaidModel
 from ..utils.mermaid_utils import extract_error_message
+from .mermaid_render_cache import MermaidRenderCache, render_cache_key
+from .mermaid_render_pool import MermaidRenderPool, kill_process_group
+
+render_pool: Optional[MermaidRenderPool] = None
+render_pool_lock = asyncio.Lock()
+# consecutive failed starts of the pool, and when it may be tried again
+render_pool_failures = 0
+render_pool_retry_at = 0.0
+
+# cap on one-shot CLI renders in flight; the pool is capped by its size and
+# rejects requests beyond its queue itself
+render_semaphore = asyncio.Semaphore(MERMAID_RENDER_CONCURRENCY)
+
+render_cache = MermaidRenderCache(
+    memory_entries=MERMAID_RENDER_CACHE_ENTRIES,
+    directory=MERMAID_RENDER_CACHE_DIR,
+    max_disk_bytes=MERMAID_RENDER_CACHE_DISK_MB * 1024 * 1024,
+    error_ttl=MERMAID_RENDER_CACHE_ERROR_TTL_SECONDS,
+)
+
+mermaid_cli_version: Optional[str] = None
+
+
+async def start_render_pool() -> Optional[MermaidRenderPool]:
+    """
+    Start the shared render pool, unless the one-shot CLI is configured.
+
+    If the pool fails to start, None is returned and renders fall back to
+    the CLI. The pool is only tried again after MERMAID_POOL_RETRY_SECONDS,
+    doubled with every failure in a row.
+    """
+    global render_pool  # pylint: disable=global-statement
+    global render_pool_failures, render_pool_retry_at  # pylint: disable=global-statement
+
+    if MERMAID_RENDER_MODE != "pool":
+        return None
+
+    async with render_pool_lock:
+        loop = asyncio.get_running_loop()
+        if render_pool is None and loop.time() >= render_pool_retry_at:
+            pool = MermaidRenderPool(
+                size=MERMAID_POOL_SIZE,
+                worker_path=MERMAID_RENDER_WORKER_PATH,
+                queue_size=MERMAID_POOL_QUEUE_SIZE,
+                max_renders=MERMAID_POOL_MAX_RENDERS,
+                max_rss_bytes=MERMAID_POOL_MAX_RSS_MB * 1024 * 1024,
+                healthcheck_interval=MERMAID_POOL_HEALTHCHECK_SECONDS,
+                startup_timeout=MERMAID_POOL_STARTUP_TIMEOUT_SECONDS,
+            )
+            try:
+                await pool.start()
+            except MermaidRenderPoolError as err:
+                delay = MERMAID_POOL_RETRY_SECONDS * 2 ** min(render_pool_failures, 6)
+                render_pool_failures += 1
+                render_pool_retry_at = loop.time() + delay
+                logger.error(
+                    f"Could not start the mermaid render pool, rendering with the"
+                    f" CLI for {delay:g}s: {err}"
+                )
+            else:
+                render_pool = pool
+                render_pool_failures = 0
+    return render_pool
+
+
+async def stop_render_pool() -> None:
+    """Stop the shared render pool if it is running."""
+    global render_pool  # pylint: disable=global-statement
+
+    async with render_pool_lock:
+        if render_pool is not None:
+            await render_pool.close()
+            render_pool = None
+
+
+async def renderer_version(pool: Optional[MermaidRenderPool]) -> str:
+    """Version of the mermaid-cli that renders diagrams, part of the cache key."""
+    global mermaid_cli_version  # pylint: disable=global-statement
+
+    if pool is not None:
+        return pool.renderer_version
+
+    if mermaid_cli_version is None:
+        process = await asyncio.create_subprocess_exec(
+            "mmdc",
+            "--version",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        stdout, _ = await process.communicate()
+        mermaid_cli_version = stdout.decode().strip()
+    return mermaid_cli_version
+
+
+async def create_mermaid_diagram_cli(
+    mermaid_model: MermaidModel, timeout: float, theme: str
+) -> Tuple[Optional[bytes], str]:
+    """Generate a mermaid diagram with a one-shot mermaid-cli process."""
+
+    # Script in through stdin, SVG out through stdout: no temp files to clean up.
+    # The process gets its own session so a runaway Chromium can be killed.
+    process = await asyncio.create_subprocess_exec(
+        "mmdc",
+        "--quiet",
+        "-i",
+        "-",
+        "-o",
+        "-",
+        "-e",
+        "svg",
+        "-t",
+        theme,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
+    )
+
+    try:
+        stdout, stderr = await asyncio.wait_for(
+            process.communicate(mermaid_model.mermaid_def_str.encode()), timeout
+        )
+    except asyncio.TimeoutError as err:
+        logger.error(f"Mermaid CLI timed out after {timeout:g}s, killing")
+        kill_process_group(process)
+        await process.wait()
+        raise MermaidRenderTimeoutError(
+            f"Rendering timed out after {timeout:g} seconds"
+        ) from err
+    except asyncio.CancelledError:
+        kill_process_group(process)
+        raise
+
+    if process.returncode != 0:
+        error_message = extract_error_message(stderr.decode())
+        logger.error(f"Mermaid CLI failed: {error_message}")
+        return None, error_message
+
+    if stderr:
+        logger.error(f"Mermaid CLI Errors: {stderr.decode()}")
+
+    return stdout, ""
 
 
 async def create_mermaid_diagram(
     mermaid_model: MermaidModel,
-) -> Tuple[Union[FileResponse, None], str]:
-    """Generate a mermaid diagram from a mermaid text based script."""
+) -> Tuple[Optional[bytes], str]:
+    """Generate an SVG from a mermaid text based script, as (svg, error_message)."""
 
     try:
         logger.info(f"Attempt for Mermaid Script: {mermaid_model}")
 
-        # Create temporary files for mermaid script and output svg
-        with NamedTemporaryFile(
-            delete=False, suffix=".mmd"
-        ) as temp_in, NamedTemporaryFile(delete=False, suffix=".svg") as temp_out:
-            # Write mermaid script to temporary input file
-            temp_in.write(mermaid_model.mermaid_def_str.encode())
-            temp_in.close()
-            temp_out.close()
-
-            # Run mermaid-cli to generate svg from script, capturing output
-            process = subprocess.run(
-                ["mmdc", "-i", temp_in.name, "-o", temp_out.name],
-                check=True,
-                capture_output=True,
-            )
+        pool = await start_render_pool()
+        cache_key = render_cache_key(
+            mermaid_model.mermaid_def_str, await renderer_version(pool), MERMAID_THEME
+        )
+        cached = await render_cache.get(cache_key)
+        if cached is not None:
+            logger.info("Mermaid render served from cache")
+            return cached
 
-            logger.warning(f"Mermaid CLI Output: {process.stdout.decode()}")
+        loop = asyncio.get_running_loop()
+        queued_at = loop.time()
 
-            if process.stderr:
-                logger.error(f"Mermaid CLI Errors: {process.stderr.decode()}")
+        if pool is None:
+            async with render_semaphore:
+                started_at = loop.time()
+                svg, error_message = await create_mermaid_diagram_cli(
+                    mermaid_model, MERMAID_RENDER_TIMEOUT_SECONDS, MERMAID_THEME
+                )
+        else:
+            async with pool.worker() as worker:
+                started_at = loop.time()
+                svg, error_message = await worker.render(
+                    mermaid_model.mermaid_def_str,
+                    MERMAID_RENDER_TIMEOUT_SECONDS,
+                    MERMAID_THEME,
+                )
 
-            # Return generated svg
-        return FileResponse(temp_out.name, media_type="image/svg+xml"), ""
-    except subprocess.CalledProcessError as err:
-        error_message = extract_error_message(err.stderr.decode())
-        logger.error(f"Mermaid CLI failed: {error_message}")
-        return None, error_message
+        logger.info(
+            f"Mermaid render: queue wait {started_at - queued_at:.3f}s,"
+            f" render {loop.time() - started_at:.3f}s"
+        )
+
+        await render_cache.set(cache_key, svg, error_message)
+
+        if svg is None:
+            logger.error(f"Mermaid render failed: {error_message}")
+        return svg, error_message
+    except MermaidRenderTimeoutError as err:
+        # not cached: a timeout may just mean the renderer was overloaded
+        return None, str(err)
+    except MermaidRenderPoolError as err:
+        raise MermaidUnexpectedError(f"Render pool error: {err}") from err
+    except OSError as err:
+        # mmdc is missing or cannot be run
+        raise MermaidUnexpectedError(f"Could not run the Mermaid CLI: {err}") from err
     except MermaidUnexpectedError as err:
         raise MermaidUnexpectedError(f"Unexpected error occurred: {err}") from err
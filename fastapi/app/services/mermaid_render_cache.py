@@ -0,0 +1,93 @@
+"""Content-addressed cache of rendered Mermaid diagrams."""
+
+import asyncio
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+from ..utils.cache_utils import DiskCache, LRUCache, hash_key
+
+RenderResult = Tuple[Optional[bytes], str]
+
+# disk entries are the raw SVG behind a one-line tag, or the error message
+# behind a tag line holding the time it expires at
+SVG_TAG = b"svg\n"
+ERROR_TAG = b"error "
+
+
+def normalize_mermaid_definition(mermaid_def_str: str) -> str:
+    """Normalize line endings and surrounding whitespace of a Mermaid script."""
+    lines = mermaid_def_str.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip("\n")
+
+
+def render_cache_key(mermaid_def_str: str, renderer_version: str, theme: str) -> str:
+    """Cache key for a Mermaid script rendered by a given renderer and theme."""
+    return hash_key(
+        normalize_mermaid_definition(mermaid_def_str), renderer_version, theme
+    )
+
+
+class MermaidRenderCache:
+    """
+    Two-tier render cache: a bounded in-memory LRU in front of a size-capped
+    disk cache. Failed renders are cached too, with their extracted error
+    message, so a known-bad script is rejected without rendering it again.
+    They expire after `error_ttl` seconds, since a failure may also come
+    from a crashed browser rather than from the script. The disk tier is
+    read and written in a thread, off the event loop.
+    """
+
+    def __init__(
+        self,
+        memory_entries: int,
+        directory: Path,
+        max_disk_bytes: int,
+        error_ttl: float,
+    ):
+        # results with the time they expire at, infinite for SVGs
+        self.memory: LRUCache[Tuple[RenderResult, float]] = LRUCache(memory_entries)
+        self.disk = DiskCache(directory, max_disk_bytes)
+        self.error_ttl = error_ttl
+
+    async def get(self, key: str) -> Optional[RenderResult]:
+        """Return the cached (svg, error_message) for a key, if any."""
+        entry = self.memory.get(key)
+        if entry is None:
+            entry = await asyncio.to_thread(self.read_disk, key)
+            if entry is None:
+                return None
+            self.memory.set(key, entry)
+
+        result, expires_at = entry
+        if time.time() >= expires_at:
+            return None
+        return result
+
+    def read_disk(self, key: str) -> Optional[Tuple[RenderResult, float]]:
+        """The entry stored on disk for a key, None if missing or unreadable."""
+        data = self.disk.get(key)
+        if data is None:
+            return None
+
+        if data.startswith(SVG_TAG):
+            return (data[len(SVG_TAG) :], ""), float("inf")
+        if data.startswith(ERROR_TAG):
+            header, _, message = data.partition(b"\n")
+            try:
+                expires_at = float(header[len(ERROR_TAG) :])
+            except ValueError:
+                return None
+            return (None, message.decode()), expires_at
+        return None
+
+    async def set(self, key: str, svg: Optional[bytes], error_message: str) -> None:
+        """Store the outcome of a render."""
+        if svg is not None:
+            self.memory.set(key, ((svg, ""), float("inf")))
+            data = SVG_TAG + svg
+        else:
+            expires_at = time.time() + self.error_ttl
+            self.memory.set(key, ((None, error_message), expires_at))
+            data = ERROR_TAG + f"{expires_at}\n".encode() + error_message.encode()
+        await asyncio.to_thread(self.disk.set, key, data)
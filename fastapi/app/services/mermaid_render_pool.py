@@ -0,0 +1,345 @@
+"""Pool of warm headless-browser Mermaid renderers."""
+
+import asyncio
+import itertools
+import json
+import os
+import signal
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from loguru import logger
+
+from ..exceptions import MermaidRenderPoolError, MermaidRenderTimeoutError
+from ..utils.mermaid_utils import extract_error_message
+
+# SVGs for large diagrams easily exceed asyncio's default 64 KiB line limit.
+STREAM_LIMIT = 64 * 1024 * 1024
+
+
+def kill_process_group(process: asyncio.subprocess.Process) -> None:
+    """Kill a process started in its own session together with its children."""
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def process_tree_rss(pid: int) -> int:
+    """Return the resident memory in bytes of a process and all its descendants."""
+    proc = Path("/proc")
+    if not proc.is_dir():
+        return 0
+
+    children: Dict[int, List[int]] = {}
+    for entry in proc.iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / "stat").read_text(encoding="utf-8")
+        except OSError:
+            continue
+        # the command name is wrapped in parentheses and may contain spaces
+        ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        children.setdefault(ppid, []).append(int(entry.name))
+
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        pending.extend(children.get(current, []))
+        try:
+            status = (proc / str(current) / "status").read_text(encoding="utf-8")
+        except OSError:
+            continue
+        for line in status.splitlines():
+            if line.startswith("VmRSS:"):
+                total += int(line.split()[1]) * 1024
+                break
+    return total
+
+
+class MermaidRenderWorker:
+    """A single long-lived node process holding an open headless browser."""
+
+    def __init__(self, worker_id: int, worker_path: Path, startup_timeout: float):
+        self.worker_id = worker_id
+        self.worker_path = worker_path
+        self.startup_timeout = startup_timeout
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.renderer_version = ""
+        self.render_count = 0
+        self._request_ids = itertools.count(1)
+
+    @property
+    def is_alive(self) -> bool:
+        """Whether the underlying node process is still running."""
+        return self.process is not None and self.process.returncode is None
+
+    async def start(self) -> None:
+        """Spawn the node process and wait until its browser is ready."""
+        try:
+            self.process = await asyncio.create_subprocess_exec(
+                "node",
+                str(self.worker_path),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                limit=STREAM_LIMIT,
+                # own process group, so a hung browser can be killed with the worker
+                start_new_session=True,
+            )
+        except OSError as err:
+            # node is not installed, or the worker script is missing
+            raise MermaidRenderPoolError(
+                f"Render worker {self.worker_id} could not be spawned: {err}"
+            ) from err
+        self.render_count = 0
+        try:
+            ready = await asyncio.wait_for(self._read(), self.startup_timeout)
+        except (asyncio.TimeoutError, MermaidRenderPoolError) as err:
+            await self.stop()
+            raise MermaidRenderPoolError(
+                f"Render worker {self.worker_id} failed to start: {err}"
+            ) from err
+
+        self.renderer_version = str(ready.get("version", ""))
+        logger.info(
+            f"Render worker {self.worker_id} ready (pid {self.process.pid},"
+            f" mermaid-cli {self.renderer_version})"
+        )
+
+    async def stop(self) -> None:
+        """Terminate the node process."""
+        if self.process is None:
+            return
+        if self.process.returncode is None:
+            if self.process.stdin is not None:
+                self.process.stdin.close()
+            try:
+                await asyncio.wait_for(self.process.wait(), 5)
+            except asyncio.TimeoutError:
+                await self.kill()
+        self.process = None
+
+    async def kill(self) -> None:
+        """Kill the node process and its browser immediately."""
+        if self.process is None:
+            return
+        kill_process_group(self.process)
+        await self.process.wait()
+        self.process = None
+
+    async def restart(self) -> None:
+        """Replace the node process with a fresh one."""
+        await self.stop()
+        await self.start()
+
+    async def _read(self) -> Dict[str, Any]:
+        """Read one reply: a JSON header line, followed by `length` raw bytes."""
+        if self.process is None or self.process.stdout is None:
+            raise MermaidRenderPoolError("Render worker is not running")
+        try:
+            line = await self.process.stdout.readline()
+            if not line:
+                raise MermaidRenderPoolError("Render worker exited unexpectedly")
+            reply: Dict[str, Any] = json.loads(line)
+            if "length" in reply:
+                reply["body"] = await self.process.stdout.readexactly(reply["length"])
+        except asyncio.IncompleteReadError as err:
+            raise MermaidRenderPoolError("Render worker exited mid-reply") from err
+        return reply
+
+    async def request(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Send one request to the worker and wait for its reply."""
+        if self.process is None or self.process.stdin is None:
+            raise MermaidRenderPoolError("Render worker is not running")
+        payload["id"] = next(self._request_ids)
+        self.process.stdin.write(json.dumps(payload).encode() + b"\n")
+        await self.process.stdin.drain()
+        return await self._read()
+
+    async def ping(self, timeout: float) -> bool:
+        """Check that the worker and its browser still respond."""
+        try:
+            reply = await asyncio.wait_for(self.request({"op": "ping"}), timeout)
+        except (asyncio.TimeoutError, MermaidRenderPoolError, ConnectionError):
+            return False
+        return bool(reply.get("ok"))
+
+    async def render(
+        self, mermaid_def_str: str, timeout: float, theme: str
+    ) -> Tuple[Optional[bytes], str]:
+        """Render a Mermaid definition to SVG, returning (svg, error_message)."""
+        payload = {"op": "render", "definition": mermaid_def_str, "theme": theme}
+        try:
+            reply = await asyncio.wait_for(self.request(payload), timeout)
+        except asyncio.TimeoutError as err:
+            logger.error(
+                f"Render worker {self.worker_id} timed out after {timeout:g}s, killing"
+            )
+            await self.kill()
+            raise MermaidRenderTimeoutError(
+                f"Rendering timed out after {timeout:g} seconds"
+            ) from err
+        except asyncio.CancelledError:
+            # the reply would arrive for the next request, so drop the worker
+            await self.kill()
+            raise
+
+        self.render_count += 1
+        if reply.get("ok"):
+            return reply["body"], ""
+        return None, extract_error_message(reply.get("error", ""))
+
+    def memory_usage(self) -> int:
+        """Resident memory of the worker, its browser and the browser's children."""
+        if self.process is None:
+            return 0
+        return process_tree_rss(self.process.pid)
+
+
+class MermaidRenderPool:
+    """
+    Fixed-size pool of warm render workers with a bounded queue in front of it.
+
+    Workers are recycled after `max_renders` renders or once their process tree
+    grows past `max_rss_bytes`, and idle workers are pinged every
+    `healthcheck_interval` seconds and restarted when they stop answering.
+    Restarts run in the background, outside of any request.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        worker_path: Path,
+        queue_size: int,
+        max_renders: int,
+        max_rss_bytes: int,
+        healthcheck_interval: float,
+        startup_timeout: float,
+    ):
+        self.size = max(size, 1)
+        self.queue_size = queue_size
+        self.max_renders = max_renders
+        self.max_rss_bytes = max_rss_bytes
+        self.healthcheck_interval = healthcheck_interval
+        self.workers = [
+            MermaidRenderWorker(worker_id, worker_path, startup_timeout)
+            for worker_id in range(self.size)
+        ]
+        self._idle: "asyncio.Queue[MermaidRenderWorker]" = asyncio.Queue()
+        self._waiting = 0
+        self._healthcheck_task: Optional["asyncio.Task[None]"] = None
+        self._recycle_tasks: Set["asyncio.Task[None]"] = set()
+
+    @property
+    def renderer_version(self) -> str:
+        """The mermaid-cli version the workers were started with."""
+        return next((w.renderer_version for w in self.workers if w.is_alive), "")
+
+    async def start(self) -> None:
+        """
+        Start every worker and the background health check. If any worker
+        fails to start, the others are stopped again before raising.
+        """
+        try:
+            results = await asyncio.gather(
+                *(worker.start() for worker in self.workers), return_exceptions=True
+            )
+        except asyncio.CancelledError:
+            await self.stop_workers()
+            raise
+        failures = [result for result in results if isinstance(result, BaseException)]
+        if failures:
+            await self.stop_workers()
+            raise failures[0]
+        for worker in self.workers:
+            self._idle.put_nowait(worker)
+        self._healthcheck_task = asyncio.create_task(self._healthcheck_loop())
+
+    async def close(self) -> None:
+        """Stop the health check and every worker."""
+        if self._healthcheck_task is not None:
+            self._healthcheck_task.cancel()
+            self._healthcheck_task = None
+        for task in list(self._recycle_tasks):
+            task.cancel()
+        await asyncio.gather(*self._recycle_tasks, return_exceptions=True)
+        await self.stop_workers()
+
+    async def stop_workers(self) -> None:
+        """Stop every worker, the ones that never started included."""
+        await asyncio.gather(*(worker.stop() for worker in self.workers))
+
+    @asynccontextmanager
+    async def worker(self) -> AsyncIterator[MermaidRenderWorker]:
+        """Wait in the queue for a free worker and hand it back afterwards."""
+        if self._waiting >= self.queue_size:
+            raise MermaidRenderPoolError(
+                f"Render queue is full ({self.queue_size} requests waiting)"
+            )
+
+        self._waiting += 1
+        try:
+            worker = await self._idle.get()
+        finally:
+            self._waiting -= 1
+
+        failed = False
+        try:
+            yield worker
+        except (MermaidRenderPoolError, ConnectionError) as err:
+            logger.error(f"Render worker {worker.worker_id} failed: {err}")
+            failed = True
+            raise MermaidRenderPoolError(f"Render worker failed: {err}") from err
+        finally:
+            self._release(worker, failed)
+
+    def _recycle_reason(self, worker: MermaidRenderWorker) -> str:
+        """Why a worker has to be restarted before its next render, or ''."""
+        if not worker.is_alive:
+            return "its process is gone"
+        if worker.render_count >= self.max_renders:
+            return f"{worker.render_count} renders"
+        if worker.memory_usage() > self.max_rss_bytes:
+            return f"memory above {self.max_rss_bytes} bytes"
+        return ""
+
+    def _release(self, worker: MermaidRenderWorker, failed: bool = False) -> None:
+        """
+        Hand a worker back to the queue. One that failed or is due for a
+        restart is restarted in the background, so the caller does not wait
+        for a browser to start.
+        """
+        reason = "it failed" if failed else self._recycle_reason(worker)
+        if not reason:
+            self._idle.put_nowait(worker)
+            return
+        task = asyncio.create_task(self._recycle(worker, reason))
+        self._recycle_tasks.add(task)
+        task.add_done_callback(self._recycle_tasks.discard)
+
+    async def _recycle(self, worker: MermaidRenderWorker, reason: str) -> None:
+        """Restart a worker, then hand it back to the queue."""
+        logger.info(f"Recycling render worker {worker.worker_id}: {reason}")
+        try:
+            await worker.restart()
+        except MermaidRenderPoolError as err:
+            # keep the slot, the next health check will try again
+            logger.error(f"Could not restart render worker {worker.worker_id}: {err}")
+        finally:
+            self._idle.put_nowait(worker)
+
+    async def _healthcheck_loop(self) -> None:
+        """Ping idle workers periodically and restart the unresponsive ones."""
+        while True:
+            await asyncio.sleep(self.healthcheck_interval)
+            for _ in range(self._idle.qsize()):
+                worker = self._idle.get_nowait()
+                healthy = await worker.ping(timeout=self.healthcheck_interval)
+                if not healthy:
+                    logger.warning(
+                        f"Render worker {worker.worker_id} failed its health check"
+                    )
+                self._release(worker, failed=not healthy)
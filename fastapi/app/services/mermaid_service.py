@@ -1,21 +1,55 @@
 """Mermaid Service Module"""
 
-import asyncio
+import itertools
 import json
-from typing import Callable, Dict, Tuple, Union
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple, Union
 
 from loguru import logger
 
 from ..components.enhanced_conversation_buffer import EnhancedConversationBuffer
+from ..config import (
+    MERMAID_HEDGE_DELAY_SECONDS,
+    MERMAID_MAX_CONVERSATIONS,
+    MERMAID_MAX_LLM_CALLS,
+    MERMAID_MAX_PARALLEL_CONVERSATIONS,
+    MERMAID_MAX_REQUEST_TOKENS,
+    MERMAID_VALIDATE,
+)
 from ..exceptions import MermaidCliError
 from ..models import LLMDefinition, MermaidDesignRequest, MermaidModel
-from ..services.llm_service import complete_text
-from ..utils.llm_utils import num_tokens_from_functions, num_tokens_from_string
+from ..services.llm_service import complete_text, rate_limiter, stream_text
+from ..utils.hedging import RequestBudget, first_success
+from ..utils.llm_utils import (
+    num_tokens_from_functions,
+    num_tokens_from_static_string,
+    num_tokens_from_string,
+)
+from ..utils.mermaid_parser import validate_mermaid
 from ..utils.mermaid_utils import sanitize_markdown_js
+from ..utils.partial_json import PartialJsonStringFields
 from .diagram_function_defs import DIAGRAM_FUNCTION_DEFINITIONS
 from .mermaid_generator import create_mermaid_diagram
 
 
+SYSTEM_PROMPT = (
+    "You are a helpful assistant specialized in writing professional system diagrams."
+)
+# longest answer asked for in one call
+MAX_ANSWER_TOKENS = 2000
+RETRY_PROMPT = (
+    "Sorry that definition did not work, maybe there was a syntax mistake, could"
+    " you try the function again?"
+)
+
+
+def count_message_tokens(text: str) -> int:
+    """Token count of a buffered message, memoized for the fixed prompts."""
+    if text in (SYSTEM_PROMPT, RETRY_PROMPT):
+        return num_tokens_from_static_string(text)
+    return num_tokens_from_string(text)
+
+
 def create_buffer(max_tokens: int, num_tokens_from_string_fn: Callable):
     """Creates an enhanced conversation buffer."""
     return EnhancedConversationBuffer(max_tokens, num_tokens_from_string_fn)
@@ -55,27 +89,23 @@ def openai_mermaid_fn_callback(response) -> Union[Tuple[str, str, str], str]:
 async def init_buffer(
     buffer: EnhancedConversationBuffer, mermaid_design_request: MermaidDesignRequest
 ):
-    """Initialize the buffer with the initial messages."""
+    """Initialize the buffer with the initial messages, pinned against eviction."""
     buffer.add_messages(
         [
-            {
-                "role": "system",
-                "content": (
-                    "You are a helpful assistant specialized in writing professional"
-                    " system diagrams."
-                ),
-            },
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": mermaid_design_request.text},
-        ]
+        ],
+        pinned=True,
     )
 
 
 async def buffer_add_errormsg(
     buffer: EnhancedConversationBuffer, mermaid_def_str: str, error_message: str
 ):
-    """Buffer the error message."""
-    # Adding assistant's message with mermaid definition
-    buffer.add_messages(
+    """Buffer the failed definition and its error, compacting older attempts."""
+    buffer.add_failed_attempt(
+        mermaid_def_str,
+        error_message,
         [
             {"role": "assistant", "content": mermaid_def_str},
             {
@@ -87,72 +117,207 @@ async def buffer_add_errormsg(
                     f" {error_message}```"
                 ),
             },
-        ]
+        ],
     )
 
 
 async def buffer_result_is_str(buffer: EnhancedConversationBuffer, result: str):
     """Buffer the result if it is a string."""
-    buffer.add_messages(
+    buffer.add_failed_attempt(
+        "",
+        "No diagram was returned",
         [
             {"role": "assistant", "content": result},
-            {
-                "role": "user",
-                "content": (
-                    "Sorry that definition did not work, maybe there was a"
-                    " syntax mistake, could you try"
-                    " the function again?"
-                ),
-            },
-        ]
+            {"role": "user", "content": RETRY_PROMPT},
+        ],
     )
 
 
-async def mermaid_request(
+async def prepare_buffer(
     llm_definition: LLMDefinition,
     mermaid_design_request: MermaidDesignRequest,
-    convo_retries: int = 4,  # Number of conversation retries
-    overall_retries: int = 3,  # Number of overall retries
-    parallel_tasks: int = 2,  # Number of parallel tasks
-    buffer_factory: Callable[..., EnhancedConversationBuffer] = create_buffer,
-    token_util: Callable[..., int] = num_tokens_from_functions,
-) -> Union[Dict[str, str], Tuple[str, str, str], str]:
-    """Generate a mermaid diagram from a mermaid script."""
-    logger.debug(f"Mermaid Design Request: {mermaid_design_request}")
-
+    buffer_factory: Callable[..., EnhancedConversationBuffer],
+    token_util: Callable[..., int],
+) -> Tuple[EnhancedConversationBuffer, int, int]:
+    """
+    Size and seed the conversation buffer. Returns the buffer, the completion
+    token budget and the tokens taken by the function definitions.
+    """
     function_num_tokens = token_util(
         DIAGRAM_FUNCTION_DEFINITIONS, model=llm_definition.id
     )
 
     logger.debug(f"function_num_tokens: {function_num_tokens}")
 
-    num_tokens = num_tokens_from_string(mermaid_design_request.text)
-    buffer_max_tokens = llm_definition.max_token_length - function_num_tokens
-    complete_text_max_tokens = buffer_max_tokens - num_tokens
-
-    # Ensure they are positive
-    buffer_max_tokens = max(buffer_max_tokens, 1)
-    complete_text_max_tokens = max(complete_text_max_tokens, 1)
-
-    buffer = buffer_factory(buffer_max_tokens, num_tokens_from_string)
+    buffer_max_tokens = max(llm_definition.max_token_length - function_num_tokens, 1)
+    buffer = buffer_factory(buffer_max_tokens, count_message_tokens)
 
     logger.debug(f"Initialized buffer with max_tokens: {buffer_max_tokens}")
 
     await init_buffer(buffer, mermaid_design_request)
 
+    # the pinned prompts stay in every call, the rest is left for the answer
+    complete_text_max_tokens = max(buffer_max_tokens - buffer.current_tokens, 1)
+    return buffer, complete_text_max_tokens, function_num_tokens
+
+
+def request_budget(llm_definition: LLMDefinition) -> RequestBudget:
+    """
+    Budget of one design request: MERMAID_MAX_LLM_CALLS calls, and
+    MERMAID_MAX_REQUEST_TOKENS tokens or, when that is 0, enough for every
+    call to take the model's whole context.
+    """
+    return RequestBudget(
+        MERMAID_MAX_LLM_CALLS,
+        MERMAID_MAX_REQUEST_TOKENS
+        or llm_definition.max_token_length * MERMAID_MAX_LLM_CALLS,
+    )
+
+
+def reserved_call_tokens(
+    llm_definition: LLMDefinition,
+    buffer: EnhancedConversationBuffer,
+    function_num_tokens: int,
+    answer_tokens: int,
+) -> int:
+    """
+    Tokens to reserve for a call: the worst case of the whole prompt plus a
+    full-length answer, which can not be more than the model's context.
+    """
+    return min(
+        buffer.current_tokens + function_num_tokens + answer_tokens,
+        llm_definition.max_token_length,
+    )
+
+
+def instructions_token_budget(llm_definition: LLMDefinition) -> int:
+    """
+    Tokens a design request may take so that the system prompt, the function
+    definitions and a full-length answer still fit the model's context, and
+    one call with all of them fits the request budget.
+    """
+    overhead = (
+        num_tokens_from_functions(DIAGRAM_FUNCTION_DEFINITIONS, model=llm_definition.id)
+        + num_tokens_from_static_string(SYSTEM_PROMPT)
+        + MAX_ANSWER_TOKENS
+    )
+    return max(
+        min(
+            llm_definition.max_token_length,
+            request_budget(llm_definition).max_tokens,
+        )
+        - overhead,
+        0,
+    )
+
+
+def validation_error(mermaid_def_str: str) -> str:
+    """Run the local syntax check, returning its error message or ''."""
+    if not MERMAID_VALIDATE:
+        return ""
+    syntax_error = validate_mermaid(mermaid_def_str)
+    if syntax_error is None:
+        return ""
+    logger.error(f"local syntax check failed, skip rendering: {syntax_error}")
+    return str(syntax_error)
+
+
+async def mermaid_request(
+    llm_definition: LLMDefinition,
+    mermaid_design_request: MermaidDesignRequest,
+    convo_retries: int = 4,  # Number of conversation retries
+    max_conversations: int = MERMAID_MAX_CONVERSATIONS,
+    parallel_tasks: int = MERMAID_MAX_PARALLEL_CONVERSATIONS,
+    buffer_factory: Callable[..., EnhancedConversationBuffer] = create_buffer,
+    token_util: Callable[..., int] = num_tokens_from_functions,
+) -> Dict[str, str]:
+    """
+    Generate a mermaid diagram from a design request.
+
+    Runs up to `max_conversations` independent conversations, hedging a slow
+    one with another after MERMAID_HEDGE_DELAY_SECONDS, and returns the first
+    diagram that renders. All conversations share one budget of LLM calls and
+    tokens.
+    """
+    logger.debug(f"Mermaid Design Request: {mermaid_design_request}")
+
+    budget = request_budget(llm_definition)
+
+    def has_headroom() -> bool:
+        """Only hedge when the model's rate limit can take another call now."""
+        headroom = rate_limiter.headroom(
+            mermaid_design_request.llm_vendor_for_instructions,
+            mermaid_design_request.llm_model_for_instructions,
+        )
+        return headroom.requests >= 1 and headroom.tokens >= budget.tokens / max(
+            budget.calls, 1
+        )
+
+    # numbers the conversations so each keeps its own completion cache entries
+    conversation_numbers = itertools.count()
+
+    result = await first_success(
+        lambda: mermaid_conversation(
+            llm_definition,
+            mermaid_design_request,
+            convo_retries,
+            budget,
+            buffer_factory,
+            token_util,
+            next(conversation_numbers),
+        ),
+        max_attempts=max_conversations,
+        max_parallel=parallel_tasks,
+        hedge_delay=MERMAID_HEDGE_DELAY_SECONDS,
+        should_hedge=has_headroom,
+    )
+    if result is None:
+        raise MermaidCliError(
+            f"Mermaid CLI failed after {budget.calls} LLM calls"
+            f" ({budget.tokens} tokens)"
+        )
+    return result
+
+
+async def mermaid_conversation(
+    llm_definition: LLMDefinition,
+    mermaid_design_request: MermaidDesignRequest,
+    convo_retries: int,
+    budget: RequestBudget,
+    buffer_factory: Callable[..., EnhancedConversationBuffer],
+    token_util: Callable[..., int],
+    conversation_number: int = 0,
+) -> Optional[Dict[str, str]]:
+    """One conversation with the LLM, feeding errors back until a diagram renders."""
+    buffer, complete_text_max_tokens, function_num_tokens = await prepare_buffer(
+        llm_definition, mermaid_design_request, buffer_factory, token_util
+    )
+
     for _ in range(convo_retries):
         logger.debug(f"Buffer state before complete_text: {buffer.buffer_as_messages}")
 
         # Calculate the max tokens for this iteration of complete_text
-        iteration_max_tokens = min(complete_text_max_tokens, 2000)
+        iteration_max_tokens = min(complete_text_max_tokens, MAX_ANSWER_TOKENS)
+
+        call_tokens = reserved_call_tokens(
+            llm_definition, buffer, function_num_tokens, iteration_max_tokens
+        )
+        if not budget.spend(call_tokens):
+            logger.warning(
+                f"Request budget spent ({budget.calls} calls, {budget.tokens}"
+                " tokens), ending the conversation"
+            )
+            return None
 
-        result = complete_text(
+        result = await complete_text(
             messages=buffer.buffer_as_messages,
             max_tokens=iteration_max_tokens,
             model=mermaid_design_request.llm_model_for_instructions,
             vendor=mermaid_design_request.llm_vendor_for_instructions,
             functions=DIAGRAM_FUNCTION_DEFINITIONS,
             callback=openai_mermaid_fn_callback,
+            estimated_tokens=call_tokens,
+            variant=conversation_number,
         )
 
         logger.debug(f"Buffer state after complete_text: {buffer.buffer_as_messages}")
@@ -169,6 +334,11 @@ async def mermaid_request(
 
         logger.info(f"mermaid_def_str: {mermaid_def_str}")
 
+        syntax_error = validation_error(mermaid_def_str)
+        if syntax_error:
+            await buffer_add_errormsg(buffer, mermaid_def_str, syntax_error)
+            continue
+
         markdown_svg, err_message = await create_mermaid_diagram(
             MermaidModel(mermaid_def_str=mermaid_def_str)
         )
@@ -181,37 +351,137 @@ async def mermaid_request(
         if markdown_svg is None:
             raise MermaidCliError("Mermaid CLI failed to generate diagram")
 
-        # Read the SVG content from the file
-        with open(markdown_svg.path, "r", encoding="utf-8") as file:
-            svg_content = file.read()
-
-        logger.debug(f"markdown_svg: {markdown_svg}")
+        logger.debug(f"markdown_svg: {len(markdown_svg)} bytes")
 
         return {
-            "markdown_svg": svg_content,
+            "markdown_svg": markdown_svg.decode(),
             "explanation": explanation,
             "diagram_type": diagram_type,
         }
 
-    # If the function hasn't returned by now, it means all conversation retries
-    # have failed So we retry the whole function
-    for _ in range(overall_retries):
-        tasks = [
-            mermaid_request(
-                llm_definition,
-                mermaid_design_request,
-                convo_retries,
-                overall_retries,
-                parallel_tasks,
-            )
-            for _ in range(parallel_tasks)
-        ]
-        results = await asyncio.gather(*tasks)
+    return None
+
+
+async def mermaid_request_stream(
+    llm_definition: LLMDefinition,
+    mermaid_design_request: MermaidDesignRequest,
+    convo_retries: int = 4,  # Number of conversation retries
+    buffer_factory: Callable[..., EnhancedConversationBuffer] = create_buffer,
+    token_util: Callable[..., int] = num_tokens_from_functions,
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Streaming variant of mermaid_request, yielding (event, data) pairs.
+
+    Each attempt yields "attempt", then "diagram_delta" chunks of the
+    definition as the model writes it. Once the definition is complete it is
+    validated ("validation"); an invalid one ends the completion early. Failed
+    attempts yield "error", and the request ends with "result" or "failed".
+    Unlike mermaid_request, attempts are not fanned out in parallel, but they
+    share the same kind of budget of LLM calls and tokens.
+    """
+    logger.debug(f"Mermaid Design Request (stream): {mermaid_design_request}")
+
+    budget = request_budget(llm_definition)
+    buffer, complete_text_max_tokens, function_num_tokens = await prepare_buffer(
+        llm_definition, mermaid_design_request, buffer_factory, token_util
+    )
+
+    for attempt in range(1, convo_retries + 1):
+        iteration_max_tokens = min(complete_text_max_tokens, MAX_ANSWER_TOKENS)
+        call_tokens = reserved_call_tokens(
+            llm_definition, buffer, function_num_tokens, iteration_max_tokens
+        )
+        if not budget.spend(call_tokens):
+            yield "failed", {
+                "message": f"Request budget spent after {budget.calls} LLM calls"
+                f" ({budget.tokens} tokens)"
+            }
+            return
 
-        # If any of the tasks succeeded, return the result
-        # need to try to make the algo have simple return types
-        for result in results:
-            if result is not None:
-                return result
+        yield "attempt", {"attempt": attempt}
+
+        fields = PartialJsonStringFields(["diagram_text_definition"])
+        syntax_error = ""
+        validated = False
+        result: Union[Tuple[str, str, str], str] = ""
+
+        stream = stream_text(
+            messages=buffer.buffer_as_messages,
+            max_tokens=iteration_max_tokens,
+            model=mermaid_design_request.llm_model_for_instructions,
+            vendor=mermaid_design_request.llm_vendor_for_instructions,
+            functions=DIAGRAM_FUNCTION_DEFINITIONS,
+            callback=openai_mermaid_fn_callback,
+            estimated_tokens=call_tokens,
+        )
+        async with aclosing(stream):
+            async for kind, payload in stream:
+                if kind == "result":
+                    result = payload
+                    continue
+                if kind != "tool_arguments" or payload[0] != "create_mermaid_diagram":
+                    continue
+
+                delta = fields.feed(payload[1]).get("diagram_text_definition")
+                if delta:
+                    yield "diagram_delta", {"text": delta}
+
+                if "diagram_text_definition" in fields.completed and not validated:
+                    validated = True
+                    syntax_error = validation_error(
+                        fields.values["diagram_text_definition"]
+                    )
+                    yield "validation", {
+                        "valid": not syntax_error,
+                        "error": syntax_error,
+                    }
+                    if syntax_error:
+                        # no need to wait for the rest of the tool call
+                        break
+
+        if syntax_error:
+            mermaid_def_str = fields.values["diagram_text_definition"]
+            await buffer_add_errormsg(buffer, mermaid_def_str, syntax_error)
+            yield "error", {"attempt": attempt, "message": syntax_error}
+            continue
+
+        if isinstance(result, str):
+            logger.info("result is a string, retry the conversation")
+            await buffer_result_is_str(buffer, result)
+            yield "error", {"attempt": attempt, "message": "No diagram was returned"}
+            continue
+
+        mermaid_def_str, explanation, diagram_type = result
+
+        if not mermaid_def_str.strip():
+            raise ValueError("Mermaid definition is empty")
+
+        if not validated:
+            syntax_error = validation_error(mermaid_def_str)
+            yield "validation", {"valid": not syntax_error, "error": syntax_error}
+            if syntax_error:
+                await buffer_add_errormsg(buffer, mermaid_def_str, syntax_error)
+                yield "error", {"attempt": attempt, "message": syntax_error}
+                continue
+
+        markdown_svg, err_message = await create_mermaid_diagram(
+            MermaidModel(mermaid_def_str=mermaid_def_str)
+        )
+
+        if err_message:
+            logger.error(f"error message, push error into conversation: {err_message}")
+            await buffer_add_errormsg(buffer, mermaid_def_str, err_message)
+            yield "error", {"attempt": attempt, "message": err_message}
+            continue
+
+        if markdown_svg is None:
+            raise MermaidCliError("Mermaid CLI failed to generate diagram")
+
+        yield "result", {
+            "markdown_svg": markdown_svg.decode(),
+            "explanation": explanation,
+            "diagram_type": diagram_type,
+        }
+        return
 
-    raise MermaidCliError(f"Mermaid CLI failed after {overall_retries} attempts")
+    yield "failed", {"message": f"No valid diagram after {convo_retries} attempts"}
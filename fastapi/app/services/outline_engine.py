@@ -0,0 +1,270 @@
+"""Parallel outlining of Python files, cached by content hash."""
+import ast
+import hashlib
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from loguru import logger
+from python_code_outline.python_report_generator import (
+    process_class_def,
+    process_function_def,
+    process_import,
+    process_import_from,
+)
+
+from ..config import OUTLINE_CACHE_ENTRIES, OUTLINE_CHUNK_SIZE, OUTLINE_WORKERS
+from ..utils.cache_utils import LRUCache
+
+outline_pool: Optional[ProcessPoolExecutor] = None
+outline_pool_workers = 0
+outline_pool_lock = threading.Lock()
+
+
+class Symbol(NamedTuple):
+    """A module, class, function or method defined in a Python file."""
+
+    # "module", "class", "function" or "method"
+    kind: str
+    # dotted name within the module, "" for the module itself
+    qualname: str
+    # "(self, value: int) -> str" for functions, "(Base)" for classes
+    signature: str
+    # first line of the docstring
+    doc: str
+    line: int
+
+
+class Import(NamedTuple):
+    """
+    One imported name: `import a.b as x` is ("a.b", "", "x", 0) and
+    `from ..a import b` is ("a", "b", "", 2).
+    """
+
+    module: str
+    # the name imported from the module, "" for a plain import
+    name: str
+    # the "as" name, "" without one
+    alias: str
+    # number of leading dots of a relative import
+    level: int
+
+
+class FileOutline(NamedTuple):
+    """What parsing one Python file gives."""
+
+    # outline lines as python_code_outline writes them, without "- path"
+    lines: List[str]
+    symbols: List[Symbol]
+    imports: List[Import]
+
+
+# outlines by sha256 of the file content, shared by every repository
+outline_cache: LRUCache[FileOutline] = LRUCache(OUTLINE_CACHE_ENTRIES)
+outline_cache_lock = threading.Lock()
+
+
+def file_digest(path: str) -> str:
+    """sha256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def outline_file(path: str) -> FileOutline:
+    """
+    Outline, symbols and imports of one Python file, from a single parse.
+    The lines leave out the "- path" header, so all of it only depends on
+    the content. A file that does not parse, e.g. Python 2 or a template,
+    gets an empty outline, which is cached like any other. So does one
+    that was deleted or became unreadable since it was found.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            module = ast.parse(file.read())
+    except OSError as err:
+        logger.warning(f"Could not read {path}, leaving it out of the outline: {err}")
+        return FileOutline([], [], [])
+    except (SyntaxError, UnicodeDecodeError, ValueError, RecursionError) as err:
+        logger.warning(f"Could not parse {path}, leaving it out of the outline: {err}")
+        return FileOutline([], [], [])
+    return FileOutline(
+        outline_lines(module), module_symbols(module), module_imports(module)
+    )
+
+
+def outline_lines(module: ast.Module) -> List[str]:
+    """The lines python_code_outline's process_python_file writes for a module."""
+    lines: List[str] = []
+    for item in module.body:
+        if isinstance(item, ast.Import):
+            lines.append(process_import(item))
+        elif isinstance(item, ast.ImportFrom):
+            lines.append(process_import_from(item))
+        elif isinstance(item, ast.FunctionDef):
+            lines.extend(process_function_def(item))
+        elif isinstance(item, ast.ClassDef):
+            lines.extend(process_class_def(item))
+    return lines
+
+
+def first_doc_line(
+    node: Union[ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef]
+) -> str:
+    """First non-blank line of a node's docstring, "" without one."""
+    doc = ast.get_docstring(node) or ""
+    return next((line.strip() for line in doc.splitlines() if line.strip()), "")
+
+
+def module_symbols(module: ast.Module) -> List[Symbol]:
+    """
+    The module, then its classes and functions in source order, with the
+    methods and nested classes of each class. Functions defined inside
+    functions are left out.
+    """
+    symbols = [Symbol("module", "", "", first_doc_line(module), 1)]
+
+    def visit(body: List[ast.stmt], prefix: str, in_class: bool) -> None:
+        for node in body:
+            if isinstance(node, ast.ClassDef):
+                bases = [ast.unparse(base) for base in node.bases] + [
+                    ast.unparse(keyword) for keyword in node.keywords
+                ]
+                qualname = prefix + node.name
+                symbols.append(
+                    Symbol(
+                        "class",
+                        qualname,
+                        f"({', '.join(bases)})",
+                        first_doc_line(node),
+                        node.lineno,
+                    )
+                )
+                visit(node.body, qualname + ".", True)
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                signature = f"({ast.unparse(node.args)})"
+                if node.returns is not None:
+                    signature += f" -> {ast.unparse(node.returns)}"
+                if isinstance(node, ast.AsyncFunctionDef):
+                    signature = "async " + signature
+                symbols.append(
+                    Symbol(
+                        "method" if in_class else "function",
+                        prefix + node.name,
+                        signature,
+                        first_doc_line(node),
+                        node.lineno,
+                    )
+                )
+
+    visit(module.body, "", False)
+    return symbols
+
+
+def module_imports(module: ast.Module) -> List[Import]:
+    """Every import of a module, those inside functions and blocks included."""
+    imports: List[Import] = []
+    for node in ast.walk(module):
+        if isinstance(node, ast.Import):
+            imports.extend(
+                Import(alias.name, "", alias.asname or "", 0) for alias in node.names
+            )
+        elif isinstance(node, ast.ImportFrom):
+            imports.extend(
+                Import(node.module or "", alias.name, alias.asname or "", node.level)
+                for alias in node.names
+            )
+    return imports
+
+
+def get_outline_pool(workers: int = OUTLINE_WORKERS) -> ProcessPoolExecutor:
+    """
+    The shared pool of outline workers, started on first use and started
+    again if another number of workers is asked for.
+    """
+    global outline_pool, outline_pool_workers  # pylint: disable=global-statement
+
+    with outline_pool_lock:
+        if outline_pool is not None and outline_pool_workers != workers:
+            outline_pool.shutdown()
+            outline_pool = None
+        if outline_pool is None:
+            # spawned rather than forked: the app runs threads and event loops
+            outline_pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+            outline_pool_workers = workers
+            logger.info(f"Started {workers} outline workers")
+        return outline_pool
+
+
+def stop_outline_pool() -> None:
+    """Stop the outline workers if they are running."""
+    global outline_pool  # pylint: disable=global-statement
+
+    with outline_pool_lock:
+        if outline_pool is not None:
+            outline_pool.shutdown(cancel_futures=True)
+            outline_pool = None
+
+
+def discard_outline_pool(pool: ProcessPoolExecutor) -> None:
+    """Forget a broken pool, so the next get_outline_pool starts a new one."""
+    global outline_pool  # pylint: disable=global-statement
+
+    with outline_pool_lock:
+        if outline_pool is pool:
+            outline_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def outline_files(
+    files: Sequence[Tuple[str, str]],
+    workers: int = OUTLINE_WORKERS,
+    chunk_size: int = OUTLINE_CHUNK_SIZE,
+) -> Iterator[FileOutline]:
+    """
+    Outlines of (path, digest) files, yielded in the order given.
+
+    Files whose digest is cached are not read. The others are parsed in the
+    worker pool, `chunk_size` files per task, when there are more of them
+    than one chunk and more than one worker; otherwise in this process. If
+    a worker dies, the pool is dropped and the rest is parsed in this
+    process; the next call starts a new pool.
+    """
+    with outline_cache_lock:
+        cached = [outline_cache.get(digest) for _, digest in files]
+    paths = [
+        path
+        for (path, _), outline in zip(files, cached, strict=True)
+        if outline is None
+    ]
+    pool: Optional[ProcessPoolExecutor] = None
+    parsed: Iterator[FileOutline] = map(outline_file, paths)
+    if workers > 1 and len(paths) > chunk_size:
+        pool = get_outline_pool(workers)
+        try:
+            parsed = pool.map(outline_file, paths, chunksize=chunk_size)
+        except BrokenProcessPool:
+            logger.warning("Outline workers died, parsing in this process")
+            discard_outline_pool(pool)
+
+    done = 0
+    for index, outline in enumerate(cached):
+        if outline is None:
+            try:
+                outline = next(parsed)
+            except BrokenProcessPool:
+                logger.warning("Outline workers died, parsing in this process")
+                assert pool is not None
+                discard_outline_pool(pool)
+                parsed = map(outline_file, paths[done + 1 :])
+                outline = outline_file(paths[done])
+            done += 1
+            with outline_cache_lock:
+                outline_cache.set(files[index][1], outline)
+        yield outline
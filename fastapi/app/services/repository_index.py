@@ -0,0 +1,374 @@
+"""Persistent per-repository index of folder trees, Python code outlines and symbols."""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from loguru import logger
+
+from ..config import OUTLINE_CHUNK_SIZE, OUTLINE_WORKERS
+from ..utils.cache_utils import hash_key
+from ..utils.deadline import Deadline
+from ..utils.directory_walker import walk_tree
+from ..utils.gitignore import GITIGNORE_FILE, GitignoreMatcher
+from .outline_engine import Import, Symbol, file_digest, outline_files
+
+INDEX_FORMAT_VERSION = 3
+
+
+class IndexedFile(NamedTuple):
+    """What the index knows about one Python file."""
+
+    mtime_ns: int
+    size: int
+    # sha256 of the content, so a touched but unchanged file is not parsed again
+    digest: str
+    # outline lines of the file, without the "- path" header
+    outline: List[str]
+    symbols: List[Symbol]
+    imports: List[Import]
+
+
+class SymbolRecord(NamedTuple):
+    """A symbol of the index with the file that defines it."""
+
+    path: str
+    module: str
+    symbol: Symbol
+
+    @property
+    def name(self) -> str:
+        """Unqualified name of the symbol, the last part of a module's name."""
+        return (self.symbol.qualname or self.module).rpartition(".")[2]
+
+
+class RepositorySnapshot(NamedTuple):
+    """Result of one sweep over a repository."""
+
+    tree: str
+    # relative paths of the Python files, in tree order
+    python_files: List[str]
+    swept_at: float
+
+
+def sweep(
+    root: str,
+    ignore_file_path: Optional[str] = None,
+    deadline: Optional[Deadline] = None,
+) -> Iterator[Tuple[os.DirEntry[str], int]]:
+    """The entries of a folder that are not ignored, in tree order."""
+    matcher = GitignoreMatcher(root, ignore_file_path)
+    return walk_tree(
+        root,
+        lambda entry: entry.name == GITIGNORE_FILE or matcher.is_ignored_entry(entry),
+        deadline=deadline,
+    )
+
+
+def tree_header(root: str) -> str:
+    """First line of a folder tree."""
+    return f"{Path(root).name}/\n"
+
+
+def tree_line(entry: os.DirEntry[str], depth: int) -> Optional[str]:
+    """Line of a folder tree for an entry, None for entries it leaves out."""
+    indent = "|   " * depth
+    if entry.is_dir():
+        return f"{indent}|-- {entry.name}/\n"
+    if entry.is_file():
+        return f"{indent}|-- {entry.name}\n"
+    return None
+
+
+def is_python_file(entry: os.DirEntry[str]) -> bool:
+    """Whether an entry is a Python file that goes into the report."""
+    return entry.name.endswith(".py") and entry.is_file()
+
+
+def module_name(relative_path: str) -> str:
+    """Dotted module name of a Python file, its package for an __init__.py."""
+    parts = Path(relative_path).with_suffix("").parts
+    if parts[-1] == "__init__" and len(parts) > 1:
+        parts = parts[:-1]
+    return ".".join(parts)
+
+
+class RepositoryIndex:
+    """
+    Outlines and symbols of the Python files of one folder, kept on disk
+    between requests.
+
+    refresh() sweeps the folder, which only stats files: files whose mtime
+    and size match the index are not read, the others are hashed and only
+    parsed again, by the outline engine, when their content changed. A
+    snapshot younger than `max_age_seconds` is served without sweeping, so the
+    tree, the report and the symbols of one request share a sweep.
+    """
+
+    def __init__(self, root: str, index_path: Path, max_age_seconds: float):
+        self.root = root
+        self.index_path = index_path
+        self.max_age_seconds = max_age_seconds
+        self.files: Dict[str, IndexedFile] = {}
+        self.snapshots: Dict[Optional[str], RepositorySnapshot] = {}
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self) -> None:
+        """Read the index from disk, starting empty if it is missing or stale."""
+        try:
+            data = json.loads(self.index_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if data.get("version") != INDEX_FORMAT_VERSION or data.get("root") != (
+            self.root
+        ):
+            return
+        self.files = {
+            path: IndexedFile(
+                record[0],
+                record[1],
+                record[2],
+                record[3],
+                [Symbol(*symbol) for symbol in record[4]],
+                [Import(*item) for item in record[5]],
+            )
+            for path, record in data["files"].items()
+        }
+        logger.debug(f"Loaded index of {len(self.files)} files for {self.root}")
+
+    def save(self) -> None:
+        """
+        Write the index to disk, replacing the previous one atomically.
+        Records and symbols are stored as bare arrays, without field names.
+        """
+        data = {
+            "version": INDEX_FORMAT_VERSION,
+            "root": self.root,
+            "files": {path: list(record) for path, record in self.files.items()},
+        }
+        try:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            with NamedTemporaryFile(
+                "w", encoding="utf-8", dir=self.index_path.parent, delete=False
+            ) as temp_file:
+                json.dump(data, temp_file, separators=(",", ":"))
+            os.replace(temp_file.name, self.index_path)
+        except OSError as err:
+            logger.warning(f"Could not write repository index {self.index_path}: {err}")
+
+    def snapshot(
+        self,
+        ignore_file_path: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> RepositorySnapshot:
+        """The latest snapshot for an ignore file, refreshed if too old."""
+        with self.lock:
+            snapshot = self.snapshots.get(ignore_file_path)
+            if (
+                snapshot is None
+                or time.monotonic() - snapshot.swept_at > self.max_age_seconds
+            ):
+                snapshot = self.refresh(ignore_file_path, deadline)
+            return snapshot
+
+    def sweep(
+        self,
+        ignore_file_path: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> Iterator[Tuple[os.DirEntry[str], int]]:
+        """The entries of the folder that are not ignored, in tree order."""
+        return sweep(self.root, ignore_file_path, deadline)
+
+    def relative_path(self, entry: os.DirEntry[str]) -> str:
+        """Path of an entry relative to the root."""
+        return entry.path[len(os.path.join(self.root, "")) :]
+
+    def is_stale(self, relative_path: str, stat: os.stat_result) -> bool:
+        """Whether a Python file's mtime or size differ from its record."""
+        record = self.files.get(relative_path)
+        return (
+            record is None
+            or record.mtime_ns != stat.st_mtime_ns
+            or record.size != stat.st_size
+        )
+
+    def refresh(
+        self,
+        ignore_file_path: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> RepositorySnapshot:
+        """
+        Sweep the folder and bring the outlines of changed files up to date.
+        Stopped by the deadline, files already outlined keep their records.
+        """
+        lines = [tree_header(self.root)]
+        python_files: List[str] = []
+        stale: List[Tuple[str, os.stat_result]] = []
+        for entry, depth in self.sweep(ignore_file_path, deadline):
+            line = tree_line(entry, depth)
+            if line is None:
+                continue
+            lines.append(line)
+            if is_python_file(entry):
+                relative_path = self.relative_path(entry)
+                python_files.append(relative_path)
+                stat = entry.stat()
+                if self.is_stale(relative_path, stat):
+                    stale.append((relative_path, stat))
+        self.update_files(stale, deadline)
+
+        # forget files that were deleted, not those another ignore file hides
+        swept = set(python_files)
+        removed = [
+            path
+            for path in self.files
+            if path not in swept and not os.path.isfile(os.path.join(self.root, path))
+        ]
+        for path in removed:
+            del self.files[path]
+        if stale or removed:
+            logger.info(
+                f"Indexed {self.root}: {len(stale)} files changed,"
+                f" {len(removed)} removed"
+            )
+            self.save()
+
+        snapshot = RepositorySnapshot("".join(lines), python_files, time.monotonic())
+        self.snapshots[ignore_file_path] = snapshot
+        return snapshot
+
+    def stream_report(
+        self,
+        ignore_file_path: Optional[str] = None,
+        batch_size: int = OUTLINE_WORKERS * OUTLINE_CHUNK_SIZE,
+        deadline: Optional[Deadline] = None,
+    ) -> Iterator[str]:
+        """
+        The report of report(), one file section at a time as the sweep
+        finds the files. Sections of unchanged files are yielded right away;
+        once a file changed, up to `batch_size` sections are held back so
+        the changed files among them are outlined together.
+        """
+        pending: List[str] = []
+        stale: List[Tuple[str, os.stat_result]] = []
+        changed = 0
+        first = True
+        for entry, _ in self.sweep(ignore_file_path, deadline):
+            if not is_python_file(entry):
+                continue
+            relative_path = self.relative_path(entry)
+            pending.append(relative_path)
+            stat = entry.stat()
+            with self.lock:
+                if self.is_stale(relative_path, stat):
+                    stale.append((relative_path, stat))
+            if stale and len(pending) < batch_size:
+                continue
+
+            for section in self.flush_sections(pending, stale, deadline):
+                yield section if first else "\n\n" + section
+                first = False
+            changed += len(stale)
+            pending, stale = [], []
+
+        for section in self.flush_sections(pending, stale, deadline):
+            yield section if first else "\n\n" + section
+            first = False
+        if changed or stale:
+            with self.lock:
+                self.save()
+
+    def flush_sections(
+        self,
+        pending: List[str],
+        stale: List[Tuple[str, os.stat_result]],
+        deadline: Optional[Deadline] = None,
+    ) -> List[str]:
+        """Outline the stale files, then return the sections of the pending."""
+        with self.lock:
+            self.update_files(stale, deadline)
+            return [self.section(path) for path in pending if path in self.files]
+
+    def section(self, path: str) -> str:
+        """The report section of one indexed file."""
+        return "\n".join([f"- {path}", *self.files[path].outline])
+
+    def update_files(
+        self,
+        stale: List[Tuple[str, os.stat_result]],
+        deadline: Optional[Deadline] = None,
+    ) -> None:
+        """
+        Update the records of files whose stat changed. Files with the same
+        content keep their outline, symbols and imports, the others are
+        outlined again. Files that can no longer be read are dropped. The
+        deadline is checked after each file is hashed and outlined.
+        """
+        readable: List[Tuple[str, os.stat_result, str]] = []
+        for path, stat in stale:
+            try:
+                digest = file_digest(os.path.join(self.root, path))
+            except OSError as err:
+                logger.warning(f"Could not read {path}, leaving it out: {err}")
+                self.files.pop(path, None)
+            else:
+                readable.append((path, stat, digest))
+            if deadline is not None:
+                deadline.check()
+        changed = [
+            (os.path.join(self.root, path), digest)
+            for path, _, digest in readable
+            if path not in self.files or self.files[path].digest != digest
+        ]
+        outlines = outline_files(changed)
+        for path, stat, digest in readable:
+            record = self.files.get(path)
+            if record is not None and record.digest == digest:
+                self.files[path] = record._replace(
+                    mtime_ns=stat.st_mtime_ns, size=stat.st_size
+                )
+            else:
+                self.files[path] = IndexedFile(
+                    stat.st_mtime_ns, stat.st_size, digest, *next(outlines)
+                )
+            if deadline is not None:
+                deadline.check()
+
+    def report(self, snapshot: RepositorySnapshot) -> str:
+        """The python_code_outline report of the files of a snapshot."""
+        with self.lock:
+            return "\n\n".join(
+                self.section(path)
+                for path in snapshot.python_files
+                if path in self.files
+            )
+
+    def symbols(self, snapshot: RepositorySnapshot) -> List[SymbolRecord]:
+        """The symbols of the files of a snapshot, in tree and source order."""
+        with self.lock:
+            return [
+                SymbolRecord(path, module_name(path), symbol)
+                for path in snapshot.python_files
+                if path in self.files
+                for symbol in self.files[path].symbols
+            ]
+
+    def indexed_files(
+        self, snapshot: RepositorySnapshot
+    ) -> List[Tuple[str, IndexedFile]]:
+        """The records of the files of a snapshot, in tree order."""
+        with self.lock:
+            return [
+                (path, self.files[path])
+                for path in snapshot.python_files
+                if path in self.files
+            ]
+
+
+def repository_index_path(directory: Path, root: str) -> Path:
+    """Where the index of a repository root is stored."""
+    return directory / f"{hash_key(root)[:32]}.json"
@@ -0,0 +1,153 @@
+"""Small in-memory and on-disk caches."""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import Generic, List, Optional, TypeVar
+
+from loguru import logger
+
+V = TypeVar("V")
+
+
+def hash_key(*parts: str) -> str:
+    """Build a content-addressed cache key from the given parts."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class LRUCache(Generic[V]):
+    """Bounded in-memory cache that evicts the least recently used entry."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, V]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[V]:
+        """Return the cached value and mark it as recently used."""
+        if key not in self.entries:
+            return None
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def set(self, key: str, value: V) -> None:
+        """Store a value, evicting the oldest entries beyond max_entries."""
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class DiskCache:
+    """
+    Directory of cache files capped at `max_bytes`.
+
+    A file's mtime is its write time and its atime is refreshed on every read,
+    so entries older than `ttl_seconds` are treated as missing and eviction
+    drops the least recently read files first. Its blocking file I/O may run
+    in several threads at once; callers on the event loop use asyncio.to_thread.
+    """
+
+    def __init__(
+        self, directory: Path, max_bytes: int, ttl_seconds: Optional[float] = None
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._size: Optional[int] = None
+        # guards the size bookkeeping, and eviction, across threads
+        self._lock = threading.RLock()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / key
+
+    def _files(self) -> List[os.DirEntry[str]]:
+        if not self.directory.is_dir():
+            return []
+        files: List[os.DirEntry[str]] = []
+        for shard in os.scandir(self.directory):
+            if shard.is_dir():
+                files.extend(entry for entry in os.scandir(shard) if entry.is_file())
+        return files
+
+    @property
+    def size(self) -> int:
+        """Total size in bytes of the cached files."""
+        with self._lock:
+            if self._size is None:
+                self._size = sum(entry.stat().st_size for entry in self._files())
+            return self._size
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the cached bytes for a key, or None when missing or expired."""
+        path = self._path(key)
+        try:
+            stat = path.stat()
+            if self.ttl_seconds is not None and (
+                time.time() - stat.st_mtime > self.ttl_seconds
+            ):
+                self.delete(key)
+                return None
+            data = path.read_bytes()
+            os.utime(path, (time.time(), stat.st_mtime))
+        except OSError:
+            return None
+        return data
+
+    def set(self, key: str, value: bytes) -> None:
+        """Store bytes for a key, evicting old entries when over the size cap."""
+        path = self._path(key)
+        with self._lock:
+            size = self.size
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                previous = path.stat().st_size if path.exists() else 0
+                # write then rename, so concurrent readers never see partial files
+                with NamedTemporaryFile(dir=path.parent, delete=False) as temp_file:
+                    temp_file.write(value)
+                os.replace(temp_file.name, path)
+            except OSError as err:
+                logger.warning(f"Could not write cache entry {path}: {err}")
+                return
+
+            self._size = size - previous + len(value)
+            if self._size > self.max_bytes:
+                self.evict()
+
+    def delete(self, key: str) -> None:
+        """Remove a key from the cache."""
+        path = self._path(key)
+        with self._lock:
+            try:
+                size = path.stat().st_size
+                path.unlink()
+            except OSError:
+                return
+            if self._size is not None:
+                self._size -= size
+
+    def evict(self) -> None:
+        """Delete least recently used files until the cache is 90% of its cap."""
+        with self._lock:
+            files = sorted(self._files(), key=lambda entry: entry.stat().st_atime)
+            size = sum(entry.stat().st_size for entry in files)
+            target = int(self.max_bytes * 0.9)
+            for entry in files:
+                if size <= target:
+                    break
+                try:
+                    file_size = entry.stat().st_size
+                    os.unlink(entry.path)
+                except OSError:
+                    continue
+                size -= file_size
+            self._size = size
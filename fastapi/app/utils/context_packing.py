@@ -0,0 +1,136 @@
+"""Token-budgeted packing of folder trees and code outlines into a prompt."""
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+# counts the tokens of each of a list of lines, e.g. num_tokens_from_strings
+LineCounter = Callable[[List[str]], List[int]]
+
+OMITTED_NOTE = "(some entries were left out to fit the model's context)"
+
+
+class Unit(NamedTuple):
+    """One line of a report, packed whole or not at all."""
+
+    line: str
+    # lower sorts first: (tier, depth in the folder hierarchy)
+    priority: Tuple[int, int]
+    # index of the line this one is nested in, packed only if that one is
+    parent: Optional[int]
+    # whether a blank line goes before this one, such as before each file
+    separated: bool = False
+
+
+def tree_units(tree: str) -> List[Unit]:
+    """
+    Units of a folder_tree_generator tree: shallower entries first, each
+    nested in the folder above it.
+    """
+    units: List[Unit] = []
+    folders: List[int] = []
+    for line in tree.splitlines():
+        if not line.strip():
+            continue
+        depth = line.find("|-- ") // 4 + 1 if "|-- " in line else 0
+        del folders[depth:]
+        units.append(Unit(line, (0, depth), folders[-1] if folders else None))
+        if line.endswith("/"):
+            folders.append(len(units) - 1)
+    return units
+
+
+def symbol_tier(line: str, public_tier: int) -> int:
+    """`public_tier` for a public class or func line, 3 for anything else."""
+    keyword, _, rest = line.strip().partition(" ")
+    if keyword not in ("class", "func"):
+        return 3
+    name = rest.split("(", 1)[0]
+    is_private = name.startswith("_") and not name.startswith("__")
+    return 3 if is_private else public_tier
+
+
+def outline_units(report: str) -> List[Unit]:
+    """
+    Units of a python_code_outline report, by tier: the file headers, the
+    public top-level classes and functions, their public members, then
+    private details such as imports, private symbols and variables. Within a
+    tier files closer to the root come first.
+    """
+    units: List[Unit] = []
+    # index of the enclosing line at each indentation level, the file at 0
+    parents: List[int] = []
+    depth = 0
+    for line in report.splitlines():
+        if not line.strip():
+            continue
+        if line.startswith("- "):
+            depth = line.count("/")
+            parents = [len(units)]
+            units.append(Unit(line, (0, depth), None, separated=bool(units)))
+            continue
+
+        indent = len(line) - len(line.lstrip("\t"))
+        del parents[indent + 1 :]
+        tier = symbol_tier(line, indent + 1) if indent < 2 else 3
+        units.append(Unit(line, (tier, depth), parents[-1] if parents else None))
+        parents.append(len(units) - 1)
+    return units
+
+
+def pack_units(
+    units: List[Unit], budget: int, count_lines: LineCounter
+) -> Tuple[List[int], int, bool]:
+    """
+    Pick the units to keep by priority until the next one does not fit.
+    Every line is tokenized once. Returns the kept indexes in their original
+    order, the tokens they take (with OMITTED_NOTE if needed) and whether any
+    unit was left out.
+    """
+    # one extra token per newline
+    tokens = [
+        count + 1 + unit.separated
+        for unit, count in zip(
+            units, count_lines([unit.line for unit in units]), strict=True
+        )
+    ]
+    if sum(tokens) <= budget:
+        return list(range(len(units))), sum(tokens), False
+
+    # room for the note saying that units were left out
+    used = count_lines([OMITTED_NOTE])[0] + 2
+    kept = [False] * len(units)
+    for index in sorted(range(len(units)), key=lambda i: (units[i].priority, i)):
+        parent = units[index].parent
+        if parent is not None and not kept[parent]:
+            continue
+        if used + tokens[index] > budget:
+            break
+        kept[index] = True
+        used += tokens[index]
+    return [index for index in range(len(units)) if kept[index]], used, True
+
+
+def pack_folder_tree(
+    tree: str, budget: int, count_lines: LineCounter
+) -> Tuple[str, int]:
+    """Fit a folder tree into `budget` tokens, returning it and its tokens."""
+    units = tree_units(tree)
+    kept, used, omitted = pack_units(units, budget, count_lines)
+    lines = [units[index].line for index in kept]
+    if omitted:
+        lines.append(OMITTED_NOTE)
+    return "\n".join(lines), used
+
+
+def pack_code_outline(
+    report: str, budget: int, count_lines: LineCounter
+) -> Tuple[str, int]:
+    """Fit a code outline into `budget` tokens, returning it and its tokens."""
+    units = outline_units(report)
+    kept, used, omitted = pack_units(units, budget, count_lines)
+    lines: List[str] = []
+    for index in kept:
+        if units[index].separated and lines:
+            lines.append("")
+        lines.append(units[index].line)
+    if omitted:
+        lines.extend(["", OMITTED_NOTE])
+    return "\n".join(lines), used
@@ -0,0 +1,33 @@
+"""Deadlines that long-running blocking work checks to stop early."""
+import time
+from typing import Optional
+
+from ..exceptions import AnalysisTimeoutError
+
+
+class Deadline:
+    """
+    A point in time after which work should stop, checked by the work itself
+    since threads cannot be interrupted. It can also be cancelled early.
+    """
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.expires_at = None if seconds is None else time.monotonic() + seconds
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        """Ask the work to stop at its next check."""
+        self.cancelled = True
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, or None without a time limit."""
+        if self.expires_at is None:
+            return None
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def check(self) -> None:
+        """Raise AnalysisTimeoutError if the deadline passed or was cancelled."""
+        if self.cancelled or (
+            self.expires_at is not None and time.monotonic() >= self.expires_at
+        ):
+            raise AnalysisTimeoutError("Directory analysis ran past its deadline")
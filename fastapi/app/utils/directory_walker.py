@@ -0,0 +1,84 @@
+"""Breadth-first os.scandir walker that prunes directories before descending."""
+import os
+from collections import deque
+from typing import AbstractSet, Callable, Iterator, Optional, Tuple
+
+from loguru import logger
+
+from ..config import WALK_PRUNED_DIRECTORIES
+from .deadline import Deadline
+
+
+def walk(
+    root: str,
+    max_depth: Optional[int] = None,
+    pruned: AbstractSet[str] = WALK_PRUNED_DIRECTORIES,
+    descend: Optional[Callable[[os.DirEntry[str]], bool]] = None,
+    deadline: Optional[Deadline] = None,
+) -> Iterator[Tuple[os.DirEntry[str], int]]:
+    """
+    Yield (entry, depth) for everything below `root`, the root's own entries
+    at depth 1, shallower entries first.
+
+    Directories named in `pruned`, or for which `descend` returns False, are
+    yielded but not entered, and nothing deeper than `max_depth` is read.
+    Symlinked directories are not followed and unreadable ones are skipped.
+    Stop iterating as soon as you have an answer: nothing below the entries
+    already yielded has been read yet. The deadline is checked before each
+    directory is read.
+    """
+    pending = deque([(root, 1)])
+    while pending:
+        if deadline is not None:
+            deadline.check()
+        directory, depth = pending.popleft()
+        try:
+            with os.scandir(directory) as entries:
+                children = list(entries)
+        except OSError as err:
+            logger.debug(f"Skipping unreadable directory {directory}: {err}")
+            continue
+
+        for entry in children:
+            yield entry, depth
+            if (
+                (max_depth is None or depth < max_depth)
+                and entry.name not in pruned
+                and entry.is_dir(follow_symlinks=False)
+                and (descend is None or descend(entry))
+            ):
+                pending.append((entry.path, depth + 1))
+
+
+def walk_tree(
+    root: str,
+    ignored: Callable[[os.DirEntry[str]], bool],
+    pruned: AbstractSet[str] = WALK_PRUNED_DIRECTORIES,
+    depth: int = 0,
+    deadline: Optional[Deadline] = None,
+) -> Iterator[Tuple[os.DirEntry[str], int]]:
+    """
+    Yield (entry, depth) depth-first in the order of a folder tree listing,
+    the root's own entries at depth 0: folders first, then by name, each
+    folder followed by its content. Entries for which `ignored` returns True
+    and folders named in `pruned` are left out; symlinked folders are yielded
+    but not entered. The deadline is checked before each directory is read.
+    """
+    if deadline is not None:
+        deadline.check()
+    try:
+        with os.scandir(root) as scanned:
+            entries = [
+                entry
+                for entry in scanned
+                if not (entry.name in pruned and entry.is_dir(follow_symlinks=False))
+                and not ignored(entry)
+            ]
+    except OSError as err:
+        logger.debug(f"Skipping unreadable directory {root}: {err}")
+        return
+
+    for entry in sorted(entries, key=lambda e: (not e.is_dir(), e.name.lower())):
+        yield entry, depth
+        if entry.is_dir(follow_symlinks=False):
+            yield from walk_tree(entry.path, ignored, pruned, depth + 1, deadline)
@@ -0,0 +1,190 @@
+"""Compiled .gitignore matching for a folder tree, nested files included."""
+import os
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Pattern, Tuple
+
+from loguru import logger
+
+GITIGNORE_FILE = ".gitignore"
+
+
+class GitignorePattern(NamedTuple):
+    """One .gitignore line, translated to a regex on paths relative to its file."""
+
+    regex: str
+    negated: bool
+    directory_only: bool
+
+
+def translate_segment(segment: str) -> str:
+    """Regex for one path segment of a glob, which never matches a slash."""
+    regex: List[str] = []
+    index = 0
+    while index < len(segment):
+        char = segment[index]
+        index += 1
+        if char == "\\" and index < len(segment):
+            regex.append(re.escape(segment[index]))
+            index += 1
+        elif char == "*":
+            while index < len(segment) and segment[index] == "*":
+                index += 1
+            regex.append("[^/]*")
+        elif char == "?":
+            regex.append("[^/]")
+        elif char == "[":
+            start = index + 1 if segment[index : index + 1] in ("!", "^") else index
+            # a ] right after the opening bracket is part of the set
+            end = segment.find("]", start + 1)
+            if end == -1:
+                regex.append(re.escape(char))
+                continue
+            members = segment[start:end].replace("\\", "\\\\").replace("[", "\\[")
+            regex.append(f"[{'^' if start > index else ''}{members}]")
+            index = end + 1
+        else:
+            regex.append(re.escape(char))
+    return "".join(regex)
+
+
+def parse_pattern(line: str) -> Optional[GitignorePattern]:
+    """
+    Translate a .gitignore line, or None for blank lines and comments.
+
+    Follows gitignore(5): `!` re-includes, a trailing `/` matches directories
+    only, a pattern with a `/` elsewhere is anchored to the directory of its
+    file while one without matches at any depth, and `**` spans directories.
+    """
+    line = line.rstrip("\r\n")
+    # trailing spaces are dropped unless escaped with a backslash
+    stripped = line.rstrip(" ")
+    if stripped.endswith("\\") and len(stripped) < len(line):
+        stripped += " "
+    line = stripped
+    if not line or line.startswith("#"):
+        return None
+
+    negated = line.startswith("!")
+    if negated:
+        line = line[1:]
+    directory_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+
+    anchored = "/" in line
+    segments = line.lstrip("/").split("/")
+    regex = "" if anchored else "(?:.*/)?"
+    for index, segment in enumerate(segments):
+        is_last = index == len(segments) - 1
+        if segment == "**":
+            regex += ".+" if is_last else "(?:.*/)?"
+        else:
+            regex += translate_segment(segment) + ("" if is_last else "/")
+    return GitignorePattern(regex, negated, directory_only)
+
+
+def compile_patterns(
+    patterns: List[GitignorePattern],
+) -> Tuple[Optional[Pattern[str]], List[bool]]:
+    """
+    Combine patterns into one regex of one group per pattern, the last
+    pattern first, so the group that matches is the pattern that decides.
+    Returns the regex and, per group, whether its pattern is negated.
+    """
+    if not patterns:
+        return None, []
+    ordered = patterns[::-1]
+    regex = "|".join(f"({pattern.regex})" for pattern in ordered)
+    return re.compile(regex, re.DOTALL), [pattern.negated for pattern in ordered]
+
+
+class GitignoreRules:
+    """The patterns of one .gitignore file, compiled once."""
+
+    def __init__(self, lines: Iterable[str]):
+        patterns = [
+            pattern for pattern in map(parse_pattern, lines) if pattern is not None
+        ]
+        self.file_regex, self.file_negated = compile_patterns(
+            [pattern for pattern in patterns if not pattern.directory_only]
+        )
+        self.directory_regex, self.directory_negated = compile_patterns(patterns)
+
+    @classmethod
+    def from_file(cls, path: str) -> Optional["GitignoreRules"]:
+        """Rules of a .gitignore file, or None if it cannot be read."""
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as file:
+                return cls(file)
+        except OSError:
+            return None
+
+    def match(self, path: str, is_dir: bool) -> Optional[bool]:
+        """
+        Whether the last pattern matching `path`, relative to the directory
+        of the file, ignores it (True) or re-includes it (False). None if no
+        pattern matches.
+        """
+        regex, negated = (
+            (self.directory_regex, self.directory_negated)
+            if is_dir
+            else (self.file_regex, self.file_negated)
+        )
+        if regex is None:
+            return None
+        match = regex.fullmatch(path)
+        if match is None or match.lastindex is None:
+            return None
+        return not negated[match.lastindex - 1]
+
+
+class GitignoreMatcher:
+    """
+    The gitignore rules of a folder tree: the .gitignore of each directory,
+    read the first time a path below it is checked, and an optional extra
+    ignore file applying from the root with the lowest precedence.
+
+    Like git, a path inside an ignored directory cannot be re-included, so
+    callers should not descend into directories this matcher ignores.
+    """
+
+    def __init__(self, root: str, ignore_file_path: Optional[str] = None):
+        self.root = root
+        self.prefix = len(os.path.join(root, ""))
+        self.directories: Dict[str, Optional[GitignoreRules]] = {}
+        self.extra_rules: Optional[GitignoreRules] = None
+        root_gitignore = os.path.abspath(os.path.join(root, GITIGNORE_FILE))
+        if ignore_file_path and os.path.abspath(ignore_file_path) != root_gitignore:
+            self.extra_rules = GitignoreRules.from_file(ignore_file_path)
+
+    def directory_rules(self, directory: str) -> Optional[GitignoreRules]:
+        """Rules of the .gitignore in a directory relative to the root."""
+        if directory not in self.directories:
+            path = os.path.join(self.root, directory, GITIGNORE_FILE)
+            self.directories[directory] = GitignoreRules.from_file(path)
+            if self.directories[directory] is not None:
+                logger.debug(f"Loaded ignore rules from {path}")
+        return self.directories[directory]
+
+    def is_ignored(self, path: str, is_dir: bool) -> bool:
+        """Whether a /-separated path relative to the root is ignored."""
+        directory = path
+        while directory:
+            directory = directory.rpartition("/")[0]
+            rules = self.directory_rules(directory)
+            if rules is None:
+                continue
+            result = rules.match(path[len(directory) + 1 if directory else 0 :], is_dir)
+            if result is not None:
+                return result
+        if self.extra_rules is not None:
+            return bool(self.extra_rules.match(path, is_dir))
+        return False
+
+    def is_ignored_entry(self, entry: os.DirEntry[str]) -> bool:
+        """Whether a scandir entry below the root is ignored."""
+        path = entry.path[self.prefix :]
+        if os.sep != "/":
+            path = path.replace(os.sep, "/")
+        return self.is_ignored(path, entry.is_dir())
@@ -0,0 +1,99 @@
+"""Hedged execution of redundant async attempts."""
+import asyncio
+from typing import Any, Callable, Coroutine, Optional, Set, TypeVar
+
+from loguru import logger
+
+T = TypeVar("T")
+
+# cancelled attempts still cleaning up, referenced until they are done
+cancelled_attempts: Set["asyncio.Task[Any]"] = set()
+
+
+class RequestBudget:
+    """Caps the LLM calls and tokens one request may spend across its attempts."""
+
+    def __init__(self, max_calls: int, max_tokens: int):
+        self.max_calls = max_calls
+        self.max_tokens = max_tokens
+        self.calls = 0
+        self.tokens = 0
+
+    def spend(self, tokens: int) -> bool:
+        """Reserve one call worth `tokens`, or return False if over budget."""
+        if self.calls >= self.max_calls or self.tokens + tokens > self.max_tokens:
+            return False
+        self.calls += 1
+        self.tokens += tokens
+        return True
+
+
+def discard_cancelled_attempt(task: "asyncio.Task[Any]") -> None:
+    """Forget a cancelled attempt once it is done, logging what it raised."""
+    cancelled_attempts.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"Cancelled attempt failed: {task.exception()}")
+
+
+async def first_success(
+    attempt: Callable[[], Coroutine[Any, Any, Optional[T]]],
+    max_attempts: int,
+    max_parallel: int,
+    hedge_delay: float,
+    should_hedge: Callable[[], bool] = lambda: True,
+) -> Optional[T]:
+    """
+    Run attempts until one returns a result other than None.
+
+    One attempt starts right away. Another one starts when the running attempts
+    have produced nothing for `hedge_delay` seconds, or when all of them failed,
+    as long as fewer than `max_parallel` are running and `max_attempts` is not
+    reached. A hedge is skipped while `should_hedge()` is false, e.g. when a
+    rate limit has no headroom for it. The first result wins and is returned
+    right away: the attempts still running are cancelled and finish their
+    cleanup in the background. Returns None when every attempt failed; if an
+    attempt raised, the first such exception is re-raised instead.
+    """
+    pending: Set["asyncio.Task[Optional[T]]"] = set()
+    started = 0
+    error: Optional[BaseException] = None
+
+    def launch() -> None:
+        nonlocal started
+        started += 1
+        pending.add(asyncio.create_task(attempt()))
+
+    try:
+        launch()
+        while pending:
+            can_hedge = started < max_attempts and len(pending) < max_parallel
+            done, pending = await asyncio.wait(
+                pending,
+                timeout=hedge_delay if can_hedge else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+
+            for task in done:
+                if task.exception() is not None:
+                    logger.error(f"Attempt failed with an error: {task.exception()}")
+                    error = error or task.exception()
+                elif task.result() is not None:
+                    return task.result()
+
+            if not done:
+                if should_hedge():
+                    logger.info(f"No result after {hedge_delay:g}s, starting a hedge")
+                    launch()
+                else:
+                    logger.info("No headroom for a hedge, waiting for running attempts")
+            elif not pending and started < max_attempts:
+                launch()
+    finally:
+        for task in pending:
+            task.cancel()
+            cancelled_attempts.add(task)
+            task.add_done_callback(discard_cancelled_attempt)
+
+    if error is not None:
+        raise error
+    return None
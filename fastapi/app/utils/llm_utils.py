@@ -1,40 +1,85 @@
 """ Utility functions for the Large Language Models. """
 
+import json
 import math
 
 # Import Collection from typing
-from typing import Any, Dict, List, Union
+from typing import Any, Dict, List, Optional, Union
 
-import tiktoken
 from anthropic import Anthropic
 from openai.types.shared_params import FunctionDefinition
 
-from ..config import ANTHROPIC_AI_VENDOR, OPEN_AI_VENDOR
+from ..config import ANTHROPIC_AI_VENDOR, ANTHROPIC_EXACT_TOKEN_COUNT, OPEN_AI_VENDOR
+from .cache_utils import LRUCache, hash_key
+from .tokenizers import (
+    count_anthropic_tokens,
+    count_tokens_batch,
+    encoding_for_model,
+    get_encoding,
+)
+
+# encoding num_tokens_from_string counts OpenAI tokens with
+TEXT_ENCODING = "gpt2"
 
 ValueType = Union[str, List[str], Any]
 FunctionParameterProperty = Dict[str, ValueType]
 
+# created on first use by anthropic_sync_count_tokens
+anthropic_count_client: Optional[Anthropic] = None
+
+# token counts of tool definitions and static prompt text, counted once each
+static_token_counts: LRUCache[int] = LRUCache(1024)
+
 
 def anthropic_sync_count_tokens(text: str) -> int:
-    """Count the number of tokens in a text string using the Anthropic API."""
-    client = Anthropic()
-    number_of_tokens = client.count_tokens(text)
-    return number_of_tokens
+    """
+    Count the number of tokens in a text string with the Anthropic SDK's
+    tokenizer. Needs the `tokenizers` package; see
+    tokenizers.anthropic_encoding for the offline estimate used by default.
+    """
+    global anthropic_count_client  # pylint: disable=global-statement
+    if anthropic_count_client is None:
+        anthropic_count_client = Anthropic()
+    return anthropic_count_client.count_tokens(text)
 
 
-def num_tokens_from_string(text: str, llm_vendor: str = OPEN_AI_VENDOR) -> int:
+def num_tokens_from_string(
+    text: str,
+    llm_vendor: str = OPEN_AI_VENDOR,
+    exact: bool = ANTHROPIC_EXACT_TOKEN_COUNT,
+) -> int:
     """
     Returns the number of tokens in a text string.
     NOTE: openAI and Anthropics have different token counting mechanisms.
     https://help.openai.com/en/articles/4936856-what-are-tokens-and-how-to-count-them
+    Anthropic counts are estimated offline unless `exact` is set.
     """
-    is_anthropic = llm_vendor == ANTHROPIC_AI_VENDOR
+    return num_tokens_from_strings([text], llm_vendor, exact)[0]
 
-    num_tokens = (
-        anthropic_sync_count_tokens(text)
-        if is_anthropic
-        else len(tiktoken.get_encoding("gpt2").encode(text))
-    )
+
+def num_tokens_from_strings(
+    texts: List[str],
+    llm_vendor: str = OPEN_AI_VENDOR,
+    exact: bool = ANTHROPIC_EXACT_TOKEN_COUNT,
+) -> List[int]:
+    """Batch version of num_tokens_from_string, one count per text."""
+    if llm_vendor != ANTHROPIC_AI_VENDOR:
+        return count_tokens_batch(texts, get_encoding(TEXT_ENCODING))
+    if exact:
+        return [anthropic_sync_count_tokens(text) for text in texts]
+    return count_anthropic_tokens(texts)
+
+
+def num_tokens_from_static_string(text: str, llm_vendor: str = OPEN_AI_VENDOR) -> int:
+    """
+    num_tokens_from_string for text that repeats across requests, such as
+    system prompts and formatted templates, counted once per process.
+    """
+    key = hash_key("text", llm_vendor, text)
+    num_tokens = static_token_counts.get(key)
+    if num_tokens is None:
+        num_tokens = num_tokens_from_string(text, llm_vendor)
+        static_token_counts.set(key, num_tokens)
     return num_tokens
 
 
@@ -92,13 +137,20 @@ def calculate_function_tokens(function: FunctionDefinition, encoding: Any) -> in
 def num_tokens_from_functions(
     functions: List[FunctionDefinition], model: str = "gpt-3.5-turbo"
 ) -> int:
-    """Return the number of tokens used by a list of functions."""
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-    except KeyError:
-        print("Warning: model not found. Using cl100k_base encoding.")
-        encoding = tiktoken.get_encoding("cl100k_base")
+    """
+    Return the number of tokens used by a list of functions, counted once per
+    model and set of definitions.
+    """
+    key = hash_key("functions", model, json.dumps(functions, sort_keys=True))
+    num_tokens = static_token_counts.get(key)
+    if num_tokens is None:
+        num_tokens = count_function_tokens(functions, encoding_for_model(model))
+        static_token_counts.set(key, num_tokens)
+    return num_tokens
+
 
+def count_function_tokens(functions: List[FunctionDefinition], encoding: Any) -> int:
+    """Count the tokens used by a list of functions."""
     num_tokens = (
         sum(calculate_function_tokens(function, encoding) for function in functions)
         + 12
@@ -1,134 +1,568 @@
-from lark import Lark, Transformer, UnexpectedInput, v_args
-
-MERMAID_GRAMMER = r"""
-start: command
-
-command: "graph" direction newline node_list
-       | "flowchart" direction newline node_list
-       | "sequenceDiagram" newline participant_list
-       | "gantt" newline gantt_list
-       | "classDiagram" newline class_list
-       | "stateDiagram" newline state_list
-
-direction: "TB" | "BT" | "RL" | "LR"
-
-node_list: node newline node_list
-         | node
-
-node: CNAME arrow CNAME
-
-arrow: "-->" | "-.->" | "==>" | "===" | "---"
-
-participant_list: participant newline participant_list
-                | participant
-
-participant: "participant" CNAME
-
-gantt_list: gantt newline gantt_list
-          | gantt
-
-gantt: "title" CNAME
-     | "section" CNAME
-     | CNAME "starts" CNAME
-     | CNAME "ends" CNAME
-
-class_list: class_def newline class_list
-          | class_def
-
-class_def: "class" CNAME "{" newline class_content_list "}"
-         | "note" STRING
-         | CNAME "<|--" CNAME
-         | CNAME ":" ( "+" | "-" ) CNAME
-         | CNAME ":" ( "+" | "-" ) STRING
-
-class_content_list: class_content newline class_content_list
-                  | class_content
-
-class_content: ( "+" | "-" ) CNAME
-             | ( "+" | "-" ) STRING
-
-state_list: state newline state_list
-          | state
-
-state: "state" CNAME
-
-newline: /(\r?\n)+/
-
-STRING: /"(?:[^"\\]|\\.)*"/
-
-%import common.CNAME
-%import common.WS
-%import common.STRING
-%ignore WS
 """
+Local syntax validation for Mermaid diagram definitions.
+
+The validator is a cheap gate in front of the renderer: it only reports errors
+for constructs Mermaid itself rejects, and stays silent about anything it does
+not model (unsupported diagram types, free text inside class or entity bodies),
+leaving those to the renderer. Statements are parsed one line at a time with a
+LALR grammar that has one start rule per diagram type, while block structure
+(subgraph/end, loop/end, braces) is tracked separately so errors point at the
+exact line and column.
+"""
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
 
+from lark import Lark, Token, UnexpectedCharacters, UnexpectedInput, UnexpectedToken
+from loguru import logger
 
-class MermaidTransformer(Transformer):
-    @v_args(inline=True)
-    def command(self, items):
-        return "\n".join(items)
-
-    def direction(self, items):
-        return " ".join(items)
-
-    def node_list(self, items):
-        return "\n".join(items)
-
-    def node(self, items):
-        return " ".join(items)
-
-    def arrow(self, items):
-        return " ".join(items)
-
-    def participant_list(self, items):
-        return "\n".join(items)
-
-    def participant(self, items):
-        return f"participant {items[0]}"
-
-    def gantt_list(self, items):
-        return "\n".join(items)
-
-    def gantt(self, items):
-        return " ".join(items)
-
-    def class_list(self, items):
-        return "\n".join(items)
-
-    def class_def(self, items):
-        return " ".join(items)
-
-    def class_content_list(self, items):
-        return "\n".join(items)
-
-    def class_content(self, items):
-        return " ".join(items)
-
-    def state_list(self, items):
-        return "\n".join(items)
-
-    def state(self, items):
-        return f"state {items[0]}"
-
-    def newline(self):
-        return "\n"
-
-
-def parse_mermaid(input_code):
-    parser = Lark(MERMAID_GRAMMER, parser="lalr", transformer=MermaidTransformer())
-    try:
-        tree = parser.parse(input_code)
-        return tree.pretty()
-    except UnexpectedInput as exc:
-        context = exc.get_context(input_code, span=10)
-        return f"Syntax error at position {exc.pos_in_stream}: {context}"
+from ..config import MERMAID_PARSER_CACHE_PATH
 
+MERMAID_GRAMMER = r"""
+// ---------------------------------------------------------------- flowchart
+flowchart_line: flow_chain
+              | SUBGRAPH REST?
+              | END
+              | DIRECTION_KW DIRECTION
+              | FLOW_DIRECTIVE REST?
+
+flow_chain: flow_nodes (flow_link flow_nodes)*
+flow_nodes: flow_node ("&" flow_node)*
+flow_node: NODE_ID (flow_shape | NODE_SHAPE_ATTRS)? (":::" NODE_ID)?
+flow_shape: SHAPE_OPEN (STRING | NODE_TEXT)? SHAPE_CLOSE
+flow_link: LINK PIPE_TEXT?
+         | TEXT_LINK PIPE_TEXT?
+
+SUBGRAPH.2: /subgraph\b/
+END.2: /end\b/
+DIRECTION_KW.2: /direction\b/
+FLOW_DIRECTIVE.2: /(classDef|class|style|linkStyle|click|accTitle|accDescr)\b/
+NODE_ID: /[\w\u00C0-\uFFFF.$!?*+'`]+(?:-(?=[\w\u00C0-\uFFFF])[\w\u00C0-\uFFFF.$!?*+'`]*)*/
+NODE_SHAPE_ATTRS: /@\{[^}\n]*\}/
+SHAPE_OPEN: /\(\(\(|\(\(|\(\[|\[\[|\[\(|\{\{|\[\/|\[\\|\(|\[|\{|>/
+SHAPE_CLOSE: /\)\)\)|\)\)|\]\)|\]\]|\)\]|\}\}|\/\]|\\\]|\)|\]|\}/
+NODE_TEXT: /(?:[^\[\](){}"\n]|\{[^\[\](){}"\n]*\})+/
+LINK: /[xo<]?(?:-{2,}[-xo>]|={2,}[=xo>]|-\.+-[xo>]?|~{3,})/
+TEXT_LINK: /(?:--|==|-\.)(?![-.=>])[^\n]*?(?:-{2,}[-xo>]|={2,}[=xo>]|\.-+[xo>]?)/
+PIPE_TEXT: /\|[^|\n]*\|/
+
+// ---------------------------------------------------------------- sequence
+sequence_line: SEQ_PARTICIPANT REST
+             | SEQ_CREATE SEQ_PARTICIPANT REST
+             | SEQ_DESTROY REST
+             | ACTOR SEQ_ARROW ACTIVATION? ACTOR COLON_TEXT
+             | SEQ_NOTE NOTE_PLACEMENT ACTOR ("," ACTOR)? COLON_TEXT
+             | SEQ_BLOCK REST?
+             | SEQ_BRANCH REST?
+             | END
+             | SEQ_ACTIVATE REST
+             | SEQ_DIRECTIVE REST?
+
+SEQ_PARTICIPANT.2: /(participant|actor)\b/
+SEQ_CREATE.2: /create\b/
+SEQ_DESTROY.2: /destroy\b/
+SEQ_NOTE.2: /[Nn]ote\b/
+NOTE_PLACEMENT.2: /(left of|right of|over)\b/
+SEQ_BLOCK.2: /(loop|alt|opt|par_over|par|critical|break|rect|box)\b/
+SEQ_BRANCH.2: /(else|and|option)\b/
+SEQ_ACTIVATE.2: /(activate|deactivate)\b/
+SEQ_DIRECTIVE.2: /(autonumber|title|accTitle|accDescr|links|link|properties|details)\b/
+ACTOR: /[^\s<>\-:,;+](?:[^<>\-:\n,;+]|-(?![-<>x)]))*/
+SEQ_ARROW: /<<-->>|<<->>|-->>|->>|-->|->|--x|-x|--\)|-\)/
+ACTIVATION: "+" | "-"
+COLON_TEXT: /:[^\n]*/
+
+// ---------------------------------------------------------------- class
+class_line: CLASS_KW CLASS_NAME GENERIC? CLASS_LABEL? (":::" CLASS_NAME)? (OPEN_BRACE CLOSE_BRACE?)?
+          | NAMESPACE CLASS_NAME OPEN_BRACE?
+          | CLOSE_BRACE
+          | class_ref CARDINALITY? CLASS_RELATION CARDINALITY? class_ref COLON_TEXT?
+          | class_ref COLON_TEXT
+          | ANNOTATION CLASS_NAME?
+          | CLASS_NOTE REST
+          | CLASS_DIRECTIVE REST?
+
+class_ref: CLASS_NAME GENERIC?
+
+CLASS_KW.2: /class\b/
+NAMESPACE.2: /namespace\b/
+CLASS_NOTE.2: /note\b/
+CLASS_DIRECTIVE.2: /(cssClass|style|classDef|click|callback|link|direction|accTitle|accDescr)\b/
+CLASS_NAME: /`[^`\n]+`|[\w\u00C0-\uFFFF.]+(?:-(?=[\w\u00C0-\uFFFF])[\w\u00C0-\uFFFF.]*)*/
+GENERIC: /~[^~\n]+~/
+CLASS_LABEL: /\[\s*"[^"\n]*"\s*\]/
+ANNOTATION: /<<[^>\n]+>>/
+CARDINALITY: /"[^"\n]*"/
+CLASS_RELATION: /(?:<\||\*|o|<|\(\))?(?:--|\.\.)(?:\|>|\*|o|>|\(\))?/
+
+// ---------------------------------------------------------------- state
+state_line: state_ref (STATE_ARROW state_ref)? COLON_TEXT?
+          | STATE_KW (STRING STATE_AS STATE_ID | STATE_ID) (STEREOTYPE | OPEN_BRACE | COLON_TEXT)?
+          | CLOSE_BRACE
+          | CONCURRENCY
+          | STATE_NOTE NOTE_PLACEMENT STATE_ID COLON_TEXT?
+          | STATE_NOTE STRING STATE_AS STATE_ID
+          | STATE_DIRECTIVE REST?
+
+state_ref: (STATE_ID | START_END) (":::" STATE_ID)?
+
+STATE_KW.2: /state\b/
+STATE_AS.2: /as\b/
+STATE_NOTE.2: /note\b/
+STATE_DIRECTIVE.2: /(direction|classDef|class|style|accTitle|accDescr|scale|hide)\b/
+STATE_ID: /[\w\u00C0-\uFFFF.]+(?:-(?=[\w\u00C0-\uFFFF])[\w\u00C0-\uFFFF.]*)*/
+START_END: "[*]"
+STATE_ARROW: "-->"
+STEREOTYPE: /<<\s*(fork|join|choice)\s*>>|\[\[\s*(fork|join|choice)\s*\]\]/
+CONCURRENCY: /-{2,}/
+
+// ------------------------------------------------------- entity relationship
+er_line: ENTITY_NAME ENTITY_ALIAS? OPEN_BRACE?
+       | ENTITY_NAME ENTITY_ALIAS? ER_RELATION ENTITY_NAME ENTITY_ALIAS? COLON_TEXT
+       | CLOSE_BRACE
+       | ER_DIRECTIVE REST?
+
+ER_DIRECTIVE.2: /(direction|accTitle|accDescr|style|classDef|class)\b/
+ENTITY_NAME: /"[^"\n]*"|[\w\u00C0-\uFFFF][\w\u00C0-\uFFFF\-]*/
+ENTITY_ALIAS: /\[[^\]\n]*\]/
+ER_RELATION: /(?:\|o|\|\||\}o|\}\||o\||\|\{|o\{)(?:--|\.\.)(?:o\||\|\||o\{|\|\{|\}o|\}\|)|(?:one or zero|zero or one|one or more|one or many|many\(1\)|1\+|zero or more|zero or many|many\(0\)|0\+|only one|1)\s+(?:optionally\s+)?to\s+(?:one or zero|zero or one|one or more|one or many|many\(1\)|1\+|zero or more|zero or many|many\(0\)|0\+|only one|1)/
+
+// ---------------------------------------------------------------- gantt
+gantt_line: GANTT_KEYWORD REST?
+          | GANTT_FLAG
+          | TASK_NAME COLON_TEXT
+
+GANTT_KEYWORD.2: /(title|dateFormat|axisFormat|tickInterval|excludes|includes|todayMarker|section|weekday|accTitle|accDescr|displayMode|click)\b/
+GANTT_FLAG.2: /(inclusiveEndDates|topAxis)\b/
+TASK_NAME: /[^:\s#][^:\n#]*/
+
+// ---------------------------------------------------------------- pie
+pie_line: PIE_TITLE REST?
+        | PIE_FLAG
+        | STRING ":" NUMBER
+
+PIE_TITLE.2: /(title|accTitle|accDescr)\b/
+PIE_FLAG.2: /showData\b/
+
+// ---------------------------------------------------------------- journey
+journey_line: JOURNEY_KEYWORD REST?
+            | JOURNEY_TASK COLON_TEXT
+
+JOURNEY_KEYWORD.2: /(title|section|accTitle|accDescr)\b/
+JOURNEY_TASK: /[^:\s#][^:\n#]*/
+
+// ---------------------------------------------------------------- git graph
+git_line: GIT_COMMIT git_attr*
+        | GIT_BRANCH GIT_REF git_attr*
+        | GIT_CHECKOUT GIT_REF
+        | GIT_MERGE GIT_REF git_attr*
+        | GIT_CHERRY_PICK git_attr*
+
+git_attr: GIT_ATTR_KEY ":" (STRING | GIT_REF | NUMBER)
+
+GIT_COMMIT.2: /commit\b/
+GIT_BRANCH.2: /branch\b/
+GIT_CHECKOUT.2: /(checkout|switch)\b/
+GIT_MERGE.2: /merge\b/
+GIT_CHERRY_PICK.2: /cherry-pick\b/
+GIT_ATTR_KEY.2: /(id|tag|type|msg|order|parent)\b/
+GIT_REF: /"[^"\n]*"|[\w\u00C0-\uFFFF.\/\-]+/
+
+// ---------------------------------------------------------------- requirement
+requirement_line: REQ_TYPE REQ_NAME OPEN_BRACE
+                | REQ_ELEMENT REQ_NAME OPEN_BRACE
+                | CLOSE_BRACE
+                | REQ_NAME REQ_ARROW_OUT REQ_RELATION REQ_ARROW_HEAD REQ_NAME
+                | REQ_NAME REQ_ARROW_BACK REQ_RELATION REQ_ARROW_OUT REQ_NAME
+                | REQ_DIRECTIVE REST?
+
+requirement_field: REQ_FIELD COLON_TEXT
+
+REQ_TYPE.2: /(requirement|functionalRequirement|interfaceRequirement|performanceRequirement|physicalRequirement|designConstraint)\b/
+REQ_ELEMENT.2: /element\b/
+REQ_RELATION.2: /(contains|copies|derives|satisfies|verifies|refines|traces)\b/
+REQ_DIRECTIVE.2: /(direction|accTitle|accDescr|style|classDef|class)\b/
+REQ_FIELD.2: /(id|text|risk|verifymethod|verifyMethod|type|docref|docRef)\b/
+REQ_NAME: /"[^"\n]*"|[\w\u00C0-\uFFFF.]+(?:-(?=[\w\u00C0-\uFFFF])[\w\u00C0-\uFFFF.]*)*/
+REQ_ARROW_OUT: "-"
+REQ_ARROW_HEAD: "->"
+REQ_ARROW_BACK: "<-"
+
+// ---------------------------------------------------------------- shared
+OPEN_BRACE: "{"
+CLOSE_BRACE: "}"
+STRING: /"[^"\n]*"/
+NUMBER: /-?\d+(\.\d+)?/
+DIRECTION: /TB|TD|BT|RL|LR/
+REST: /[^\n]+/
+
+%import common.WS_INLINE
+%ignore WS_INLINE
+%ignore ";"
+"""
 
-INPUT_CODE_EXAMPLE = """
+# Start rule per diagram type, keyed by the header keyword that selects it.
+DIAGRAM_START_RULES: Dict[str, str] = {
+    "graph": "flowchart_line",
+    "flowchart": "flowchart_line",
+    "flowchart-elk": "flowchart_line",
+    "sequenceDiagram": "sequence_line",
+    "classDiagram": "class_line",
+    "classDiagram-v2": "class_line",
+    "stateDiagram": "state_line",
+    "stateDiagram-v2": "state_line",
+    "erDiagram": "er_line",
+    "gantt": "gantt_line",
+    "pie": "pie_line",
+    "journey": "journey_line",
+    "gitGraph": "git_line",
+    "requirementDiagram": "requirement_line",
+}
+
+# Other diagram types Mermaid understands; they are accepted unvalidated.
+OTHER_DIAGRAM_KEYWORDS = {
+    "mindmap",
+    "timeline",
+    "quadrantChart",
+    "zenuml",
+    "sankey",
+    "xychart",
+    "block",
+    "packet",
+    "architecture",
+    "kanban",
+    "radar",
+    "treemap",
+    "C4Context",
+    "C4Container",
+    "C4Component",
+    "C4Dynamic",
+    "C4Deployment",
+}
+
+HEADER_PATTERN = re.compile(r"^\s*([A-Za-z][\w-]*?)(?:-beta)?(?=[\s:;]|$)")
+
+# Options allowed after the header keyword, per start rule; anything after them
+# on the header line is validated as the first statement.
+HEADER_SUFFIXES: Dict[str, re.Pattern[str]] = {
+    "flowchart_line": re.compile(r"\s*(?:TB|TD|BT|RL|LR|[<>^v])?\s*;?"),
+    "pie_line": re.compile(r"\s*(?:showData\b)?"),
+    "": re.compile(r".*"),
+}
+
+ACC_DESCR_BLOCK = re.compile(r"^accDescr\s*\{")
+
+# Lines opening (and closing) a block whose body is free text, per start rule.
+FREE_TEXT_BLOCKS: Dict[str, re.Pattern[str]] = {
+    "class_line": re.compile(r"^\s*class\b.*\{\s*$"),
+    "er_line": re.compile(r".*\{\s*$"),
+}
+
+MULTI_LINE_NOTE = re.compile(r"^\s*note\s+(left|right)\s+of\s+[^:]+$")
+
+SEQUENCE_BLOCKS = {"loop", "alt", "opt", "par", "par_over", "critical", "break"}
+SEQUENCE_BLOCKS |= {"rect", "box"}
+SEQUENCE_BRANCHES = {"else": {"alt"}, "and": {"par", "par_over"}}
+SEQUENCE_BRANCHES["option"] = {"critical"}
+
+
+class MermaidSyntaxError(NamedTuple):
+    """A syntax error found by the local validator, 1-based line and column."""
+
+    line: int
+    column: int
+    message: str
+    source_line: str
+
+    def __str__(self) -> str:
+        pointer = " " * (self.column - 1) + "^"
+        return (
+            f"Parse error on line {self.line}, column {self.column}:"
+            f" {self.message}\n{self.source_line}\n{pointer}"
+        )
+
+
+# built on first use by get_validator()
+validator: Optional["MermaidValidator"] = None
+
+
+def build_parser(cache: bool = True) -> Lark:
+    """
+    Compile the statement grammar for every supported diagram type.
+
+    With `cache`, the LALR tables are loaded from MERMAID_PARSER_CACHE_PATH when
+    present; lark stores a hash of the grammar and options next to them, so a
+    stale file is rebuilt rather than reused.
+    """
+    options: Dict[str, Any] = {
+        "parser": "lalr",
+        "lexer": "contextual",
+        "start": sorted(set(DIAGRAM_START_RULES.values()) | {"requirement_field"}),
+    }
+    if cache:
+        try:
+            MERMAID_PARSER_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            return Lark(
+                MERMAID_GRAMMER, cache=str(MERMAID_PARSER_CACHE_PATH), **options
+            )
+        except OSError as err:
+            logger.warning(f"Mermaid parser cache unavailable, compiling: {err}")
+    return Lark(MERMAID_GRAMMER, **options)
+
+
+def split_statements(line: str) -> List[Tuple[int, str]]:
+    """Split a line on `;` outside of quotes and brackets, keeping offsets."""
+    statements = []
+    depth = 0
+    quoted = False
+    start = 0
+    for index, char in enumerate(line):
+        if char == '"':
+            quoted = not quoted
+        elif quoted:
+            continue
+        elif char in "([{":
+            depth += 1
+        elif char in ")]}":
+            depth = max(depth - 1, 0)
+        elif char == ";" and depth == 0:
+            statements.append((start, line[start:index]))
+            start = index + 1
+    statements.append((start, line[start:]))
+    return [(offset, text) for offset, text in statements if text.strip()]
+
+
+def strip_comment(line: str) -> str:
+    """Drop a trailing `%%` comment outside of quotes, brackets and `|` labels."""
+    depth = 0
+    quoted = False
+    piped = False
+    for index, char in enumerate(line):
+        if char == '"':
+            quoted = not quoted
+        elif quoted:
+            continue
+        elif char == "|":
+            piped = not piped
+        elif piped:
+            continue
+        elif char in "([{":
+            depth += 1
+        elif char in ")]}":
+            depth = max(depth - 1, 0)
+        elif line.startswith("%%", index) and depth == 0:
+            return line[:index]
+    return line
+
+
+def describe_error(err: UnexpectedInput, statement: str) -> str:
+    """Turn a lark exception into a short, Mermaid-like message."""
+    if isinstance(err, UnexpectedToken):
+        # lark's stubs leave the token out
+        token: Token = err.token  # type: ignore[attr-defined]
+        if token.type == "$END":
+            return "Unexpected end of statement"
+        expected = ", ".join(sorted(err.expected))
+        return f"Unexpected '{token}', expecting {expected}"
+    if isinstance(err, UnexpectedCharacters):
+        return f"Unexpected character '{statement[err.column - 1]}'"
+    return "Invalid statement"
+
+
+class ValidationState:
+    """Per-script bookkeeping while statements are validated line by line."""
+
+    def __init__(self, start_rule: str):
+        self.start_rule = start_rule
+        self.blocks: List[Tuple[str, int]] = []
+        self.free_text_until: Optional[str] = None
+
+    def check_blocks(self, keyword: str, line_number: int) -> Optional[str]:
+        """Track block openers and closers, returning an error message if any."""
+        if self.start_rule == "flowchart_line":
+            if keyword == "subgraph":
+                self.blocks.append(("subgraph", line_number))
+            elif keyword == "end":
+                if not self.blocks:
+                    return "'end' without a matching 'subgraph'"
+                self.blocks.pop()
+        elif self.start_rule == "sequence_line":
+            if keyword in SEQUENCE_BLOCKS:
+                self.blocks.append((keyword, line_number))
+            elif keyword in SEQUENCE_BRANCHES:
+                allowed = SEQUENCE_BRANCHES[keyword]
+                if not self.blocks or self.blocks[-1][0] not in allowed:
+                    return f"'{keyword}' outside of {'/'.join(sorted(allowed))} block"
+            elif keyword == "end":
+                if not self.blocks:
+                    return "'end' without a matching block"
+                self.blocks.pop()
+        return None
+
+    def check_braces(self, statement: str, line_number: int) -> Optional[str]:
+        """Track `{`/`}` blocks for class, state, ER and requirement diagrams."""
+        stripped = statement.strip()
+        if stripped == "}":
+            if not self.blocks:
+                return "'}' without a matching '{'"
+            self.blocks.pop()
+        elif stripped.endswith("{"):
+            self.blocks.append(("{", line_number))
+        return None
+
+
+class MermaidValidator:
+    """Validates Mermaid scripts statement by statement."""
+
+    def __init__(self, parser: Lark):
+        self.parser = parser
+
+    def validate(self, script: str) -> Optional[MermaidSyntaxError]:
+        """Return the first syntax error in a script, or None if none is found."""
+        lines = script.split("\n")
+        body = meaningful_lines(lines)
+        if not body:
+            return MermaidSyntaxError(1, 1, "No diagram type detected", "")
+
+        index, header = body[0]
+        match = HEADER_PATTERN.match(header)
+        keyword = match.group(1) if match else ""
+        if match is None or keyword not in DIAGRAM_START_RULES:
+            if keyword in OTHER_DIAGRAM_KEYWORDS or header.split()[0].endswith("-beta"):
+                return None
+            column = len(header) - len(header.lstrip()) + 1
+            return MermaidSyntaxError(
+                index + 1, column, "No diagram type detected", header
+            )
+
+        state = ValidationState(DIAGRAM_START_RULES[keyword])
+        # whatever follows the header keyword (and its options) is a statement
+        suffix = HEADER_SUFFIXES.get(state.start_rule, HEADER_SUFFIXES[""])
+        # every suffix pattern also matches nothing
+        suffix_match = suffix.match(header, match.end())
+        header_end = suffix_match.end() if suffix_match else match.end()
+        statements = [(index, header[header_end:], header_end)]
+        statements += [(number, line, 0) for number, line in body[1:]]
+
+        for number, line, line_offset in statements:
+            if not line.strip():
+                continue
+            error = self.validate_line(state, line, number + 1, line_offset)
+            if error is not None:
+                return MermaidSyntaxError(number + 1, error[0], error[1], lines[number])
+
+        if state.blocks:
+            block, line_number = state.blocks[-1]
+            return MermaidSyntaxError(
+                line_number,
+                1,
+                f"'{block}' block is never closed",
+                lines[line_number - 1],
+            )
+        return None
+
+    def validate_line(
+        self, state: ValidationState, line: str, line_number: int, line_offset: int
+    ) -> Optional[Tuple[int, str]]:
+        """Validate one physical line, returning (column, message) on error."""
+        stripped = line.strip()
+
+        if state.free_text_until is not None:
+            if re.fullmatch(state.free_text_until, stripped):
+                state.free_text_until = None
+                state.blocks.pop()
+            return None
+
+        start_rule = state.start_rule
+        if start_rule == "state_line" and MULTI_LINE_NOTE.match(stripped):
+            state.free_text_until = r"end\s+note"
+            state.blocks.append(("note", line_number))
+            return None
+        if start_rule in FREE_TEXT_BLOCKS and FREE_TEXT_BLOCKS[start_rule].match(line):
+            state.free_text_until = r"\}"
+        if start_rule == "requirement_line" and state.blocks and stripped != "}":
+            start_rule = "requirement_field"
+
+        if start_rule == "flowchart_line":
+            line = strip_comment(line)
+            if not line.strip():
+                return None
+        if start_rule in ("flowchart_line", "sequence_line"):
+            statements = split_statements(line)
+        else:
+            statements = [(0, line)]
+
+        for offset, statement in statements:
+            column = line_offset + offset + len(statement) - len(statement.lstrip()) + 1
+            try:
+                self.parser.parse(statement.strip(), start=start_rule)
+            except UnexpectedInput as err:
+                return column + err.column - 1, describe_error(err, statement.strip())
+
+            keyword = statement.split()[0] if statement.split() else ""
+            if start_rule in ("flowchart_line", "sequence_line"):
+                message = state.check_blocks(keyword, line_number)
+            else:
+                message = state.check_braces(statement, line_number)
+            if message is not None:
+                return column, message
+        return None
+
+
+def meaningful_lines(lines: List[str]) -> List[Tuple[int, str]]:
+    """
+    Return (index, line) pairs left after dropping front matter, blank lines,
+    `%%` comments, `%%{...}%%` directives and `accDescr { ... }` blocks.
+    """
+    index = 0
+    if lines and lines[0].strip() == "---":
+        for end in range(1, len(lines)):
+            if lines[end].strip() == "---":
+                index = end + 1
+                break
+
+    result = []
+    skip_until: Optional[str] = None
+    for number in range(index, len(lines)):
+        stripped = lines[number].strip()
+        if skip_until is not None:
+            if skip_until in stripped:
+                skip_until = None
+        elif stripped.startswith("%%{") and "}%%" not in stripped:
+            skip_until = "}%%"
+        elif ACC_DESCR_BLOCK.match(stripped) and "}" not in stripped:
+            skip_until = "}"
+        elif stripped and not stripped.startswith("%%"):
+            result.append((number, lines[number]))
+    return result
+
+
+def get_validator() -> MermaidValidator:
+    """Return the shared validator, compiling its parser on first use."""
+    global validator  # pylint: disable=global-statement
+    if validator is None:
+        validator = MermaidValidator(build_parser())
+    return validator
+
+
+def validate_mermaid(script: str) -> Optional[MermaidSyntaxError]:
+    """Validate a Mermaid script locally, returning the first error found."""
+    return get_validator().validate(script)
+
+
+def parse_mermaid(input_code: str) -> str:
+    """Validate a Mermaid script and describe the result."""
+    error = validate_mermaid(input_code)
+    if error is not None:
+        return f"Syntax error: {error}"
+    return "No syntax errors found"
+
+
+if __name__ == "__main__":
+    INPUT_CODE_EXAMPLE = """
 classDiagram
     note "From Duck till Zebra"
     Animal <|-- Duck
-    note for Duck "can fly\ncan swim\ncan dive\ncan help in debugging"
+    note for Duck "can fly\\ncan swim\\ncan dive\\ncan help in debugging"
     Animal <|-- Fish
     Animal <|-- Zebra
     Animal : +int age
@@ -150,5 +584,4 @@ classDiagram
     }
 """
 
-output_code_example = parse_mermaid(INPUT_CODE_EXAMPLE)
-print(output_code_example)
+    print(parse_mermaid(INPUT_CODE_EXAMPLE))
@@ -0,0 +1,125 @@
+"""Incremental extraction of string fields from a JSON object still arriving."""
+from typing import Dict, Iterable, List, Optional, Set
+
+JSON_ESCAPES = {
+    '"': '"',
+    "\\": "\\",
+    "/": "/",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+}
+HEX_DIGITS = set("0123456789abcdefABCDEF")
+
+
+class PartialJsonStringFields:
+    """
+    Pulls the values of top-level string fields out of a JSON object that is
+    fed in chunks, such as tool call arguments streamed by an LLM, so callers
+    can act on a field before the object is complete.
+
+    Values may also be wrapped in backticks, which some models emit for long
+    text; their content is taken verbatim, like sanitize_markdown_js does.
+    """
+
+    def __init__(self, fields: Iterable[str]):
+        self.fields = set(fields)
+        self.values: Dict[str, str] = {}
+        self.completed: Set[str] = set()
+        self.depth = 0
+        self.expecting_key = False
+        self.key: Optional[str] = None
+        # state of the string being read, if any
+        self.quote: Optional[str] = None
+        self.is_key = False
+        self.text: List[str] = []
+        self.escape = ""
+        self.high_surrogate = ""
+
+    def feed(self, chunk: str) -> Dict[str, str]:
+        """Consume a chunk, returning the text added to each tracked field."""
+        deltas: Dict[str, List[str]] = {}
+        for char in chunk:
+            if self.quote is not None:
+                decoded = self.read_string_char(char)
+                if decoded and self.is_tracked_value():
+                    deltas.setdefault(self.key or "", []).append(decoded)
+            else:
+                self.read_structure_char(char)
+        return {field: "".join(parts) for field, parts in deltas.items() if parts}
+
+    def is_tracked_value(self) -> bool:
+        """Whether the string being read is the value of a tracked field."""
+        return self.depth == 1 and not self.is_key and self.key in self.fields
+
+    def read_structure_char(self, char: str) -> None:
+        """Handle a character outside of any string."""
+        if char == '"' or (char == "`" and self.depth == 1 and not self.expecting_key):
+            self.quote = char
+            self.is_key = self.depth == 1 and self.expecting_key
+            self.text = []
+            if self.is_tracked_value():
+                self.values.setdefault(self.key or "", "")
+        elif char in "{[":
+            self.depth += 1
+            self.expecting_key = self.depth == 1 and char == "{"
+        elif char in "}]":
+            self.depth -= 1
+        elif self.depth == 1 and char == ":":
+            self.expecting_key = False
+        elif self.depth == 1 and char == ",":
+            self.expecting_key = True
+
+    def read_string_char(self, char: str) -> str:
+        """Handle a character inside a string, returning any decoded text."""
+        if self.escape:
+            return self.read_escape_char(char)
+        if char == "\\" and self.quote == '"':
+            self.escape = "\\"
+            return ""
+        if char == self.quote:
+            self.end_string()
+            return ""
+        return self.append(char)
+
+    def read_escape_char(self, char: str) -> str:
+        """Continue an escape sequence, decoding it once it is complete."""
+        self.escape += char
+        if self.escape[1] != "u":
+            self.escape = ""
+            return self.append(JSON_ESCAPES.get(char, char))
+        if len(self.escape) > 2 and char not in HEX_DIGITS:
+            # not a valid \uXXXX escape, keep the characters as they are
+            escape, self.escape = self.escape[1:], ""
+            return self.append(escape)
+        if len(self.escape) < 6:
+            return ""
+
+        code_point = int(self.escape[2:], 16)
+        self.escape = ""
+        if 0xD800 <= code_point < 0xDC00:
+            self.high_surrogate = chr(code_point)
+            return ""
+        if 0xDC00 <= code_point < 0xE000 and self.high_surrogate:
+            pair = self.high_surrogate + chr(code_point)
+            self.high_surrogate = ""
+            return self.append(pair.encode("utf-16", "surrogatepass").decode("utf-16"))
+        return self.append(chr(code_point))
+
+    def append(self, text: str) -> str:
+        """Add decoded text to the current string."""
+        self.text.append(text)
+        if self.is_tracked_value():
+            self.values[self.key or ""] += text
+        return text
+
+    def end_string(self) -> None:
+        """Finish the current string, recording keys and completed fields."""
+        if self.is_key:
+            self.key = "".join(self.text)
+        elif self.is_tracked_value():
+            self.completed.add(self.key or "")
+        self.quote = None
+        self.is_key = False
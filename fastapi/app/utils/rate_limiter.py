@@ -0,0 +1,103 @@
+"""Async request and token rate limiting per LLM vendor and model."""
+import asyncio
+import time
+from typing import Callable, Dict, NamedTuple, Tuple
+
+from loguru import logger
+
+
+class RateLimit(NamedTuple):
+    """Requests and tokens allowed per minute."""
+
+    requests_per_minute: int
+    tokens_per_minute: int
+
+
+class Headroom(NamedTuple):
+    """Capacity that can be used right now without waiting."""
+
+    requests: float
+    tokens: float
+
+
+class TokenBucket:
+    """Continuously refilling bucket holding up to one minute's allowance."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def available(self) -> float:
+        """Refill for the time elapsed and return the current level."""
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.level
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` can be taken (capped at the bucket size)."""
+        missing = min(amount, self.capacity) - self.available()
+        return max(missing, 0.0) / self.rate
+
+    def take(self, amount: float) -> None:
+        """Take `amount` out of the bucket; the level may go negative."""
+        self.available()
+        self.level -= amount
+
+
+class ModelLimiter:
+    """Request and token buckets for one model, with a FIFO queue in front."""
+
+    def __init__(self, limit: RateLimit):
+        self.requests = TokenBucket(limit.requests_per_minute)
+        self.tokens = TokenBucket(limit.tokens_per_minute)
+        # asyncio.Lock wakes its waiters in arrival order
+        self.queue = asyncio.Lock()
+
+
+class AsyncRateLimiter:
+    """
+    Keeps LLM calls within per-minute request and token limits for each
+    (vendor, model) pair. Callers wait in arrival order, so a large request is
+    not starved by a stream of small ones, and waiting never blocks the event
+    loop.
+    """
+
+    def __init__(self, limits_for: Callable[[str, str], RateLimit]):
+        self.limits_for = limits_for
+        self.models: Dict[Tuple[str, str], ModelLimiter] = {}
+
+    def model_limiter(self, vendor: str, model: str) -> ModelLimiter:
+        """Return the limiter for a model, creating it on first use."""
+        key = (vendor, model)
+        if key not in self.models:
+            self.models[key] = ModelLimiter(self.limits_for(vendor, model))
+        return self.models[key]
+
+    async def acquire(self, vendor: str, model: str, tokens: int) -> None:
+        """Wait until one request using `tokens` tokens fits in the limits."""
+        limiter = self.model_limiter(vendor, model)
+        async with limiter.queue:
+            while True:
+                delay = max(
+                    limiter.requests.wait_time(1), limiter.tokens.wait_time(tokens)
+                )
+                if delay <= 0:
+                    break
+                logger.info(f"Rate limited on {vendor}/{model}, waiting {delay:.2f}s")
+                await asyncio.sleep(delay)
+            limiter.requests.take(1)
+            limiter.tokens.take(tokens)
+
+    def headroom(self, vendor: str, model: str) -> Headroom:
+        """Requests and tokens available right now for a model."""
+        limiter = self.model_limiter(vendor, model)
+        if limiter.queue.locked():
+            # others are already waiting, nothing is available to newcomers
+            return Headroom(0.0, 0.0)
+        return Headroom(
+            max(limiter.requests.available(), 0.0),
+            max(limiter.tokens.available(), 0.0),
+        )
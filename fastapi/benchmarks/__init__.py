@@ -0,0 +1,7 @@
+"""
+Micro-benchmarks for the diagram pipeline.
+
+Run them from the fastapi folder so the app package is importable, e.g.:
+
+    python -m benchmarks.bench_render_io --renders 50
+"""
@@ -0,0 +1,104 @@
+"""
+Throughput of Anthropic token counting on folder reports.
+
+`exact (client per call)` is what num_tokens_from_string used to do for the
+anthropic vendor: build an Anthropic client and count with the SDK's
+tokenizer. `exact (shared client)` is the opt-in exact path. Both need the
+`tokenizers` package and are skipped without it. `estimate` is the offline
+default, counting a batch of reports with the converted tiktoken encoding,
+and `estimate (one by one)` counts them one call at a time.
+
+When the exact path is available the largest per-report difference between
+estimate and exact count is printed as well.
+"""
+import argparse
+import importlib.util
+import statistics
+import time
+from pathlib import Path
+from typing import Callable, List
+
+from anthropic import Anthropic
+from folder_tree_generator import generate_tree
+from python_code_outline import get_report
+
+from app.utils.llm_utils import anthropic_sync_count_tokens
+from app.utils.tokenizers import (
+    ANTHROPIC_ENCODING,
+    count_anthropic_tokens,
+    get_encoding,
+)
+
+
+def folder_reports(root: str) -> List[str]:
+    """The folder tree and code outline of every folder below root."""
+    reports = []
+    for folder in [Path(root), *sorted(Path(root).glob("*/"))]:
+        if folder.is_dir() and not folder.name.startswith("."):
+            reports.append(generate_tree(str(folder)) + get_report(str(folder)))
+    return reports
+
+
+def measure(name: str, count: Callable[[], List[int]], runs: int, chars: int) -> None:
+    """Time repeated counts of all reports and print throughput."""
+    timings: List[float] = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        count()
+        timings.append(time.perf_counter() - started)
+    mean = statistics.mean(timings)
+    print(f"{name:>26}: mean {mean * 1000:9.2f} ms  {chars / mean / 1e6:7.2f} MB/s")
+
+
+def main() -> None:
+    """Run the token counting benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--root", default=".")
+    parser.add_argument("--copies", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    reports = folder_reports(args.root) * args.copies
+    chars = sum(len(report) for report in reports)
+    print(f"{len(reports)} folder reports, {chars / 1e6:.1f} MB of text")
+
+    started = time.perf_counter()
+    get_encoding(ANTHROPIC_ENCODING)
+    print(f"estimator loaded in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    measure("estimate", lambda: count_anthropic_tokens(reports), args.runs, chars)
+    measure(
+        "estimate (one by one)",
+        lambda: [count_anthropic_tokens([report])[0] for report in reports],
+        args.runs,
+        chars,
+    )
+
+    if importlib.util.find_spec("tokenizers") is None:
+        print("exact paths skipped, the `tokenizers` package is not installed")
+        return
+
+    measure(
+        "exact (client per call)",
+        lambda: [Anthropic().count_tokens(report) for report in reports],
+        args.runs,
+        chars,
+    )
+    measure(
+        "exact (shared client)",
+        lambda: [anthropic_sync_count_tokens(report) for report in reports],
+        args.runs,
+        chars,
+    )
+
+    estimates = count_anthropic_tokens(reports)
+    exact = [anthropic_sync_count_tokens(report) for report in reports]
+    worst = max(
+        abs(estimate - count) / max(count, 1)
+        for estimate, count in zip(estimates, exact, strict=True)
+    )
+    print(f"largest estimate error: {worst:.3%} of the exact count")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Prompt tokens per retry of a Mermaid repair loop, with and without compaction.
+
+Each simulated attempt returns the previous diagram with a couple of lines
+changed and gets a parse error back. `plain` buffers every attempt's turns,
+as buffer_add_errormsg used to; `compacted` uses add_failed_attempt, which
+keeps the latest attempt and summarizes the earlier ones. Tokens are counted
+with the offline Anthropic estimator, so no network access is needed.
+"""
+import argparse
+from typing import Callable, List
+
+from app.components.enhanced_conversation_buffer import EnhancedConversationBuffer
+from app.config import ANTHROPIC_AI_VENDOR
+from app.utils.llm_utils import num_tokens_from_string
+
+REQUEST = "Create a flowchart of the checkout service.\n\n" + "\n".join(
+    f"- module checkout/step_{i}.py: handles step {i} of the checkout"
+    for i in range(40)
+)
+ERROR = (
+    "Error: Parse error on line {line}:\n...{snippet}\n"
+    "----------------------^\n"
+    "Expecting 'SEMI', 'NEWLINE', 'SPACE', 'EOF', 'AMP', 'COLON', got 'PS'"
+)
+
+
+def count_tokens(text: str) -> int:
+    """Offline token count used by the benchmark."""
+    return num_tokens_from_string(text, ANTHROPIC_AI_VENDOR)
+
+
+def attempt_diagram(attempt: int, nodes: int) -> str:
+    """The diagram of an attempt: the same flowchart with a few lines fixed."""
+    lines = ["graph TD"]
+    for i in range(nodes):
+        label = f"Step {i} (draft)" if i >= attempt * 2 else f"Step {i}"
+        lines.append(f"  S{i}[{label}] -->|next| S{i + 1}")
+    return "\n".join(lines)
+
+
+def error_turns(diagram: str, error: str) -> List[dict]:
+    """The turns buffer_add_errormsg adds for a failed attempt."""
+    return [
+        {"role": "assistant", "content": diagram},
+        {
+            "role": "user",
+            "content": "Sorry but that definition did not work, maybe there was a"
+            " syntax mistake, could you take a look at this error and try"
+            f" the function again:\n``` {error}```",
+        },
+    ]
+
+
+def run(
+    add_attempt: Callable[[EnhancedConversationBuffer, str, str], None],
+    attempts: int,
+    nodes: int,
+    max_tokens: int,
+) -> List[int]:
+    """Prompt tokens sent for each retry."""
+    buffer = EnhancedConversationBuffer(max_tokens, count_tokens)
+    buffer.add_messages(
+        [
+            {"role": "system", "content": "You write professional system diagrams."},
+            {"role": "user", "content": REQUEST},
+        ],
+        pinned=True,
+    )
+    prompt_tokens = []
+    for attempt in range(attempts):
+        diagram = attempt_diagram(attempt, nodes)
+        error = ERROR.format(line=attempt * 2 + 2, snippet=f"S{attempt * 2}[Step (d")
+        add_attempt(buffer, diagram, error)
+        prompt_tokens.append(buffer.current_tokens)
+    return prompt_tokens
+
+
+def main() -> None:
+    """Run the repair loop both ways and report the tokens saved."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--attempts", type=int, default=8)
+    parser.add_argument("--nodes", type=int, default=40)
+    parser.add_argument("--max-tokens", type=int, default=100_000)
+    args = parser.parse_args()
+
+    plain = run(
+        lambda buffer, diagram, error: buffer.add_messages(error_turns(diagram, error)),
+        args.attempts,
+        args.nodes,
+        args.max_tokens,
+    )
+    compacted = run(
+        lambda buffer, diagram, error: buffer.add_failed_attempt(
+            diagram, error, error_turns(diagram, error)
+        ),
+        args.attempts,
+        args.nodes,
+        args.max_tokens,
+    )
+
+    print(f"{'retry':>5} {'plain':>8} {'compacted':>10} {'saved':>7}")
+    for retry, (before, after) in enumerate(zip(plain, compacted, strict=True), 1):
+        print(f"{retry:>5} {before:>8} {after:>10} {before - after:>7}")
+    saved = sum(plain) - sum(compacted)
+    print(
+        f"prompt tokens over {args.attempts} retries: {sum(plain)} plain,"
+        f" {sum(compacted)} compacted, {saved} saved ({saved / sum(plain):.0%})"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Folder scans on a synthetic monorepo, rglob versus the pruning walker.
+
+The tree has `--projects` folders. Half of them are Python projects with a
+large .venv, the others are TypeScript projects with a large node_modules;
+those two folders hold 99% of the `--files` files. There is no .gitignore,
+so find_gitignore has to look at the whole tree.
+
+`rglob` reproduces the previous implementations: find_gitignore took the
+first Path.rglob(".gitignore") match and contains_python_project ran one
+rglob per pattern over every folder. `walker` is the current service code.
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from app.services.directory_analysis_service import (
+    find_gitignore,
+    read_folder,
+    read_python_projects,
+)
+
+FILES_PER_FOLDER = 100
+
+
+def write_files(folder: Path, count: int, suffix: str) -> int:
+    """Create `count` empty files spread over folders of FILES_PER_FOLDER."""
+    for start in range(0, count, FILES_PER_FOLDER):
+        sub = folder / f"pkg{start // FILES_PER_FOLDER}"
+        sub.mkdir(parents=True, exist_ok=True)
+        for index in range(start, min(start + FILES_PER_FOLDER, count)):
+            with open(sub / f"file{index}{suffix}", "wb"):
+                pass
+    return count
+
+
+def build_tree(root: Path, files: int, projects: int) -> int:
+    """Create the synthetic monorepo and return the number of files written."""
+    per_project = files // projects
+    written = 0
+    for number in range(projects):
+        project = root / f"project{number}"
+        own = max(per_project // 100, 1)
+        if number % 2 == 0:
+            written += write_files(project / "src", own, ".py")
+            written += write_files(project / ".venv", per_project - own, ".py")
+        else:
+            written += write_files(project / "src", own, ".ts")
+            written += write_files(project / "node_modules", per_project - own, ".js")
+    return written
+
+
+def rglob_find_gitignore(root_folder: str) -> Optional[str]:
+    """The previous find_gitignore."""
+    try:
+        return str(next(Path(root_folder).rglob(".gitignore")))
+    except StopIteration:
+        return None
+
+
+def rglob_read_python_projects(folder_path: str) -> List[str]:
+    """The previous read_python_projects, with its rglob passes."""
+    gitignore_path = rglob_find_gitignore(folder_path)
+    ignore_patterns: List[str] = []
+    if gitignore_path:
+        with open(gitignore_path, "r", encoding="utf-8") as file:
+            ignore_patterns = [line.strip() for line in file if line.strip()]
+
+    projects = []
+    for entry in Path(folder_path).iterdir():
+        if not entry.is_dir():
+            continue
+        for pattern in ["*.py", "pyproject.toml"]:
+            if any(
+                not any(fnmatch(str(match), ignore) for ignore in ignore_patterns)
+                for match in entry.rglob(pattern)
+            ):
+                projects.append(entry.name)
+                break
+    return projects
+
+
+def measure(name: str, call: Callable[[], object]) -> object:
+    """Time one call and print it."""
+    started = time.perf_counter()
+    result = call()
+    print(f"{name:>32}: {time.perf_counter() - started:8.3f} s")
+    return result
+
+
+def main() -> None:
+    """Build the tree and time both implementations."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=1_000_000)
+    parser.add_argument("--projects", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir)
+        started = time.perf_counter()
+        written = build_tree(root, args.files, args.projects)
+        print(f"built {written} files in {time.perf_counter() - started:.1f} s")
+
+        old = measure("rglob find_gitignore", lambda: rglob_find_gitignore(temp_dir))
+        new = measure("walker find_gitignore", lambda: find_gitignore(temp_dir))
+        assert old == new, (old, new)
+
+        old = measure(
+            "rglob read_python_projects",
+            lambda: rglob_read_python_projects(temp_dir),
+        )
+        new = measure(
+            "walker read_python_projects",
+            lambda: asyncio.run(read_python_projects(temp_dir)),
+        )
+        assert sorted(old) == sorted(new), (old, new)  # type: ignore
+
+        measure("walker read_folder", lambda: asyncio.run(read_folder(temp_dir)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Concurrent LLM completions: blocking client vs shared async client.
+
+`blocking` reproduces the old llm_service: a synchronous OpenAI client called
+from coroutines, so every round trip stalls the event loop and concurrent
+requests run one after the other. `per-call` awaits a fresh async client for
+every request, as complete_anthropic_text used to, and so opens a connection
+each time. `async` goes through complete_text and the shared, pooled
+AsyncOpenAI client; its second round reuses the kept-alive connections. Both talk to a local fake server with a
+fixed per-request latency. Besides wall time the benchmark reports the
+longest event loop stall, measured by a heartbeat task, and how many TCP
+connections the server saw.
+"""
+import argparse
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, List
+
+from loguru import logger
+from openai import AsyncOpenAI, OpenAI
+
+from benchmarks.fake_llm_server import FakeLLMServer, start_fake_llm_server
+
+MESSAGES = [{"role": "user", "content": "Draw a diagram of the service."}]
+
+
+async def heartbeat(stalls: List[float], interval: float = 0.01) -> None:
+    """Record how late the event loop wakes this task up."""
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        stalls.append(time.perf_counter() - started - interval)
+
+
+def content(response) -> str:
+    """Callback returning the completion text."""
+    return response.choices[0].message.content
+
+
+async def measure(
+    name: str,
+    server: FakeLLMServer,
+    complete: Callable[[], Awaitable[object]],
+    requests: int,
+) -> None:
+    """Run `requests` completions concurrently and print the results."""
+    connections_before = server.connections
+    stalls: List[float] = []
+    ticker = asyncio.create_task(heartbeat(stalls))
+    started = time.perf_counter()
+    await asyncio.gather(*(complete() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    ticker.cancel()
+    print(
+        f"{name:>9}: {elapsed:7.2f} s for {requests} requests"
+        f"  max loop stall {max(stalls, default=elapsed) * 1000:8.1f} ms"
+        f"  connections {server.connections - connections_before}"
+    )
+
+
+async def main() -> None:
+    """Run both client setups against the fake server."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.25)
+    args = parser.parse_args()
+
+    logger.remove()
+    server = start_fake_llm_server(args.latency)
+    os.environ["OPENAI_BASE_URL"] = server.url
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+
+    # imported late so the shared client picks up the fake server's URL
+    from app.services.llm_service import (  # pylint: disable=import-outside-toplevel
+        close_llm_clients,
+        complete_text,
+    )
+
+    print(f"{args.requests} concurrent requests, {args.latency:.2f} s server latency")
+
+    blocking_client = OpenAI()
+
+    async def blocking() -> object:
+        return content(
+            blocking_client.chat.completions.create(
+                model="fake", max_tokens=100, messages=MESSAGES
+            )
+        )
+
+    async def per_call() -> object:
+        async with AsyncOpenAI() as client:
+            return content(
+                await client.chat.completions.create(
+                    model="fake", max_tokens=100, messages=MESSAGES
+                )
+            )
+
+    async def pooled() -> object:
+        return await complete_text(
+            max_tokens=100,
+            model="fake",
+            vendor="open_ai",
+            messages=MESSAGES,
+            callback=content,
+        )
+
+    await measure("blocking", server, blocking, args.requests)
+    await measure("per-call", server, per_call, args.requests)
+    await measure("async", server, pooled, args.requests)
+    await measure("async", server, pooled, args.requests)
+    await close_llm_clients()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,61 @@
+"""
+Per-parse cost of the local Mermaid validator.
+
+`rebuild` compiles the grammar for every validation, which is what
+parse_mermaid used to do. `singleton` reuses one compiled parser. The startup
+numbers compare compiling the LALR tables with loading them from the on-disk
+cache.
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List
+
+from app.utils import mermaid_parser
+from app.utils.mermaid_parser import MermaidValidator, build_parser, get_validator
+
+SCRIPT = "graph TD\n" + "\n".join(
+    f"  N{i}[Node {i}] -->|step {i}| N{i + 1}(Next)" for i in range(40)
+)
+
+
+def measure(name: str, call: Callable[[], object], runs: int) -> None:
+    """Time repeated calls and print mean and p95 latency."""
+    timings: List[float] = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - started)
+    print(
+        f"{name:>20}: mean {statistics.mean(timings) * 1000:8.3f} ms"
+        f"  p95 {sorted(timings)[int(len(timings) * 0.95) - 1] * 1000:8.3f} ms"
+    )
+
+
+def main() -> None:
+    """Run the parser benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"validating a {len(SCRIPT.splitlines())}-line flowchart")
+    measure(
+        "rebuild",
+        lambda: MermaidValidator(build_parser(cache=False)).validate(SCRIPT),
+        args.runs,
+    )
+    get_validator()
+    measure("singleton", lambda: get_validator().validate(SCRIPT), args.runs)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache_path = Path(temp_dir) / "mermaid_parser.lark"
+        mermaid_parser.MERMAID_PARSER_CACHE_PATH = cache_path
+        measure("startup (compile)", lambda: build_parser(cache=False), args.runs)
+        build_parser()
+        measure("startup (cached)", build_parser, args.runs)
+
+
+if __name__ == "__main__":
+    main()
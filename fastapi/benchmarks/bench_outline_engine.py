@@ -0,0 +1,100 @@
+"""
+Outlining a synthetic monorepo of `--files` Python modules with 1 to
+`--max-workers` worker processes.
+
+`get_report` is python_code_outline's serial report. `cold` outlines every
+file with an empty content-hash cache, `warm` repeats it with the cache
+filled, which is what a refresh costs when files were touched but not
+edited. Worker counts above the number of CPUs only add overhead.
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+from python_code_outline import get_report
+
+from app.services import outline_engine
+from app.services.outline_engine import file_digest, outline_files, stop_outline_pool
+from app.utils.cache_utils import LRUCache
+
+MODULE = '''"""Module {number}."""
+import os
+from typing import List, Optional
+
+
+class Service{number}(object):
+    """A service."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items: List[str] = []
+
+{methods}
+
+def helper_{number}(values: List[int], default: Optional[int] = None) -> int:
+    total = sum(values)
+    return total if values else default or 0
+'''
+METHOD = """    def method_{index}(self, value, *args, **kwargs):
+        result = [item for item in self.items if item.startswith(str(value))]
+        return os.path.join(self.name, *result)
+"""
+
+
+def build_repo(root: Path, files: int) -> List[Tuple[str, str]]:
+    """Write the modules, 50 per package, and return their (path, digest)."""
+    modules = []
+    for number in range(files):
+        package = root / f"package{number // 50}"
+        package.mkdir(exist_ok=True)
+        path = package / f"module{number}.py"
+        methods = "\n".join(METHOD.format(index=index) for index in range(12))
+        path.write_text(MODULE.format(number=number, methods=methods))
+        modules.append((str(path), file_digest(str(path))))
+    return modules
+
+
+def measure(name: str, call) -> float:
+    """Time one call and print it."""
+    started = time.perf_counter()
+    call()
+    elapsed = time.perf_counter() - started
+    print(f"{name:>24}: {elapsed:8.2f} s")
+    return elapsed
+
+
+def main() -> None:
+    """Build the repo and outline it with every worker count."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=20_000)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=32)
+    args = parser.parse_args()
+    print(f"{os.cpu_count()} CPUs, {args.files} files")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        modules = build_repo(Path(temp_dir), args.files)
+        measure("get_report", lambda: get_report(temp_dir))
+
+        workers = 1
+        while workers <= args.max_workers:
+            outline_engine.outline_cache = LRUCache(args.files)
+            if workers > 1:
+                # start the pool outside of the timing
+                outline_engine.get_outline_pool(workers)
+            measure(
+                f"cold, {workers} workers",
+                lambda workers=workers: list(
+                    outline_files(modules, workers, args.chunk_size)
+                ),
+            )
+            workers *= 2
+        measure("warm", lambda: list(outline_files(modules)))
+        stop_outline_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Compare temp-file render I/O with the stdin/stdout render path.
+
+The temp-file path mirrors what the service used to do: write the script to a
+NamedTemporaryFile, let the renderer write a second temp file, wrap that in a
+FileResponse and read it back into a string. The pipe path feeds the script to
+the renderer's stdin and reads the SVG bytes from its stdout.
+
+With --renderer mmdc both paths run the real mermaid-cli. The default
+`passthrough` renderer copies input to output with `cat`, which isolates the
+I/O and process overhead from rendering itself and runs without Chromium.
+"""
+import argparse
+import asyncio
+import glob
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import Awaitable, Callable, List
+
+from fastapi.responses import FileResponse
+
+SCRIPT = "graph TD\n" + "\n".join(f"  N{i}[Node {i}] --> N{i + 1}" for i in range(200))
+
+
+async def temp_file_render(renderer: str, script: str) -> str:
+    """Script and SVG through two leaked temp files, then re-read from disk."""
+    with NamedTemporaryFile(delete=False, suffix=".mmd") as temp_in, NamedTemporaryFile(
+        delete=False, suffix=".svg"
+    ) as temp_out:
+        temp_in.write(script.encode())
+        temp_in.close()
+        temp_out.close()
+
+        if renderer == "mmdc":
+            command = ["mmdc", "-i", temp_in.name, "-o", temp_out.name]
+        else:
+            command = ["cp", temp_in.name, temp_out.name]
+        process = await asyncio.create_subprocess_exec(
+            *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        await process.communicate()
+
+    response = FileResponse(temp_out.name, media_type="image/svg+xml")
+    return await asyncio.to_thread(Path(response.path).read_text, encoding="utf-8")
+
+
+async def pipe_render(renderer: str, script: str) -> bytes:
+    """Script in through stdin, SVG bytes out through stdout."""
+    if renderer == "mmdc":
+        command = ["mmdc", "--quiet", "-i", "-", "-o", "-", "-e", "svg"]
+    else:
+        command = ["cat"]
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stdout, _ = await process.communicate(script.encode())
+    return stdout
+
+
+async def measure(
+    name: str, render: Callable[[], Awaitable[object]], renders: int
+) -> None:
+    """Time sequential renders and report latency and leaked temp files."""
+    pattern = os.path.join(tempfile.gettempdir(), "tmp*.svg")
+    files_before = len(glob.glob(pattern))
+    timings: List[float] = []
+    for _ in range(renders):
+        started = time.perf_counter()
+        await render()
+        timings.append(time.perf_counter() - started)
+    leaked = len(glob.glob(pattern)) - files_before
+
+    print(
+        f"{name:>10}: mean {statistics.mean(timings) * 1000:8.2f} ms"
+        f"  p95 {sorted(timings)[int(len(timings) * 0.95) - 1] * 1000:8.2f} ms"
+        f"  leaked svg temp files: {leaked}"
+    )
+
+
+async def main() -> None:
+    """Run both render paths."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--renders", type=int, default=50)
+    parser.add_argument(
+        "--renderer", choices=["passthrough", "mmdc"], default="passthrough"
+    )
+    args = parser.parse_args()
+
+    print(f"{args.renders} renders with the {args.renderer} renderer")
+    await measure(
+        "temp files", lambda: temp_file_render(args.renderer, SCRIPT), args.renders
+    )
+    await measure("pipes", lambda: pipe_render(args.renderer, SCRIPT), args.renders)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
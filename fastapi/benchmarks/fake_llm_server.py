@@ -0,0 +1,188 @@
+"""
+A tiny OpenAI-compatible chat completions server for benchmarks.
+
+Every POST answers after a fixed delay, which stands in for the time a real
+model spends generating. Requests offering tools get a create_mermaid_diagram
+tool call, others a plain message. `"stream": true` requests get the same
+completion as server-sent chunks. Connections are kept alive, so connection
+reuse by the client is visible in the results.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+
+DIAGRAM_ARGUMENTS = json.dumps(
+    {
+        "diagram_title": "Service",
+        "diagram_type": "flowchart",
+        "diagram_text_definition": "graph TD\n  Client --> API\n  API --> LLM",
+        "explanation": "The client calls the API, which asks the LLM.",
+    }
+)
+STREAM_CHUNK_SIZE = 16
+
+
+def completion_message(tools: bool) -> Dict[str, Any]:
+    """The assistant message returned for a request."""
+    if not tools:
+        return {"role": "assistant", "content": "graph TD\n  A --> B"}
+    return {
+        "role": "assistant",
+        "content": None,
+        "tool_calls": [
+            {
+                "id": "call_fake",
+                "type": "function",
+                "function": {
+                    "name": "create_mermaid_diagram",
+                    "arguments": DIAGRAM_ARGUMENTS,
+                },
+            }
+        ],
+    }
+
+
+def completion(tools: bool) -> Dict[str, Any]:
+    """A full chat completion."""
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "fake",
+        "choices": [
+            {
+                "index": 0,
+                "finish_reason": "tool_calls" if tools else "stop",
+                "message": completion_message(tools),
+            }
+        ],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+    }
+
+
+def completion_chunks(tools: bool) -> List[Dict[str, Any]]:
+    """The same completion split into streamed chunks."""
+    message = completion_message(tools)
+    deltas: List[Dict[str, Any]] = [{"role": "assistant", "content": ""}]
+    if tools:
+        tool_call = message["tool_calls"][0]
+        arguments = tool_call["function"]["arguments"]
+        deltas.append(
+            {
+                "tool_calls": [
+                    {
+                        "index": 0,
+                        "id": tool_call["id"],
+                        "type": "function",
+                        "function": {"name": tool_call["function"]["name"]},
+                    }
+                ]
+            }
+        )
+        deltas += [
+            {
+                "tool_calls": [
+                    {
+                        "index": 0,
+                        "function": {
+                            "arguments": arguments[start : start + STREAM_CHUNK_SIZE]
+                        },
+                    }
+                ]
+            }
+            for start in range(0, len(arguments), STREAM_CHUNK_SIZE)
+        ]
+    else:
+        content = message["content"]
+        deltas += [
+            {"content": content[start : start + STREAM_CHUNK_SIZE]}
+            for start in range(0, len(content), STREAM_CHUNK_SIZE)
+        ]
+
+    chunks = [
+        {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "fake",
+            "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+        }
+        for delta in deltas
+    ]
+    chunks[-1]["choices"][0]["finish_reason"] = "tool_calls" if tools else "stop"
+    return chunks
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    """HTTP server holding the simulated latency and connection count."""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], latency: float):
+        super().__init__(address, FakeLLMHandler)
+        self.latency = latency
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        """Base URL to point an SDK client at."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    """Answers every completion request with a canned completion."""
+
+    protocol_version = "HTTP/1.1"
+    server: FakeLLMServer
+
+    def setup(self) -> None:
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self) -> None:  # pylint: disable=invalid-name
+        """Read the request, wait, then return the canned completion."""
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        tools = bool(request.get("tools"))
+        if request.get("stream"):
+            self.stream(completion_chunks(tools))
+            return
+
+        time.sleep(self.server.latency)
+        body = json.dumps(completion(tools)).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream(self, chunks: List[Dict[str, Any]]) -> None:
+        """Send chunks as server-sent events, spreading the latency over them."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for chunk in chunks:
+            time.sleep(self.server.latency / len(chunks))
+            self.write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+        self.write_chunk(b"data: [DONE]\n\n")
+        self.write_chunk(b"")
+
+    def write_chunk(self, data: bytes) -> None:
+        """Write one HTTP/1.1 chunk."""
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, *args) -> None:  # pylint: disable=arguments-differ
+        """Keep benchmark output clean."""
+
+
+def start_fake_llm_server(latency: float) -> FakeLLMServer:
+    """Start the server on a free local port in a background thread."""
+    server = FakeLLMServer(("127.0.0.1", 0), latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
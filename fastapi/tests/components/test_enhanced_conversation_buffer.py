@@ -0,0 +1,127 @@
+"""Tests for the enhanced conversation buffer."""
+import unittest
+from typing import List
+
+from app.components.enhanced_conversation_buffer import (
+    EnhancedConversationBuffer,
+    FailedAttempt,
+    summarize_attempts,
+)
+
+
+class TestEnhancedConversationBuffer(unittest.TestCase):
+    """Tests for EnhancedConversationBuffer."""
+
+    def setUp(self):
+        self.counted: List[str] = []
+
+        def count_words(text: str) -> int:
+            self.counted.append(text)
+            return len(text.split())
+
+        self.buffer = EnhancedConversationBuffer(10, count_words)
+        self.buffer.add_messages(
+            [
+                {"role": "system", "content": "draw diagrams"},
+                {"role": "user", "content": "a login flow"},
+            ],
+            pinned=True,
+        )
+
+    def test_pinned_messages_are_never_evicted(self):
+        """Test that eviction only drops unpinned messages, oldest first."""
+        for turn in ["one two", "three four", "five six", "seven"]:
+            self.buffer.add_message({"role": "assistant", "content": turn})
+
+        self.assertEqual(
+            [msg["content"] for msg in self.buffer.buffer_as_messages],
+            ["draw diagrams", "a login flow", "three four", "five six", "seven"],
+        )
+        self.assertEqual(self.buffer.current_tokens, 10)
+
+    def test_messages_are_counted_once(self):
+        """Test that evicting a message does not tokenize it again."""
+        self.buffer.add_message({"role": "assistant", "content": "x " * 6})
+        self.buffer.add_message({"role": "assistant", "content": "y y"})
+        self.assertEqual(len(self.counted), 4)
+
+    def test_save_and_load_round_trip(self):
+        """Test that a loaded context has the same messages and counts."""
+        self.buffer.add_message({"role": "assistant", "content": "one two"})
+        context = self.buffer.save_context()
+
+        loaded = EnhancedConversationBuffer(1, lambda text: 1000)
+        loaded.load_context(context)
+        self.assertEqual(loaded.buffer_as_messages, self.buffer.buffer_as_messages)
+        self.assertEqual(loaded.current_tokens, self.buffer.current_tokens)
+        self.assertEqual(loaded.save_context(), context)
+
+    def test_load_rejects_mismatched_counts(self):
+        """Test that counts not matching the messages are refused."""
+        context = self.buffer.save_context()
+        context["pinned_tokens"] = [1]
+        with self.assertRaises(TypeError):
+            self.buffer.load_context(context)
+
+
+class TestCompaction(unittest.TestCase):
+    """Tests for compacting failed attempts."""
+
+    def setUp(self):
+        self.buffer = EnhancedConversationBuffer(1000, lambda text: len(text.split()))
+        self.buffer.add_message({"role": "system", "content": "prompt"}, pinned=True)
+
+    def add_attempt(self, diagram: str, error: str) -> None:
+        """Add a failed attempt the way buffer_add_errormsg does."""
+        self.buffer.add_failed_attempt(
+            diagram,
+            error,
+            [
+                {"role": "assistant", "content": diagram},
+                {"role": "user", "content": f"error: {error}"},
+            ],
+        )
+
+    def test_only_latest_attempt_keeps_its_turns(self):
+        """Test that earlier attempts are replaced by one summary message."""
+        self.add_attempt("graph TD\n  A --> B(", "bad paren")
+        self.add_attempt("graph TD\n  A --> B[", "bad bracket")
+        self.add_attempt("graph TD\n  A --> B[x", "bad bracket")
+
+        messages = self.buffer.buffer_as_messages
+        self.assertEqual(len(messages), 4)
+        summary = messages[1]["content"]
+        self.assertIn("Attempt 1 failed with: bad paren", summary)
+        self.assertIn("Attempt 2 failed with: bad bracket", summary)
+        self.assertIn("-  A --> B(\n+  A --> B[", summary)
+        self.assertEqual(messages[2]["content"], "graph TD\n  A --> B[x")
+        self.assertEqual(
+            self.buffer.current_tokens,
+            sum(len(msg["content"].split()) for msg in messages),
+        )
+
+    def test_summary_round_trips(self):
+        """Test that the summary and attempts survive save and load."""
+        self.add_attempt("graph TD\n  A --> B(", "bad paren")
+        self.add_attempt("graph TD\n  A --> B[", "bad bracket")
+        loaded = EnhancedConversationBuffer(1000, lambda text: 0)
+        loaded.load_context(self.buffer.save_context())
+        self.assertEqual(loaded.buffer_as_messages, self.buffer.buffer_as_messages)
+        self.assertEqual(loaded.current_tokens, self.buffer.current_tokens)
+        self.assertEqual(loaded.failed_attempts, self.buffer.failed_attempts)
+
+    def test_repeated_errors_are_collapsed(self):
+        """Test that a repeated error refers back instead of being repeated."""
+        summary = summarize_attempts(
+            [
+                FailedAttempt("", "timeout"),
+                FailedAttempt("", "timeout"),
+                FailedAttempt("", "timeout"),
+            ]
+        )
+        self.assertEqual(summary.count("timeout"), 1)
+        self.assertIn("same error as attempt 1", summary)
+
+
+if __name__ == "__main__":
+    unittest.main()
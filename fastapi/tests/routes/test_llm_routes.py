@@ -0,0 +1,44 @@
+"""Tests for the token counting routes."""
+import unittest
+from unittest import mock
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.utils import tokenizers
+from app.utils.llm_utils import TEXT_ENCODING
+from tests.utils.test_tokenizers import byte_encoding
+
+
+class TestTokenCountRoutes(unittest.TestCase):
+    """Tests for /token_count and /token_count/batch."""
+
+    def setUp(self):
+        patcher = mock.patch.dict(
+            tokenizers.encodings, {TEXT_ENCODING: byte_encoding()}
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = TestClient(app)
+
+    def test_token_count(self):
+        """Test that the real count is returned."""
+        response = self.client.post(
+            "/token_count", json={"text": "graph TD", "llm_vendor": "open_ai"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["token_count"], 8)
+
+    def test_token_count_batch(self):
+        """Test that each text is counted and the total is reported."""
+        response = self.client.post(
+            "/token_count/batch",
+            json={"texts": ["graph TD", "A", ""], "llm_vendor": "open_ai"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["token_counts"], [8, 1, 0])
+        self.assertEqual(response.json()["total_tokens"], 9)
+
+
+if __name__ == "__main__":
+    unittest.main()
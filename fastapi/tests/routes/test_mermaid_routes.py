@@ -0,0 +1,103 @@
+"""Tests for the Mermaid design request routes."""
+import asyncio
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Tuple
+from unittest import mock
+
+from fastapi.testclient import TestClient
+
+from app.exceptions import MermaidRenderPoolError, MermaidUnexpectedError
+from app.main import app
+from app.routes import mermaid_routes
+from app.routes.mermaid_routes import server_sent_events
+from app.services import code_diagram_service, directory_analysis_service
+from app.services.diagram_service import load_diagram_config
+
+DESIGN_REQUEST = {
+    "text": "",
+    "source_folder_option": "repo",
+    "diagram_category": "flowchart",
+    "diagram_option": "importGraph1",
+    "include_folder_tree": False,
+    "include_python_code_outline": False,
+    "git_ignore_file_path": None,
+    "llm_vendor_for_instructions": "open_ai",
+    "llm_model_for_instructions": "no-such-model",
+}
+
+
+class TestCodeDiagramRequest(unittest.TestCase):
+    """Tests for design requests of diagrams generated from the code."""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        self.addCleanup(temp_dir.cleanup)
+        root = Path(temp_dir.name)
+        os.makedirs(root / "repo" / "shop")
+        (root / "repo" / "shop" / "__init__.py").write_text("from . import api\n")
+        (root / "repo" / "shop" / "api.py").write_text("import json\n")
+
+        self.render = mock.AsyncMock(return_value=(b"<svg/>", ""))
+        self.llm_request = mock.AsyncMock()
+        for patcher in (
+            mock.patch.object(code_diagram_service, "SOURCE_REPOS_FOLDER", f"{root}/"),
+            mock.patch.object(
+                code_diagram_service, "create_mermaid_diagram", self.render
+            ),
+            mock.patch.object(
+                directory_analysis_service, "REPOSITORY_INDEX_DIR", root / "index"
+            ),
+            mock.patch.dict(directory_analysis_service.repository_indexes, clear=True),
+            mock.patch.object(mermaid_routes, "mermaid_request", self.llm_request),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # without the startup event, which would also start the render pool
+        diagram_config = asyncio.run(load_diagram_config())
+        patcher = mock.patch.object(
+            app.state, "diagram_config", diagram_config, create=True
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = TestClient(app)
+
+    def test_rendered_without_an_llm(self):
+        response = self.client.post("/mermaid_design_request/", json=DESIGN_REQUEST)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["markdown_svg"], "<svg/>")
+        self.assertEqual(response.json()["diagram_type"], "flowchart")
+        definition = self.render.call_args.args[0].mermaid_def_str
+        self.assertTrue(definition.startswith("flowchart LR\n"))
+        self.assertIn('["shop.api"]', definition)
+        self.llm_request.assert_not_called()
+
+    def test_unexpected_render_error_is_500(self):
+        self.render.side_effect = MermaidUnexpectedError("Render queue is full")
+        response = self.client.post("/mermaid_design_request/", json=DESIGN_REQUEST)
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.json()["detail"], "Render queue is full")
+
+
+class TestServerSentEvents(unittest.IsolatedAsyncioTestCase):
+    """Tests for server_sent_events."""
+
+    async def test_any_failure_is_a_failed_event(self):
+        async def events() -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+            yield "progress", {"step": "rendering"}
+            raise MermaidRenderPoolError("Render queue is full")
+
+        stream = [chunk async for chunk in server_sent_events(events())]
+        self.assertEqual(
+            stream,
+            [
+                'event: progress\ndata: {"step": "rendering"}\n\n',
+                'event: failed\ndata: {"message": "Render queue is full"}\n\n',
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
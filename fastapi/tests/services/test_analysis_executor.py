@@ -0,0 +1,128 @@
+"""Tests for running directory analysis off the event loop."""
+import asyncio
+import threading
+import time
+import unittest
+from typing import Iterator, List
+from unittest import mock
+
+from app.exceptions import AnalysisTimeoutError
+from app.services import analysis_executor
+from app.services.analysis_executor import run_analysis, stream_analysis
+from app.utils.deadline import Deadline
+
+
+class TestRunAnalysis(unittest.IsolatedAsyncioTestCase):
+    """Tests for run_analysis."""
+
+    async def asyncSetUp(self):
+        patcher = mock.patch.object(
+            analysis_executor, "analysis_semaphore", asyncio.Semaphore(2)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_event_loop_keeps_running(self):
+        """Test that blocking work does not stall other coroutines."""
+        ticks: List[int] = []
+
+        async def tick() -> None:
+            for number in range(5):
+                ticks.append(number)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(run_analysis("sleep", lambda _: time.sleep(0.2)), tick())
+        self.assertEqual(ticks, [0, 1, 2, 3, 4])
+
+    async def test_identical_analyses_run_once(self):
+        """Test that callers with the same key share one run."""
+        calls: List[int] = []
+
+        def work(_: Deadline) -> str:
+            calls.append(1)
+            time.sleep(0.05)
+            return "tree"
+
+        results = await asyncio.gather(*[run_analysis("repo", work) for _ in range(3)])
+        self.assertEqual(results, ["tree"] * 3)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(analysis_executor.in_flight, {})
+
+    async def test_concurrency_cap(self):
+        """Test that at most ANALYSIS_CONCURRENCY analyses run at once."""
+        running, peak = 0, 0
+        lock = threading.Lock()
+
+        def work(_: Deadline) -> None:
+            nonlocal running, peak
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            time.sleep(0.05)
+            with lock:
+                running -= 1
+
+        await asyncio.gather(*[run_analysis(key, work) for key in range(5)])
+        self.assertEqual(peak, 2)
+
+    async def test_deadline_stops_the_work(self):
+        """Test that an overrunning analysis times out and its work stops."""
+        stopped = threading.Event()
+
+        def work(deadline: Deadline) -> None:
+            try:
+                while True:
+                    deadline.check()
+                    time.sleep(0.01)
+            finally:
+                stopped.set()
+
+        with self.assertRaises(AnalysisTimeoutError):
+            await run_analysis("slow", work, timeout=0.1)
+        self.assertTrue(await asyncio.to_thread(stopped.wait, 1))
+
+
+class TestStreamAnalysis(unittest.IsolatedAsyncioTestCase):
+    """Tests for stream_analysis."""
+
+    async def asyncSetUp(self):
+        self.semaphore = asyncio.Semaphore(1)
+        patcher = mock.patch.object(
+            analysis_executor, "analysis_semaphore", self.semaphore
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_stream_holds_a_slot_until_it_ends(self):
+        """Test that chunks come from the analysis threads, one slot held."""
+        threads: List[str] = []
+
+        def chunks(_: Deadline) -> Iterator[str]:
+            for number in range(3):
+                threads.append(threading.current_thread().name)
+                yield str(number)
+
+        stream = stream_analysis(chunks)
+        self.assertEqual(await anext(stream), "0")
+        self.assertTrue(self.semaphore.locked())
+        self.assertEqual([chunk async for chunk in stream], ["1", "2"])
+        self.assertFalse(self.semaphore.locked())
+        self.assertTrue(all(name.startswith("analysis") for name in threads))
+
+    async def test_deadline_ends_the_stream(self):
+        """Test that an overrunning stream times out and gives back its slot."""
+
+        def chunks(deadline: Deadline) -> Iterator[str]:
+            while True:
+                deadline.check()
+                time.sleep(0.01)
+                yield "."
+
+        with self.assertRaises(AnalysisTimeoutError):
+            async for _ in stream_analysis(chunks, timeout=0.1):
+                pass
+        self.assertFalse(self.semaphore.locked())
+
+
+if __name__ == "__main__":
+    unittest.main()
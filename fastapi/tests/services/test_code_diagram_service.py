@@ -0,0 +1,104 @@
+"""Tests for diagrams generated from the code."""
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from app.services import outline_engine
+from app.services.code_diagram_service import (
+    class_hierarchy,
+    import_graph,
+    indexed_modules,
+)
+from app.services.repository_index import RepositoryIndex
+from app.utils.cache_utils import LRUCache
+from app.utils.mermaid_parser import validate_mermaid
+from tests.utils.test_mermaid_parser import use_temporary_parser_cache
+
+FILES = {
+    "src/shop/__init__.py": "from .models.base import Model\n",
+    "src/shop/models/__init__.py": "",
+    "src/shop/models/base.py": "from pydantic import BaseModel\n\n"
+    "class Model(BaseModel, object):\n    pass\n",
+    "src/shop/models/order.py": "from .. import Model\nimport typing\n\n"
+    "class Order(Model):\n    pass\n\n"
+    "class Line(typing.Generic[T]):\n    pass\n",
+    "src/shop/api.py": "import shop.models.order as order\n\n"
+    "class OrderView(order.Order):\n    pass\n",
+    "scripts/load.py": "from shop.api import OrderView\nimport json\n",
+}
+
+
+class TestCodeDiagrams(unittest.TestCase):
+    """Tests for import_graph and class_hierarchy."""
+
+    @classmethod
+    def setUpClass(cls):
+        use_temporary_parser_cache(cls)
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        root = os.path.join(self.temp_dir.name, "repo")
+        for path, content in FILES.items():
+            full_path = os.path.join(root, path)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            with open(full_path, "w", encoding="utf-8") as file:
+                file.write(content)
+        with mock.patch.object(outline_engine, "outline_cache", LRUCache(100)):
+            index = RepositoryIndex(root, Path(self.temp_dir.name) / "index.json", 0)
+            self.modules = indexed_modules(index.indexed_files(index.refresh()))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_import_graph(self):
+        diagram = import_graph(self.modules)
+        self.assertIsNone(validate_mermaid(diagram.definition))
+        self.assertEqual(
+            diagram.definition,
+            "flowchart LR\n"
+            '    m0["scripts.load"]\n'
+            '    m1["src.shop"]\n'
+            '    m2["src.shop.api"]\n'
+            '    m3["src.shop.models"]\n'
+            '    m4["src.shop.models.base"]\n'
+            '    m5["src.shop.models.order"]\n'
+            "    m0 --> m2\n"
+            "    m1 --> m4\n"
+            "    m2 --> m5\n"
+            "    m5 --> m1",
+        )
+
+    def test_import_graph_is_folded(self):
+        diagram = import_graph(self.modules, max_nodes=1)
+        self.assertEqual(
+            diagram.definition,
+            "flowchart LR\n" '    m0["scripts"]\n' '    m1["src"]\n' "    m0 --> m1",
+        )
+        self.assertEqual(
+            import_graph(self.modules, package="src.shop.models", depth=3).definition,
+            'flowchart LR\n    m0["src.shop.models"]',
+        )
+
+    def test_class_hierarchy(self):
+        diagram = class_hierarchy(self.modules)
+        self.assertIsNone(validate_mermaid(diagram.definition))
+        self.assertEqual(
+            diagram.definition,
+            "classDiagram\n"
+            '    class c0["BaseModel"]\n'
+            '    class c1["Model"]\n'
+            '    class c2["Order"]\n'
+            '    class c3["typing.Generic"]\n'
+            '    class c4["Line"]\n'
+            '    class c5["OrderView"]\n'
+            "    c0 <|-- c1\n"
+            "    c1 <|-- c2\n"
+            "    c3 <|-- c4\n"
+            "    c2 <|-- c5",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
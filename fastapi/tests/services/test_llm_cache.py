@@ -0,0 +1,155 @@
+"""Tests for the LLM completion cache."""
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from openai.types.chat import ChatCompletion, ChatCompletionMessage
+from openai.types.chat.chat_completion import Choice
+
+from app.exceptions import LLMCacheMissError
+from app.services import llm_service
+from app.services.llm_cache import LLMCompletionCache, completion_cache_key
+
+MESSAGES = [{"role": "user", "content": "Draw the login flow"}]
+
+
+def chat_completion(content: str) -> ChatCompletion:
+    """A minimal non-streamed chat completion."""
+    return ChatCompletion(
+        id="chatcmpl-1",
+        object="chat.completion",
+        created=0,
+        model="gpt-4",
+        choices=[
+            Choice(
+                index=0,
+                finish_reason="stop",
+                message=ChatCompletionMessage(role="assistant", content=content),
+            )
+        ],
+    )
+
+
+class TestLLMCompletionCache(unittest.IsolatedAsyncioTestCase):
+    """Tests for LLMCompletionCache."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        self.directory = Path(self.temp_dir.name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def cache(self, mode: str) -> LLMCompletionCache:
+        """A cache in the test directory."""
+        return LLMCompletionCache(mode, self.directory, 1024 * 1024, 60)
+
+    async def test_round_trip(self):
+        """Test that chat completions and Anthropic text come back as stored."""
+        cache = self.cache("cache")
+        await cache.set("chat", chat_completion("graph TD; A-->B"))
+        await cache.set("text", "graph TD; B-->C")
+
+        cached = await cache.get("chat")
+        self.assertIsInstance(cached, ChatCompletion)
+        self.assertEqual(cached.choices[0].message.content, "graph TD; A-->B")
+        self.assertEqual(await cache.get("text"), "graph TD; B-->C")
+        self.assertIsNone(await cache.get("missing"))
+
+    async def test_record_then_replay(self):
+        """Test that record only writes and replay only reads, failing on misses."""
+        record = self.cache("record")
+        await record.set("key", "recorded")
+        self.assertIsNone(await record.get("key"))
+
+        replay = self.cache("replay")
+        self.assertEqual(await replay.get("key"), "recorded")
+        await replay.set("other", "ignored")
+        with self.assertRaises(LLMCacheMissError):
+            await replay.get("other")
+
+    async def test_off_never_stores(self):
+        """Test that the off mode neither reads nor writes."""
+        await self.cache("off").set("key", "value")
+        self.assertIsNone(await self.cache("cache").get("key"))
+
+    async def test_unreadable_entry_is_a_miss(self):
+        """Test that a truncated entry is deleted instead of failing the call."""
+        for mode in ("cache", "replay"):
+            cache = self.cache(mode)
+            cache.disk.set("key", b'{"type": "text", "resp')
+            if mode == "replay":
+                with self.assertRaises(LLMCacheMissError):
+                    await cache.get("key")
+            else:
+                self.assertIsNone(await cache.get("key"))
+            self.assertIsNone(cache.disk.get("key"))
+
+    def test_key_covers_request(self):
+        """Test that every part of the request changes the key."""
+        key = completion_cache_key("openai", "gpt-4", MESSAGES, None, 100)
+        self.assertEqual(
+            key, completion_cache_key("openai", "gpt-4", MESSAGES, None, 100)
+        )
+        for changed in [
+            completion_cache_key("anthropic", "gpt-4", MESSAGES, None, 100),
+            completion_cache_key("openai", "gpt-3.5", MESSAGES, None, 100),
+            completion_cache_key("openai", "gpt-4", [], None, 100),
+            completion_cache_key("openai", "gpt-4", MESSAGES, [{"name": "f"}], 100),
+            completion_cache_key("openai", "gpt-4", MESSAGES, None, 200),
+            completion_cache_key("openai", "gpt-4", MESSAGES, None, 100, variant=1),
+        ]:
+            self.assertNotEqual(key, changed)
+
+
+class TestCompleteTextReplay(unittest.IsolatedAsyncioTestCase):
+    """Tests for complete_text and stream_text serving recorded completions."""
+
+    async def asyncSetUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        directory = Path(self.temp_dir.name)
+        await LLMCompletionCache("record", directory, 1024 * 1024).set(
+            completion_cache_key("openai", "gpt-4", MESSAGES, None, 100),
+            chat_completion("graph TD; A-->B"),
+        )
+        patcher = mock.patch.object(
+            llm_service,
+            "completion_cache",
+            LLMCompletionCache("replay", directory, 1024 * 1024),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.temp_dir.cleanup)
+
+    async def test_replay_does_not_call_the_llm(self):
+        """Test that recorded completions are served without a client."""
+        with mock.patch.object(llm_service, "get_openai_client") as client:
+            result = await llm_service.complete_text(
+                max_tokens=100,
+                model="gpt-4",
+                vendor="openai",
+                messages=MESSAGES,
+                callback=lambda response: response.choices[0].message.content,
+            )
+            events = [
+                event
+                async for event in llm_service.stream_text(
+                    max_tokens=100, model="gpt-4", vendor="openai", messages=MESSAGES
+                )
+            ]
+        client.assert_not_called()
+        self.assertEqual(result, "graph TD; A-->B")
+        self.assertEqual(events[0], ("content", "graph TD; A-->B"))
+        self.assertEqual(events[-1][0], "result")
+
+    async def test_replay_miss_raises(self):
+        """Test that an unrecorded request fails instead of reaching the LLM."""
+        with self.assertRaises(LLMCacheMissError):
+            await llm_service.complete_text(
+                max_tokens=100, model="gpt-4", vendor="openai", messages=[]
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+"""Tests for the Mermaid render cache."""
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from app.services import mermaid_render_cache
+from app.services.mermaid_render_cache import MermaidRenderCache
+
+
+class TestMermaidRenderCache(unittest.IsolatedAsyncioTestCase):
+    """Tests for MermaidRenderCache."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def render_cache(self) -> MermaidRenderCache:
+        return MermaidRenderCache(8, self.directory, 1 << 20, error_ttl=60)
+
+    async def test_errors_expire(self):
+        cache = self.render_cache()
+        with mock.patch.object(mermaid_render_cache.time, "time", return_value=100):
+            await cache.set("bad", None, "Parse error on line 2")
+            await cache.set("good", b"<svg/>", "")
+        with mock.patch.object(mermaid_render_cache.time, "time", return_value=159):
+            self.assertEqual(await cache.get("bad"), (None, "Parse error on line 2"))
+            # a second process sees the same entries on disk
+            self.assertEqual(
+                await self.render_cache().get("bad"), (None, "Parse error on line 2")
+            )
+        with mock.patch.object(mermaid_render_cache.time, "time", return_value=160):
+            self.assertIsNone(await cache.get("bad"))
+            self.assertIsNone(await self.render_cache().get("bad"))
+            self.assertEqual(await cache.get("good"), (b"<svg/>", ""))
+            self.assertEqual(await self.render_cache().get("good"), (b"<svg/>", ""))
+
+    async def test_disk_is_used_off_the_event_loop(self):
+        cache = self.render_cache()
+        threads = []
+        read, write = cache.disk.get, cache.disk.set
+
+        def record(method):
+            def wrapper(*args):
+                threads.append(threading.current_thread())
+                return method(*args)
+
+            return wrapper
+
+        with mock.patch.object(cache.disk, "get", record(read)), mock.patch.object(
+            cache.disk, "set", record(write)
+        ):
+            await cache.set("good", b"<svg/>", "")
+            cache.memory.entries.clear()
+            self.assertEqual(await cache.get("good"), (b"<svg/>", ""))
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(threading.main_thread(), threads)
+
+
+if __name__ == "__main__":
+    unittest.main()
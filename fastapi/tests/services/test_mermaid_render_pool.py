@@ -0,0 +1,214 @@
+"""Tests for the failure paths of the mermaid render pool."""
+import asyncio
+import unittest
+from pathlib import Path
+from typing import List, Optional, Tuple
+from unittest import mock
+
+from app.exceptions import MermaidRenderPoolError, MermaidUnexpectedError
+from app.models import MermaidModel
+from app.services import mermaid_generator
+from app.services.mermaid_render_pool import MermaidRenderPool, MermaidRenderWorker
+
+
+class FakeWorker(MermaidRenderWorker):
+    """A render worker without node or a browser behind it."""
+
+    def __init__(self, worker_id: int, fail_start: bool = False):
+        super().__init__(worker_id, Path("worker.mjs"), 1)
+        self.fail_start = fail_start
+        self.running = False
+        self.starts = 0
+
+    @property
+    def is_alive(self) -> bool:
+        return self.running
+
+    async def start(self) -> None:
+        self.starts += 1
+        await asyncio.sleep(0)
+        if self.fail_start:
+            raise MermaidRenderPoolError(f"worker {self.worker_id} has no browser")
+        self.running = True
+        self.render_count = 0
+
+    async def stop(self) -> None:
+        self.running = False
+
+    async def kill(self) -> None:
+        self.running = False
+
+    async def ping(self, timeout: float) -> bool:
+        return self.running
+
+    async def render(
+        self, mermaid_def_str: str, timeout: float, theme: str
+    ) -> Tuple[Optional[bytes], str]:
+        if not self.running:
+            raise MermaidRenderPoolError("Render worker is not running")
+        self.render_count += 1
+        return b"<svg/>", ""
+
+    def memory_usage(self) -> int:
+        return 0
+
+
+class BlockedWorker(FakeWorker):
+    """A fake worker whose renders wait until they are let through."""
+
+    def __init__(self, worker_id: int):
+        super().__init__(worker_id)
+        self.unblock = asyncio.Event()
+
+    async def render(
+        self, mermaid_def_str: str, timeout: float, theme: str
+    ) -> Tuple[Optional[bytes], str]:
+        await self.unblock.wait()
+        return await super().render(mermaid_def_str, timeout, theme)
+
+
+def fake_pool(workers: List[FakeWorker], queue_size: int = 8) -> MermaidRenderPool:
+    """A pool of fake workers."""
+    pool = MermaidRenderPool(
+        size=len(workers),
+        worker_path=Path("worker.mjs"),
+        queue_size=queue_size,
+        max_renders=100,
+        max_rss_bytes=1 << 40,
+        healthcheck_interval=3600,
+        startup_timeout=1,
+    )
+    pool.workers = list(workers)
+    return pool
+
+
+class TestMermaidRenderPool(unittest.IsolatedAsyncioTestCase):
+    """Tests for MermaidRenderPool with fake workers."""
+
+    async def test_failed_start_stops_started_workers(self):
+        workers = [FakeWorker(0), FakeWorker(1, fail_start=True), FakeWorker(2)]
+        with self.assertRaises(MermaidRenderPoolError):
+            await fake_pool(workers).start()
+        self.assertEqual([worker.running for worker in workers], [False] * 3)
+
+    async def test_dead_worker_is_restarted_in_the_background(self):
+        worker = FakeWorker(0)
+        pool = fake_pool([worker])
+        await pool.start()
+        self.addAsyncCleanup(pool.close)
+
+        worker.running = False
+        with self.assertRaises(MermaidRenderPoolError):
+            async with pool.worker() as dead:
+                await dead.render("graph TD", 1, "default")
+        # the failed request did not wait for the restart
+        self.assertEqual(worker.starts, 1)
+
+        async with pool.worker() as restarted:
+            svg, _ = await restarted.render("graph TD", 1, "default")
+        self.assertEqual(svg, b"<svg/>")
+        self.assertEqual(worker.starts, 2)
+
+    async def test_worker_is_recycled_after_max_renders(self):
+        worker = FakeWorker(0)
+        pool = fake_pool([worker])
+        pool.max_renders = 1
+        await pool.start()
+        self.addAsyncCleanup(pool.close)
+
+        async with pool.worker() as first:
+            await first.render("graph TD", 1, "default")
+        self.assertEqual(worker.starts, 1)
+        async with pool.worker() as second:
+            self.assertEqual(second.render_count, 0)
+        self.assertEqual(worker.starts, 2)
+
+    async def test_full_queue_is_rejected(self):
+        pool = fake_pool([FakeWorker(0)], queue_size=1)
+        await pool.start()
+        self.addAsyncCleanup(pool.close)
+
+        async def wait_for_worker() -> None:
+            async with pool.worker():
+                pass
+
+        async with pool.worker():
+            waiter = asyncio.create_task(wait_for_worker())
+            await asyncio.sleep(0)
+            with self.assertRaises(MermaidRenderPoolError):
+                async with pool.worker():
+                    pass
+        await waiter
+
+    async def test_failed_start_falls_back_to_the_cli(self):
+        pools: List[MermaidRenderPool] = []
+
+        def failing_pool(**_) -> MermaidRenderPool:
+            pools.append(fake_pool([FakeWorker(0, fail_start=True)]))
+            return pools[-1]
+
+        with mock.patch.object(
+            mermaid_generator, "MermaidRenderPool", failing_pool
+        ), mock.patch.object(
+            mermaid_generator, "MERMAID_RENDER_MODE", "pool"
+        ), mock.patch.object(
+            mermaid_generator, "render_pool", None
+        ), mock.patch.object(
+            mermaid_generator, "render_pool_failures", 0
+        ), mock.patch.object(
+            mermaid_generator, "render_pool_retry_at", 0.0
+        ):
+            self.assertIsNone(await mermaid_generator.start_render_pool())
+            # not tried again until the retry delay has passed
+            self.assertIsNone(await mermaid_generator.start_render_pool())
+            self.assertEqual(len(pools), 1)
+            self.assertEqual(mermaid_generator.render_pool_failures, 1)
+
+    async def test_pool_queue_is_not_hidden_behind_the_cli_semaphore(self):
+        worker = BlockedWorker(0)
+        pool = fake_pool([worker], queue_size=1)
+        await pool.start()
+        self.addAsyncCleanup(pool.close)
+
+        async def render(number: int) -> Tuple[Optional[bytes], str]:
+            return await mermaid_generator.create_mermaid_diagram(
+                MermaidModel(mermaid_def_str=f"graph TD\n    A{number}")
+            )
+
+        with mock.patch.object(
+            mermaid_generator, "start_render_pool", mock.AsyncMock(return_value=pool)
+        ), mock.patch.object(
+            mermaid_generator, "renderer_version", mock.AsyncMock(return_value="test")
+        ), mock.patch.object(
+            mermaid_generator.render_cache, "get", mock.AsyncMock(return_value=None)
+        ), mock.patch.object(
+            mermaid_generator.render_cache, "set", mock.AsyncMock()
+        ), mock.patch.object(
+            mermaid_generator, "render_semaphore", asyncio.Semaphore(1)
+        ):
+            # one rendering, one waiting in the queue
+            rendering = [asyncio.create_task(render(number)) for number in range(2)]
+            for _ in range(5):
+                await asyncio.sleep(0)
+            with self.assertRaises(MermaidUnexpectedError):
+                await asyncio.wait_for(render(2), 1)
+            worker.unblock.set()
+            results = await asyncio.gather(*rendering)
+        self.assertEqual(results, [(b"<svg/>", "")] * 2)
+
+
+class TestMermaidRenderWorker(unittest.IsolatedAsyncioTestCase):
+    """Tests for MermaidRenderWorker."""
+
+    async def test_spawn_failure_is_a_pool_error(self):
+        worker = MermaidRenderWorker(0, Path("worker.mjs"), 1)
+        with mock.patch(
+            "asyncio.create_subprocess_exec",
+            side_effect=FileNotFoundError("node"),
+        ), self.assertRaises(MermaidRenderPoolError):
+            await worker.start()
+        self.assertFalse(worker.is_alive)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+"""Tests for diagram generation with an LLM."""
+import unittest
+from typing import Any, AsyncIterator, Tuple
+from unittest import mock
+
+from app.config import MERMAID_MAX_LLM_CALLS
+from app.exceptions import MermaidCliError
+from app.models import LLMDefinition, MermaidDesignRequest
+from app.routes.diagram_generation_routes import construct_payload_dump
+from app.services import mermaid_service
+from app.services.mermaid_service import (
+    instructions_token_budget,
+    mermaid_request,
+    mermaid_request_stream,
+)
+from app.utils import llm_utils, tokenizers
+from app.utils.cache_utils import LRUCache
+from app.utils.llm_utils import TEXT_ENCODING
+from app.utils.tokenizers import DEFAULT_ENCODING
+from tests.utils.test_tokenizers import byte_encoding
+
+LARGE_CONTEXT_MODEL = LLMDefinition(
+    id="large-context-model",
+    name="Large context model",
+    description="",
+    max_token_length=128000,
+)
+SMALL_CONTEXT_MODEL = LLMDefinition(
+    id="small-context-model",
+    name="Small context model",
+    description="",
+    max_token_length=32000,
+)
+
+
+def design_request(
+    text: str, llm_definition: LLMDefinition = LARGE_CONTEXT_MODEL
+) -> MermaidDesignRequest:
+    """A design request for a model."""
+    return MermaidDesignRequest(
+        text=text,
+        source_folder_option="repo",
+        diagram_category="flowchart",
+        diagram_option="flowchart1",
+        include_folder_tree=True,
+        include_python_code_outline=True,
+        git_ignore_file_path=None,
+        llm_vendor_for_instructions="open_ai",
+        llm_model_for_instructions=llm_definition.id,
+    )
+
+
+class TestMermaidRequest(unittest.IsolatedAsyncioTestCase):
+    """Tests for mermaid_request."""
+
+    async def asyncSetUp(self):
+        encoding = byte_encoding()
+        self.complete_text = mock.AsyncMock(
+            return_value=("graph TD\n    A --> B", "", "flowchart")
+        )
+        for patcher in (
+            mock.patch.dict(
+                tokenizers.encodings,
+                {TEXT_ENCODING: encoding, DEFAULT_ENCODING: encoding},
+            ),
+            mock.patch.dict(
+                tokenizers.model_encodings,
+                {
+                    LARGE_CONTEXT_MODEL.id: encoding,
+                    SMALL_CONTEXT_MODEL.id: encoding,
+                },
+            ),
+            mock.patch.object(llm_utils, "static_token_counts", LRUCache(16)),
+            mock.patch.object(mermaid_service, "complete_text", self.complete_text),
+            mock.patch.object(
+                mermaid_service,
+                "create_mermaid_diagram",
+                mock.AsyncMock(return_value=(b"<svg/>", "")),
+            ),
+            mock.patch.object(mermaid_service, "MERMAID_VALIDATE", False),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_instructions_of_a_large_folder_fit_the_request_budget(self):
+        """Test that instructions packed for a large model leave room for a call."""
+        folder_tree = "\n".join(f"|-- module_{number}.py" for number in range(20000))
+        folder_report = "\n".join(
+            f"- module_{number}.py\nfunc run_{number}()\n" for number in range(20000)
+        )
+        instructions = construct_payload_dump(
+            folder_tree,
+            folder_report,
+            None,
+            "Flowchart",
+            instructions_token_budget(LARGE_CONTEXT_MODEL),
+        )
+
+        result = await mermaid_request(
+            LARGE_CONTEXT_MODEL, design_request(instructions)
+        )
+
+        self.complete_text.assert_called_once()
+        self.assertEqual(result["markdown_svg"], "<svg/>")
+
+    async def test_every_allowed_call_fits_the_token_budget(self):
+        """Test that full-context calls are only capped by the call budget."""
+        self.complete_text.return_value = "No diagram"
+        instructions = "x" * instructions_token_budget(SMALL_CONTEXT_MODEL)
+
+        with self.assertRaises(MermaidCliError):
+            await mermaid_request(
+                SMALL_CONTEXT_MODEL, design_request(instructions, SMALL_CONTEXT_MODEL)
+            )
+
+        self.assertEqual(self.complete_text.await_count, MERMAID_MAX_LLM_CALLS)
+
+    async def test_stream_shares_the_request_budget(self):
+        """Test that the streamed request stops once its budget is spent."""
+
+        async def stream_text(**_: Any) -> AsyncIterator[Tuple[str, Any]]:
+            yield "result", "No diagram"
+
+        with mock.patch.object(
+            mermaid_service, "stream_text", stream_text
+        ), mock.patch.object(mermaid_service, "MERMAID_MAX_LLM_CALLS", 2):
+            events = [
+                event
+                async for event, _ in mermaid_request_stream(
+                    SMALL_CONTEXT_MODEL, design_request("", SMALL_CONTEXT_MODEL)
+                )
+            ]
+
+        self.assertEqual(events, ["attempt", "error", "attempt", "error", "failed"])
+
+
+if __name__ == "__main__":
+    unittest.main()
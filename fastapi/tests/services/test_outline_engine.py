@@ -0,0 +1,100 @@
+"""Tests for the parallel outline engine."""
+import os
+import tempfile
+import unittest
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+
+from app.services import outline_engine
+from app.services.outline_engine import (
+    Symbol,
+    file_digest,
+    outline_files,
+    stop_outline_pool,
+)
+from app.utils.cache_utils import LRUCache
+
+
+class TestOutlineEngine(unittest.TestCase):
+    """Tests for outline_files."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        self.files = []
+        for number in range(6):
+            path = os.path.join(self.temp_dir.name, f"module{number}.py")
+            with open(path, "w", encoding="utf-8") as file:
+                file.write(f"def func{number % 3}(value):\n    pass\n")
+            self.files.append((path, file_digest(path)))
+        patcher = mock.patch.object(outline_engine, "outline_cache", LRUCache(100))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_pool_keeps_the_order(self):
+        self.addCleanup(stop_outline_pool)
+        outlines = list(outline_files(self.files, workers=2, chunk_size=1))
+        self.assertEqual(
+            [outline.lines for outline in outlines],
+            [[f"func func{number % 3}(value)"] for number in range(6)],
+        )
+
+    def test_broken_pool_is_replaced(self):
+        self.addCleanup(stop_outline_pool)
+        pool = outline_engine.get_outline_pool(2)
+        with self.assertRaises(BrokenProcessPool):
+            pool.submit(os._exit, 1).result()
+
+        outlines = list(outline_files(self.files, workers=2, chunk_size=1))
+        self.assertEqual(
+            [outline.lines for outline in outlines],
+            [[f"func func{number % 3}(value)"] for number in range(6)],
+        )
+        self.assertIsNot(outline_engine.get_outline_pool(2), pool)
+
+    def test_identical_content_is_parsed_once(self):
+        with mock.patch.object(
+            outline_engine, "outline_file", wraps=outline_engine.outline_file
+        ) as outline_file:
+            list(outline_files(self.files[:3], workers=1))
+            outlines = list(outline_files(self.files, workers=1))
+        self.assertEqual(outline_file.call_count, 3)
+        self.assertEqual(outlines[3].lines, ["func func0(value)"])
+
+    def test_symbols(self):
+        path = os.path.join(self.temp_dir.name, "service.py")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(
+                '"""Services.\n\nMore."""\n'
+                "class Service(Base, metaclass=Meta):\n"
+                '    """Does things."""\n'
+                "    async def run(self, count: int = 1) -> bool:\n"
+                "        def inner():\n"
+                "            pass\n"
+                "    class Options:\n"
+                "        pass\n"
+                "def helper(*args, **kwargs):\n"
+                "    pass\n"
+            )
+        self.assertEqual(
+            outline_engine.outline_file(path).symbols,
+            [
+                Symbol("module", "", "", "Services.", 1),
+                Symbol("class", "Service", "(Base, metaclass=Meta)", "Does things.", 4),
+                Symbol(
+                    "method",
+                    "Service.run",
+                    "async (self, count: int=1) -> bool",
+                    "",
+                    6,
+                ),
+                Symbol("class", "Service.Options", "()", "", 9),
+                Symbol("function", "helper", "(*args, **kwargs)", "", 11),
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+"""Tests for the persistent repository index."""
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from typing import List, Tuple
+from unittest import mock
+
+from app.exceptions import AnalysisTimeoutError
+from app.services import outline_engine, repository_index
+from app.services.repository_index import RepositoryIndex, RepositorySnapshot
+from app.utils.cache_utils import LRUCache
+from app.utils.deadline import Deadline
+
+
+class TestRepositoryIndex(unittest.TestCase):
+    """Tests for RepositoryIndex."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        self.root = os.path.join(self.temp_dir.name, "repo")
+        self.index_path = Path(self.temp_dir.name) / "index.json"
+        self.write("app/main.py", "def run():\n    pass\n")
+        self.write("app/util.py", "class Util:\n    pass\n")
+        self.write("README.md", "# repo\n")
+        patcher = mock.patch.object(outline_engine, "outline_cache", LRUCache(100))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write(self, path: str, content: str) -> None:
+        """Write a file of the repository."""
+        full_path = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "w", encoding="utf-8") as file:
+            file.write(content)
+
+    def refresh(self, index: RepositoryIndex) -> Tuple[RepositorySnapshot, List[str]]:
+        """Refresh the index, returning the snapshot and the files parsed."""
+        with mock.patch.object(
+            outline_engine, "outline_file", wraps=outline_engine.outline_file
+        ) as outline_file:
+            snapshot = index.refresh()
+        parsed = [
+            os.path.relpath(call.args[0], self.root) for call in outline_file.mock_calls
+        ]
+        return snapshot, sorted(parsed)
+
+    def test_tree_and_report(self):
+        index = RepositoryIndex(self.root, self.index_path, 0)
+        snapshot, _ = self.refresh(index)
+        self.assertEqual(
+            snapshot.tree,
+            "repo/\n|-- app/\n|   |-- main.py\n|   |-- util.py\n|-- README.md\n",
+        )
+        self.assertEqual(
+            index.report(snapshot),
+            "- app/main.py\nfunc run()\n\n- app/util.py\nclass Util()",
+        )
+
+    def test_only_changed_files_are_parsed(self):
+        index = RepositoryIndex(self.root, self.index_path, 0)
+        main, util = os.path.join("app", "main.py"), os.path.join("app", "util.py")
+        self.assertEqual(self.refresh(index)[1], [main, util])
+        self.assertEqual(self.refresh(index)[1], [])
+
+        # same content with a new mtime is hashed, not parsed
+        os.utime(os.path.join(self.root, main), ns=(0, 0))
+        self.assertEqual(self.refresh(index)[1], [])
+
+        self.write("app/util.py", "class Util:\n    def size(self):\n        pass\n")
+        snapshot, parsed = self.refresh(index)
+        self.assertEqual(parsed, [util])
+        self.assertIn("\tfunc size(self)", index.report(snapshot))
+
+    def test_index_persists(self):
+        self.refresh(RepositoryIndex(self.root, self.index_path, 0))
+        snapshot, parsed = self.refresh(RepositoryIndex(self.root, self.index_path, 0))
+        self.assertEqual(parsed, [])
+        self.assertIn(
+            "- app/main.py",
+            RepositoryIndex(self.root, self.index_path, 0).report(snapshot),
+        )
+
+    def test_stream_report(self):
+        index = RepositoryIndex(self.root, self.index_path, 0)
+        for batch_size in (1, 100):
+            self.write("app/util.py", f"def batch_{batch_size}():\n    pass\n")
+            streamed = "".join(index.stream_report(batch_size=batch_size))
+            self.assertIn(f"func batch_{batch_size}()", streamed)
+            self.assertEqual(streamed, index.report(index.refresh()))
+
+    def test_symbols(self):
+        self.write("app/__init__.py", "")
+        index = RepositoryIndex(self.root, self.index_path, 0)
+        snapshot, _ = self.refresh(index)
+        symbols = RepositoryIndex(self.root, self.index_path, 0).symbols(snapshot)
+        self.assertEqual(
+            [(record.module, record.name, record.symbol.kind) for record in symbols],
+            [
+                ("app", "app", "module"),
+                ("app.main", "main", "module"),
+                ("app.main", "run", "function"),
+                ("app.util", "util", "module"),
+                ("app.util", "Util", "class"),
+            ],
+        )
+
+    def test_unparsable_file_is_outlined_empty(self):
+        self.write("app/legacy.py", "print 'python 2'\n")
+        index = RepositoryIndex(self.root, self.index_path, 0)
+        snapshot, parsed = self.refresh(index)
+        self.assertIn(os.path.join("app", "legacy.py"), parsed)
+        self.assertIn("- app/legacy.py\n\n- app/main.py", index.report(snapshot))
+
+        # touched but unchanged, it is not parsed again
+        os.utime(os.path.join(self.root, "app/legacy.py"), ns=(0, 0))
+        self.assertEqual(self.refresh(index)[1], [])
+
+    def test_deleted_files_are_forgotten(self):
+        index = RepositoryIndex(self.root, self.index_path, 0)
+        self.refresh(index)
+        os.remove(os.path.join(self.root, "app/util.py"))
+        self.refresh(index)
+        self.assertEqual(list(index.files), [os.path.join("app", "main.py")])
+
+    def test_files_gone_before_they_are_read_are_left_out(self):
+        index = RepositoryIndex(self.root, self.index_path, 0)
+        self.refresh(index)
+        main, util = os.path.join("app", "main.py"), os.path.join("app", "util.py")
+        stat = os.stat(os.path.join(self.root, util))
+        os.remove(os.path.join(self.root, util))
+        index.update_files([(util, stat)])
+        self.assertEqual(list(index.files), [main])
+        self.assertEqual(
+            outline_engine.outline_file(os.path.join(self.root, util)),
+            outline_engine.FileOutline([], [], []),
+        )
+
+    def test_deadline_is_checked_while_hashing(self):
+        index = RepositoryIndex(self.root, self.index_path, 0)
+        stale = [
+            (path, os.stat(os.path.join(self.root, path)))
+            for path in (os.path.join("app", "main.py"), os.path.join("app", "util.py"))
+        ]
+        deadline = Deadline()
+        deadline.cancel()
+        with mock.patch.object(
+            repository_index, "file_digest", wraps=repository_index.file_digest
+        ) as file_digest, self.assertRaises(AnalysisTimeoutError):
+            index.update_files(stale, deadline)
+        self.assertEqual(file_digest.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
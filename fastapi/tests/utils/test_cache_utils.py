@@ -0,0 +1,63 @@
+"""Tests for the in-memory and on-disk caches."""
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from app.utils.cache_utils import DiskCache, LRUCache, hash_key
+
+
+class TestLRUCache(unittest.TestCase):
+    """Tests for the LRU cache."""
+
+    def test_evicts_least_recently_used(self):
+        """Test that reading an entry protects it from eviction."""
+        cache: LRUCache[int] = LRUCache(2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(len(cache), 2)
+
+
+class TestDiskCache(unittest.TestCase):
+    """Tests for the disk cache."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        self.directory = Path(self.temp_dir.name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_round_trip(self):
+        """Test that stored bytes are read back."""
+        cache = DiskCache(self.directory, max_bytes=1024)
+        key = hash_key("graph TD", "10.6.1", "default")
+        cache.set(key, b"<svg/>")
+        self.assertEqual(cache.get(key), b"<svg/>")
+        self.assertEqual(cache.size, len(b"<svg/>"))
+
+    def test_evicts_to_size_cap(self):
+        """Test that least recently read files are evicted first."""
+        cache = DiskCache(self.directory, max_bytes=250)
+        keys = [hash_key(str(number)) for number in range(3)]
+        for age, key in enumerate(keys):
+            cache.set(key, b"x" * 100)
+            # make the access order explicit instead of relying on clock resolution
+            os.utime(cache._path(key), (age, age))  # pylint: disable=W0212
+        self.assertIsNone(cache.get(keys[0]))
+        self.assertIsNotNone(cache.get(keys[2]))
+        self.assertLessEqual(cache.size, 250)
+
+    def test_ttl_expiry(self):
+        """Test that entries older than the TTL are treated as missing."""
+        cache = DiskCache(self.directory, max_bytes=1024, ttl_seconds=60)
+        key = hash_key("prompt")
+        cache.set(key, b"completion")
+        old = time.time() - 120
+        os.utime(cache._path(key), (old, old))  # pylint: disable=W0212
+        self.assertIsNone(cache.get(key))
@@ -0,0 +1,78 @@
+"""Tests for token-budgeted context packing."""
+import unittest
+from typing import List
+
+from app.utils.context_packing import (
+    OMITTED_NOTE,
+    pack_code_outline,
+    pack_folder_tree,
+)
+
+REPORT = """- app/main.py
+imports os
+class App()
+\tfunc run(self)
+\tfunc _reload(self)
+\t\tvar config
+func _helper()
+
+- app/routes/users.py
+func list_users()
+"""
+
+TREE = """app/
+|-- routes/
+|   |-- users.py
+|   |-- items.py
+|-- main.py
+"""
+
+
+class TestContextPacking(unittest.TestCase):
+    """Tests for pack_folder_tree and pack_code_outline."""
+
+    def setUp(self):
+        self.calls: List[List[str]] = []
+
+    def count_lines(self, lines: List[str]) -> List[int]:
+        """One token per line, recording every call."""
+        self.calls.append(lines)
+        return [1] * len(lines)
+
+    def test_everything_fits(self):
+        """Test that a report within budget is kept as it is."""
+        packed, used = pack_code_outline(REPORT, 1000, self.count_lines)
+        self.assertEqual(packed, REPORT.strip())
+        self.assertEqual(used, 19)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_outline_keeps_files_and_public_symbols_first(self):
+        """Test that private details go before public symbols and files."""
+        packed, used = pack_code_outline(REPORT, 14, self.count_lines)
+        self.assertEqual(
+            packed.splitlines(),
+            [
+                "- app/main.py",
+                "class App()",
+                "\tfunc run(self)",
+                "",
+                "- app/routes/users.py",
+                "func list_users()",
+                "",
+                OMITTED_NOTE,
+            ],
+        )
+        self.assertEqual(used, 14)
+        # the report and the note are each tokenized once
+        self.assertEqual(len(self.calls), 2)
+
+    def test_tree_keeps_shallow_entries(self):
+        """Test that deeper entries are dropped first, whole lines only."""
+        packed, _ = pack_folder_tree(TREE, 9, self.count_lines)
+        self.assertEqual(
+            packed.splitlines(), ["app/", "|-- routes/", "|-- main.py", OMITTED_NOTE]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+"""Tests for the pruning directory walker."""
+import asyncio
+import os
+import tempfile
+import unittest
+
+from app.services.directory_analysis_service import (
+    find_gitignore,
+    read_folder,
+    read_python_projects,
+)
+from app.utils.directory_walker import walk
+
+
+class TestDirectoryWalker(unittest.TestCase):
+    """Test walk and the folder tools built on it."""
+
+    def setUp(self):
+        self.temp_dir = (
+            tempfile.TemporaryDirectory()
+        )  # pylint: disable=consider-using-with
+        self.root = self.temp_dir.name
+        for path in [
+            "api/src/main.py",
+            "api/.venv/lib/site.py",
+            "web/src/index.ts",
+            "web/node_modules/left-pad/index.js",
+            "web/node_modules/.gitignore",
+            "docs/guide/.gitignore",
+            "ml/pyproject.toml",
+        ]:
+            full_path = os.path.join(self.root, path)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            with open(full_path, "w", encoding="utf-8") as file:
+                file.write("")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def relative_paths(self, **kwargs):
+        """The walked paths relative to the root, with their depths."""
+        return [
+            (os.path.relpath(entry.path, self.root), depth)
+            for entry, depth in walk(self.root, **kwargs)
+        ]
+
+    def test_shallower_entries_come_first(self):
+        depths = [depth for _, depth in self.relative_paths()]
+        self.assertEqual(depths, sorted(depths))
+
+    def test_pruned_directories_are_not_entered(self):
+        paths = [path for path, _ in self.relative_paths()]
+        self.assertIn(os.path.join("web", "node_modules"), paths)
+        self.assertNotIn(os.path.join("web", "node_modules", "left-pad"), paths)
+        self.assertNotIn(os.path.join("api", ".venv", "lib"), paths)
+
+    def test_max_depth(self):
+        self.assertEqual(
+            sorted(self.relative_paths(max_depth=1)),
+            [("api", 1), ("docs", 1), ("ml", 1), ("web", 1)],
+        )
+
+    def test_missing_root_yields_nothing(self):
+        self.assertEqual(list(walk(os.path.join(self.root, "missing"))), [])
+
+    def test_find_gitignore_skips_pruned_directories(self):
+        self.assertEqual(
+            find_gitignore(self.root),
+            os.path.join(self.root, "docs", "guide", ".gitignore"),
+        )
+
+    def test_read_folder(self):
+        # every folder is listed, even one the walks do not enter
+        os.makedirs(os.path.join(self.root, "node_modules"))
+        self.assertEqual(
+            sorted(asyncio.run(read_folder(self.root))),
+            ["api", "docs", "ml", "node_modules", "web"],
+        )
+
+    def test_read_python_projects(self):
+        self.assertEqual(
+            sorted(asyncio.run(read_python_projects(self.root))), ["api", "ml"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+"""Tests for the compiled gitignore matcher."""
+import asyncio
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from typing import AsyncIterator
+from unittest import mock
+
+from app.services import directory_analysis_service
+from app.services.directory_analysis_service import (
+    folder_report,
+    folder_tree,
+    stream_folder_report,
+    stream_folder_tree,
+)
+from app.utils.gitignore import GitignoreMatcher, GitignoreRules
+
+RULES = """# comment
+*.log
+!keep.log
+/build
+docs/*.md
+!docs/README.md
+**/cache/
+a/**/z
+secret?.txt
+[Tt]emp*
+out/
+\\#hash
+"""
+
+
+class TestGitignoreRules(unittest.TestCase):
+    """Test the gitignore semantics of one file."""
+
+    def setUp(self):
+        self.rules = GitignoreRules(RULES.splitlines())
+
+    def assertMatches(self, expected, paths, is_dir=False):
+        for path in paths:
+            with self.subTest(path=path, is_dir=is_dir):
+                self.assertEqual(self.rules.match(path, is_dir), expected)
+
+    def test_ignored(self):
+        self.assertMatches(
+            True,
+            [
+                "x.log",
+                "src/x.log",
+                "build",
+                "docs/a.md",
+                "a/z",
+                "a/b/c/z",
+                "secret1.txt",
+                "Temp1",
+                "src/temp",
+                "#hash",
+            ],
+        )
+        self.assertMatches(True, ["cache", "x/cache", "out"], is_dir=True)
+
+    def test_negated(self):
+        self.assertMatches(False, ["keep.log", "docs/README.md"])
+
+    def test_not_matched(self):
+        self.assertMatches(
+            None,
+            [
+                "src/build",
+                "docs/x/a.md",
+                "secret12.txt",
+                "xTemp",
+                "cache",
+                "out",
+                "README.md",
+            ],
+        )
+
+
+class TestGitignoreMatcher(unittest.TestCase):
+    """Test nested .gitignore files and the folder tools using them."""
+
+    def setUp(self):
+        self.temp_dir = (
+            tempfile.TemporaryDirectory()
+        )  # pylint: disable=consider-using-with
+        self.root = os.path.join(self.temp_dir.name, "repo")
+        files = {
+            ".gitignore": "*.pyc\nbuild/\n",
+            "app/.gitignore": "*.py\n!main.py\n",
+            "app/main.py": "def run():\n    pass\n",
+            "app/util.py": "def helper():\n    pass\n",
+            "app/util.pyc": "",
+            "build/out.py": "",
+            "lib/tool.py": "class Tool:\n    pass\n",
+        }
+        for path, content in files.items():
+            full_path = os.path.join(self.root, path)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            with open(full_path, "w", encoding="utf-8") as file:
+                file.write(content)
+
+        patcher = mock.patch.object(
+            directory_analysis_service,
+            "REPOSITORY_INDEX_DIR",
+            Path(self.temp_dir.name, "index"),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_nested_files_take_precedence(self):
+        matcher = GitignoreMatcher(self.root)
+        self.assertTrue(matcher.is_ignored("app/util.py", False))
+        self.assertFalse(matcher.is_ignored("app/main.py", False))
+        self.assertFalse(matcher.is_ignored("lib/tool.py", False))
+        self.assertTrue(matcher.is_ignored("app/util.pyc", False))
+        self.assertTrue(matcher.is_ignored("build", True))
+
+    def test_extra_ignore_file(self):
+        ignore_file = os.path.join(self.root, "extra-ignore")
+        with open(ignore_file, "w", encoding="utf-8") as file:
+            file.write("lib/\n")
+        matcher = GitignoreMatcher(self.root, ignore_file)
+        self.assertTrue(matcher.is_ignored("lib", True))
+
+    def test_folder_tree(self):
+        tree = asyncio.run(folder_tree(self.root))
+        self.assertEqual(
+            tree.splitlines()[1:],
+            ["|-- app/", "|   |-- main.py", "|-- lib/", "|   |-- tool.py"],
+        )
+
+    def test_folder_report(self):
+        report = asyncio.run(folder_report(self.root))
+        self.assertEqual(
+            report,
+            "- app/main.py\nfunc run()\n\n- lib/tool.py\nclass Tool()",
+        )
+
+    def test_streamed_tree_and_report(self):
+        async def join(chunks: AsyncIterator[str]) -> str:
+            return "".join([chunk async for chunk in chunks])
+
+        self.assertEqual(
+            asyncio.run(join(stream_folder_tree(self.root))),
+            asyncio.run(folder_tree(self.root)),
+        )
+        self.assertEqual(
+            asyncio.run(join(stream_folder_report(self.root))),
+            asyncio.run(folder_report(self.root)),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+"""Tests for hedged attempts and the request budget."""
+import asyncio
+import unittest
+from typing import List, Optional
+
+from app.utils.hedging import RequestBudget, first_success
+
+
+class TestFirstSuccess(unittest.IsolatedAsyncioTestCase):
+    """Tests for first_success."""
+
+    async def test_hedges_slow_attempt_and_cancels_loser(self):
+        """Test that a hedge starts after the delay and the slow attempt is cancelled."""
+        delays = [1.0, 0.01]
+        cancelled: List[int] = []
+
+        async def attempt() -> Optional[int]:
+            index = 2 - len(delays)
+            delay = delays.pop(0)
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                cancelled.append(index)
+                raise
+            return index
+
+        result = await first_success(
+            attempt, max_attempts=3, max_parallel=2, hedge_delay=0.05
+        )
+        self.assertEqual(result, 1)
+        await asyncio.sleep(0)
+        self.assertEqual(cancelled, [0])
+
+    async def test_winner_does_not_wait_for_loser_cleanup(self):
+        """Test that a cancelled attempt cleans up after the result is returned."""
+        cleaned_up = asyncio.Event()
+
+        async def slow_cleanup() -> Optional[int]:
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                await asyncio.sleep(0.5)
+                cleaned_up.set()
+                raise
+            return 0
+
+        async def fast() -> Optional[int]:
+            await asyncio.sleep(0.01)
+            return 1
+
+        attempts = [slow_cleanup, fast]
+        loop = asyncio.get_running_loop()
+        started_at = loop.time()
+        result = await first_success(
+            lambda: attempts.pop(0)(), max_attempts=2, max_parallel=2, hedge_delay=0.02
+        )
+        self.assertEqual(result, 1)
+        self.assertLess(loop.time() - started_at, 0.3)
+        self.assertFalse(cleaned_up.is_set())
+        await asyncio.wait_for(cleaned_up.wait(), 2)
+
+    async def test_failed_attempts_are_retried_up_to_the_cap(self):
+        """Test that failures start new attempts, but no more than max_attempts."""
+        started: List[int] = []
+
+        async def attempt() -> Optional[int]:
+            started.append(1)
+            return None
+
+        result = await first_success(
+            attempt, max_attempts=3, max_parallel=2, hedge_delay=10
+        )
+        self.assertIsNone(result)
+        self.assertEqual(len(started), 3)
+
+    async def test_error_is_raised_when_nothing_succeeds(self):
+        """Test that an attempt's exception surfaces if no attempt succeeds."""
+
+        async def attempt() -> Optional[int]:
+            raise ValueError("broken")
+
+        with self.assertRaises(ValueError):
+            await first_success(attempt, max_attempts=2, max_parallel=1, hedge_delay=1)
+
+
+class TestRequestBudget(unittest.TestCase):
+    """Tests for RequestBudget."""
+
+    def test_caps_calls_and_tokens(self):
+        """Test that spending stops at either limit."""
+        budget = RequestBudget(max_calls=2, max_tokens=100)
+        self.assertTrue(budget.spend(60))
+        self.assertFalse(budget.spend(50))
+        self.assertTrue(budget.spend(40))
+        self.assertFalse(budget.spend(0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+"""Tests for the memoized token counts."""
+import unittest
+from unittest import mock
+
+from app.services.diagram_function_defs import DIAGRAM_FUNCTION_DEFINITIONS
+from app.utils import llm_utils
+from app.utils.cache_utils import LRUCache
+from app.utils.llm_utils import num_tokens_from_functions, num_tokens_from_static_string
+from tests.utils.test_tokenizers import byte_encoding
+
+
+class TestStaticTokenCounts(unittest.TestCase):
+    """Tests for counts of static prompt content."""
+
+    def setUp(self):
+        encoding = byte_encoding()
+        patches = [
+            mock.patch.object(llm_utils, "static_token_counts", LRUCache(16)),
+            mock.patch.object(llm_utils, "encoding_for_model", return_value=encoding),
+            mock.patch.object(llm_utils, "get_encoding", return_value=encoding),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_function_tokens_counted_once_per_model(self):
+        """Test that the definitions are only encoded for a new model."""
+        with mock.patch.object(
+            llm_utils, "count_function_tokens", wraps=llm_utils.count_function_tokens
+        ) as count:
+            first = num_tokens_from_functions(DIAGRAM_FUNCTION_DEFINITIONS, "gpt-4")
+            self.assertEqual(
+                num_tokens_from_functions(DIAGRAM_FUNCTION_DEFINITIONS, "gpt-4"), first
+            )
+            num_tokens_from_functions(DIAGRAM_FUNCTION_DEFINITIONS, "gpt-3.5-turbo")
+        self.assertEqual(count.call_count, 2)
+
+    def test_static_string_counted_once(self):
+        """Test that repeated static text is not re-encoded."""
+        with mock.patch.object(
+            llm_utils, "num_tokens_from_string", return_value=7
+        ) as count:
+            self.assertEqual(num_tokens_from_static_string("system prompt"), 7)
+            self.assertEqual(num_tokens_from_static_string("system prompt"), 7)
+        count.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
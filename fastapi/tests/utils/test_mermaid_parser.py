@@ -0,0 +1,105 @@
+"""Tests for the local Mermaid syntax validator."""
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Type
+from unittest import mock
+
+from app.utils import mermaid_parser
+from app.utils.mermaid_parser import MermaidValidator, build_parser, validate_mermaid
+
+
+def use_temporary_parser_cache(test_class: Type[unittest.TestCase]) -> None:
+    """
+    Have the shared validator built for the tests of a class, from setUpClass,
+    with its parser cached in a temporary directory rather than CACHE_DIR.
+    """
+    temp_dir = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+    test_class.addClassCleanup(temp_dir.cleanup)
+    for patcher in (
+        mock.patch.object(
+            mermaid_parser,
+            "MERMAID_PARSER_CACHE_PATH",
+            Path(temp_dir.name) / "mermaid_parser.lark",
+        ),
+        mock.patch.object(mermaid_parser, "validator", None),
+    ):
+        patcher.start()
+        test_class.addClassCleanup(patcher.stop)
+
+
+class TestValidateMermaid(unittest.TestCase):
+    """Tests for validate_mermaid."""
+
+    @classmethod
+    def setUpClass(cls):
+        use_temporary_parser_cache(cls)
+
+    def test_valid_diagrams(self):
+        """Test that common diagrams of each supported type pass."""
+        scripts = [
+            "graph TD\n  A[Start] -->|go| B(Next)\n  subgraph s\n    B --> C\n  end",
+            "flowchart LR; A-->B; B-.->C",
+            (
+                "sequenceDiagram\n  Alice->>+Bob: Hi\n  alt ok\n    Bob-->>-Alice: Hi\n"
+                "  else not ok\n    Bob-xAlice: No\n  end"
+            ),
+            "classDiagram\n  Animal <|-- Duck\n  class Duck{\n    +swim()\n  }",
+            "stateDiagram-v2\n  [*] --> Still\n  Still --> [*] : done",
+            "erDiagram\n  CUSTOMER ||--o{ ORDER : places",
+            'pie title Pets\n  "Dogs" : 386\n  "Cats" : 85',
+            "gitGraph\n  commit\n  branch develop\n  checkout develop\n  commit",
+            "mindmap\n  root((unvalidated))",
+            "flowchart TD\n  A --> B %% why B\n  B -->|50%% off| C",
+            "flowchart TD\n  A[dict {a}] --> B{ok?}",
+            "classDiagram\n  class A {}\n  A <|-- B",
+        ]
+        for script in scripts:
+            with self.subTest(script=script):
+                self.assertIsNone(validate_mermaid(script))
+
+    def test_error_position(self):
+        """Test that errors report the line and column of the bad token."""
+        error = validate_mermaid("graph TD\n    A[foo (bar)] --> B")
+        self.assertIsNotNone(error)
+        self.assertEqual((error.line, error.column), (2, 11))
+        self.assertIn("Parse error on line 2, column 11", str(error))
+
+    def test_invalid_diagrams(self):
+        """Test that invalid scripts are rejected at the offending line."""
+        scripts = {
+            "A --> B": 1,
+            "graph TD\n  subgraph one\n    a --> b": 2,
+            "sequenceDiagram\n  Alice->>Bob": 2,
+            "sequenceDiagram\n  else maybe": 2,
+            "pie\n  Dogs : 3": 2,
+            "gitGraph\n  comit": 2,
+            "graph TD\n  A --> %% no target": 2,
+            "graph TD\n  A[dict {a] --> B": 2,
+        }
+        for script, line in scripts.items():
+            with self.subTest(script=script):
+                error = validate_mermaid(script)
+                self.assertIsNotNone(error)
+                self.assertEqual(error.line, line)
+
+
+class TestBuildParser(unittest.TestCase):
+    """Tests for the cached parser."""
+
+    def test_tables_are_cached_on_disk(self):
+        """Test that the compiled tables are written once and reloaded."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache_path = Path(temp_dir) / "parser" / "mermaid_parser.lark"
+            with mock.patch.object(
+                mermaid_parser, "MERMAID_PARSER_CACHE_PATH", cache_path
+            ):
+                build_parser()
+                self.assertTrue(cache_path.exists())
+                validator = MermaidValidator(build_parser())
+            self.assertIsNone(validator.validate("graph TD\n  A --> B"))
+            self.assertIsNotNone(validator.validate("graph TD\n  A -->"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+"""Tests for incremental extraction of JSON string fields."""
+import json
+import unittest
+
+from app.utils.partial_json import PartialJsonStringFields
+
+ARGUMENTS = {
+    "diagram_title": 'Nested "quotes"',
+    "options": {"diagram_text_definition": "not this one"},
+    "diagram_text_definition": 'graph TD\n  A["café \U0001f600"] --> B\t\\',
+    "explanation": "done",
+}
+
+
+class TestPartialJsonStringFields(unittest.TestCase):
+    """Tests for PartialJsonStringFields."""
+
+    def test_matches_json_loads_for_any_chunking(self):
+        """Test that chunked decoding matches json.loads, escapes included."""
+        for ensure_ascii in (True, False):
+            text = json.dumps(ARGUMENTS, ensure_ascii=ensure_ascii)
+            for size in (1, 2, 5, len(text)):
+                with self.subTest(ensure_ascii=ensure_ascii, size=size):
+                    fields = PartialJsonStringFields(["diagram_text_definition"])
+                    streamed = ""
+                    for start in range(0, len(text), size):
+                        deltas = fields.feed(text[start : start + size])
+                        streamed += deltas.get("diagram_text_definition", "")
+                    expected = ARGUMENTS["diagram_text_definition"]
+                    self.assertEqual(streamed, expected)
+                    self.assertEqual(fields.values["diagram_text_definition"], expected)
+
+    def test_completed_before_object_ends(self):
+        """Test that a field is reported complete once its closing quote arrives."""
+        fields = PartialJsonStringFields(["diagram_text_definition"])
+        fields.feed('{"diagram_text_definition": "graph TD')
+        self.assertNotIn("diagram_text_definition", fields.completed)
+        fields.feed('\\n  A --> B", "explanation": "unfinished')
+        self.assertIn("diagram_text_definition", fields.completed)
+        self.assertEqual(
+            fields.values["diagram_text_definition"], "graph TD\n  A --> B"
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+"""Tests for the async LLM rate limiter."""
+import asyncio
+import time
+import unittest
+from typing import List
+
+from app.utils.rate_limiter import AsyncRateLimiter, RateLimit
+
+
+def limiter(requests_per_minute: int, tokens_per_minute: int) -> AsyncRateLimiter:
+    """Limiter applying the same limit to every model."""
+    return AsyncRateLimiter(
+        lambda vendor, model: RateLimit(requests_per_minute, tokens_per_minute)
+    )
+
+
+class TestAsyncRateLimiter(unittest.IsolatedAsyncioTestCase):
+    """Tests for AsyncRateLimiter."""
+
+    async def test_waits_for_tokens(self):
+        """Test that a call waits until enough tokens have been refilled."""
+        rate_limiter = limiter(6000, 6000)  # 100 tokens a second
+        await rate_limiter.acquire("open_ai", "gpt-4", 6000)
+        started = time.monotonic()
+        await rate_limiter.acquire("open_ai", "gpt-4", 20)
+        self.assertGreaterEqual(time.monotonic() - started, 0.15)
+
+    async def test_models_are_limited_separately(self):
+        """Test that one model's usage leaves another's headroom alone."""
+        rate_limiter = limiter(60, 1000)
+        await rate_limiter.acquire("open_ai", "gpt-4", 1000)
+        self.assertLess(rate_limiter.headroom("open_ai", "gpt-4").tokens, 10)
+        self.assertEqual(rate_limiter.headroom("anthropic", "claude-2.1").tokens, 1000)
+
+    async def test_callers_are_served_in_arrival_order(self):
+        """Test that a small request does not overtake a large queued one."""
+        rate_limiter = limiter(6000, 6000)
+        await rate_limiter.acquire("open_ai", "gpt-4", 6000)
+        order: List[str] = []
+
+        async def call(name: str, tokens: int) -> None:
+            await rate_limiter.acquire("open_ai", "gpt-4", tokens)
+            order.append(name)
+
+        large = asyncio.create_task(call("large", 30))
+        await asyncio.sleep(0)
+        small = asyncio.create_task(call("small", 1))
+        await asyncio.sleep(0)
+        self.assertEqual(rate_limiter.headroom("open_ai", "gpt-4").requests, 0)
+        await asyncio.gather(large, small)
+        self.assertEqual(order, ["large", "small"])
+
+
+if __name__ == "__main__":
+    unittest.main()
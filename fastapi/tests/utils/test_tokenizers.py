@@ -0,0 +1,81 @@
+"""Tests for the tokenizer registry and batch counting."""
+import importlib.util
+import unittest
+from typing import ClassVar, List
+from unittest import mock
+
+import tiktoken
+
+from app.utils import tokenizers
+from app.utils.llm_utils import anthropic_sync_count_tokens
+from app.utils.tokenizers import (
+    count_anthropic_tokens,
+    count_tokens,
+    count_tokens_batch,
+    get_encoding,
+)
+
+
+def byte_encoding() -> tiktoken.Encoding:
+    """A small offline encoding with one token per byte."""
+    return tiktoken.Encoding(
+        name="bytes",
+        pat_str=r"\S+|\s+",
+        mergeable_ranks={bytes([i]): i for i in range(256)},
+        special_tokens={"<|endoftext|>": 256},
+    )
+
+
+class TestTokenizers(unittest.TestCase):
+    """Tests for the tokenizer registry."""
+
+    def test_encoding_is_loaded_once(self):
+        """Test that repeated lookups reuse the loaded encoding."""
+        encoding = byte_encoding()
+        with mock.patch.dict(tokenizers.encodings, clear=True), mock.patch.object(
+            tiktoken, "get_encoding", return_value=encoding
+        ) as load:
+            self.assertIs(get_encoding("bytes"), encoding)
+            self.assertIs(get_encoding("bytes"), encoding)
+        load.assert_called_once_with("bytes")
+
+    def test_batch_matches_single_counts(self):
+        """Test that batch counts equal one-by-one counts, special tokens included."""
+        encoding = byte_encoding()
+        texts = ["graph TD", "", "A --> B <|endoftext|>", "héllo"]
+        self.assertEqual(
+            count_tokens_batch(texts, encoding, num_threads=2),
+            [count_tokens(text, encoding) for text in texts],
+        )
+        self.assertEqual(count_tokens("héllo", encoding), 6)
+
+
+class TestAnthropicEstimate(unittest.TestCase):
+    """Tests for the offline Anthropic token estimate."""
+
+    TEXTS: ClassVar[List[str]] = [
+        "graph TD\n  A[Start] --> B{Is it?}\n  B -->|Yes| C[OK]",
+        "def folder_tree(root_folder: str) -> str:\n    return generate_tree()",
+        "Grüße, 日本語のテキスト — naïve café ﬁ ①",
+        "It's what we'll see    \n\n\t indented",
+    ]
+
+    def test_estimate_is_deterministic(self):
+        """Test that the estimate needs no client and repeats exactly."""
+        counts = count_anthropic_tokens(self.TEXTS)
+        self.assertTrue(all(count > 0 for count in counts))
+        self.assertEqual(counts, count_anthropic_tokens(self.TEXTS))
+
+    @unittest.skipIf(
+        importlib.util.find_spec("tokenizers") is None, "tokenizers not installed"
+    )
+    def test_estimate_matches_sdk(self):
+        """Test that the estimate equals the SDK's count on ordinary text."""
+        self.assertEqual(
+            count_anthropic_tokens(self.TEXTS),
+            [anthropic_sync_count_tokens(text) for text in self.TEXTS],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()